@@ -1,11 +1,16 @@
 from flask import Flask
-from flask_jwt_extended import JWTManager
 from flask_cors import CORS
+from flask_sqlalchemy import SQLAlchemy
 from .config import Config
+from .utils.jobs import job_queue
+from .utils.hashing import hashing_pool
+from .utils.pdf_renderer import pdf_renderer
+from .utils.jwt_cache import CachingJWTManager
 import os
 
 # Initialize extensions
-jwt = JWTManager()
+jwt = CachingJWTManager()
+db = SQLAlchemy()
 
 def create_app(config_class=Config):
     app = Flask(__name__)
@@ -13,6 +18,10 @@ def create_app(config_class=Config):
     
     # Initialize extensions with app
     jwt.init_app(app)
+    db.init_app(app)
+    job_queue.init_app(app)
+    hashing_pool.init_app(app)
+    pdf_renderer.init_app(app)
     CORS(app, 
          resources={r"/*": {
              "origins": app.config['CORS_ORIGINS'],
@@ -25,11 +34,32 @@ def create_app(config_class=Config):
     # Initialize app
     config_class.init_app(app)
     
+    # Imported here because these need db and the models
+    from .utils.chat_store import chat_store
+    from .utils.query_engine import query_engine
+    chat_store.init_app(app)
+    query_engine.init_app(app)
+    
+    # Create the tables, import users from the legacy users.json and
+    # catalog files uploaded before the catalog existed
+    from .utils.user_store import migrate_users_file
+    from .utils.upload_store import upgrade_catalog_table, migrate_upload_folder
+    from .utils.report_store import upgrade_report_table
+    with app.app_context():
+        db.create_all()
+        upgrade_catalog_table()
+        upgrade_report_table()
+        migrate_users_file(app.config['USERS_FILE'])
+        migrate_upload_folder(app.config['UPLOAD_FOLDER'])
+    
     # Register blueprints
-    from .routes import auth_routes, upload_routes, report_routes
+    from .routes import auth_routes, upload_routes, report_routes, predict_routes, chat_routes, data_routes
     
     app.register_blueprint(auth_routes.bp)
     app.register_blueprint(upload_routes.bp)
     app.register_blueprint(report_routes.bp)
+    app.register_blueprint(predict_routes.bp)
+    app.register_blueprint(chat_routes.bp)
+    app.register_blueprint(data_routes.bp)
     
     return app 
\ No newline at end of file
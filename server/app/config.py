@@ -13,14 +13,43 @@ class Config:
     # Database settings
     SQLALCHEMY_DATABASE_URI = os.getenv('DATABASE_URL', 'sqlite:///app.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
+    USERS_FILE = os.getenv('USERS_FILE', 'users.json')  # Legacy user file, imported once at startup
     
     # JWT settings
     JWT_SECRET_KEY = os.getenv('JWT_SECRET_KEY', 'default-jwt-secret')
     JWT_ACCESS_TOKEN_EXPIRES = 3600  # 1 hour
+    JWT_CACHE_SIZE = int(os.getenv('JWT_CACHE_SIZE', 4096))  # Verified tokens remembered, 0 disables
+    
+    # Password hashing settings, hashes made with another method are upgraded on login
+    PASSWORD_HASH_METHOD = os.getenv('PASSWORD_HASH_METHOD', 'pbkdf2:sha256:600000')
+    PASSWORD_HASH_WORKERS = int(os.getenv('PASSWORD_HASH_WORKERS', 2))  # Threads hashing passwords
+    PASSWORD_HASH_MAX_PENDING = int(os.getenv('PASSWORD_HASH_MAX_PENDING', 32))  # Beyond this auth returns 503
+    PASSWORD_HASH_RETRY_AFTER = int(os.getenv('PASSWORD_HASH_RETRY_AFTER', 1))  # Seconds, sent with 503
     
     # File upload settings
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'uploads')
     MAX_CONTENT_LENGTH = int(os.getenv('MAX_CONTENT_LENGTH', 16777216))  # 16MB
+    UPLOAD_CHUNK_SIZE = int(os.getenv('UPLOAD_CHUNK_SIZE', 100000))  # Rows per chunk when streaming uploads
+    UPLOAD_ADMINS = [email.strip() for email in os.getenv('UPLOAD_ADMINS', '').split(',') if email.strip()]  # Users who may delete files uploaded before the catalog existed
+    UPLOAD_SESSION_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'upload_sessions')
+    UPLOAD_SESSION_CHUNK_SIZE = int(os.getenv('UPLOAD_SESSION_CHUNK_SIZE', 8388608))  # 8MB, largest chunk of a resumable upload
+    UPLOAD_SESSION_MAX_SIZE = int(os.getenv('UPLOAD_SESSION_MAX_SIZE', 10737418240))  # 10GB
+    UPLOAD_SESSION_TTL = int(os.getenv('UPLOAD_SESSION_TTL', 86400))  # Seconds before a resumable upload is discarded
+    UPLOAD_SESSION_MAX_OPEN = int(os.getenv('UPLOAD_SESSION_MAX_OPEN', 4))  # Unfinished resumable uploads per user
+    UPLOAD_SESSION_FINALIZE_TIMEOUT = int(os.getenv('UPLOAD_SESSION_FINALIZE_TIMEOUT', 300))  # Seconds before a stuck finalize or chunk write is given up
+    DATASET_CACHE_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'dataset_cache')
+    QUERY_MAX_ROWS = int(os.getenv('QUERY_MAX_ROWS', 10000))  # Largest result returned by a dataset query
+    QUERY_PLAN_CACHE_SIZE = int(os.getenv('QUERY_PLAN_CACHE_SIZE', 256))  # Compiled dataset queries kept
+    QUERY_RESULT_CACHE_SIZE = int(os.getenv('QUERY_RESULT_CACHE_SIZE', 256))  # Dataset query results kept
+    KPI_FUNCTIONS = os.getenv('KPI_FUNCTIONS', 'count,sum,mean,min,max')  # Aggregates materialized per numeric column
+    KPI_MAX_CATEGORIES = int(os.getenv('KPI_MAX_CATEGORIES', 50))  # Columns with more values get no breakdown
+    KPI_TIME_BUCKET = os.getenv('KPI_TIME_BUCKET', 'M')  # Pandas period of KPI time series, e.g. D, W or M
+    SERIES_DEFAULT_POINTS = int(os.getenv('SERIES_DEFAULT_POINTS', 1000))  # Points per downsampled chart series
+    SERIES_MAX_POINTS = int(os.getenv('SERIES_MAX_POINTS', 10000))  # Most points one series request may ask for
+    
+    # Background job settings
+    JOBS_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'jobs')
+    JOB_WORKERS = int(os.getenv('JOB_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
     
     # CORS settings
     CORS_ORIGINS = os.getenv('CORS_ORIGINS', 'http://localhost:3000').split(',')
@@ -29,16 +58,40 @@ class Config:
     @staticmethod
     def init_app(app):
         os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+        os.makedirs(app.config['DATASET_CACHE_FOLDER'], exist_ok=True)
     
     # OpenAI settings
     OPENAI_API_KEY = os.getenv('OPENAI_API_KEY')
     
     # ML Model settings
     ML_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'ml', 'model.pkl')
+    PREDICT_BATCH_MAX_SIZE = int(os.getenv('PREDICT_BATCH_MAX_SIZE', 32))  # 1 disables request batching
+    PREDICT_BATCH_MAX_WAIT_MS = float(os.getenv('PREDICT_BATCH_MAX_WAIT_MS', 2.0))  # Latency budget for batching
+    MODEL_MAX_VERSIONS = int(os.getenv('MODEL_MAX_VERSIONS', 3))  # Model versions kept loaded for rollback
+    MODEL_RELOAD_INTERVAL = float(os.getenv('MODEL_RELOAD_INTERVAL', 5.0))  # Seconds between model file checks
+    MODEL_ADMINS = [email.strip() for email in os.getenv('MODEL_ADMINS', '').split(',') if email.strip()]  # Users who may reload or roll back the model
+    ML_COMPILED_FOREST = os.getenv('ML_COMPILED_FOREST', '1') == '1'  # Flat-array forest evaluator
+    ML_COMPILED_FOREST_MAX_BATCH = int(os.getenv('ML_COMPILED_FOREST_MAX_BATCH', 512))  # Larger batches use sklearn
+    PREDICT_STREAM_CHUNK_SIZE = int(os.getenv('PREDICT_STREAM_CHUNK_SIZE', 1000))  # Rows per chunk of streamed predictions
+    PREDICT_CACHE_SIZE = int(os.getenv('PREDICT_CACHE_SIZE', 10000))  # Cached prediction results, 0 disables
+    PREDICT_CACHE_TTL = float(os.getenv('PREDICT_CACHE_TTL', 300))  # Seconds a cached prediction stays valid
+    SCORING_OUTPUT_FOLDER = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'scored')
+    SCORING_WORKERS = int(os.getenv('SCORING_WORKERS', os.cpu_count() or 1))  # Processes per batch-scoring job
     
     # PDF Generation settings
     PDF_TEMPLATE_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'templates')
     PDF_OUTPUT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'reports')
+    PDF_DEFAULT_TEMPLATE = os.getenv('PDF_DEFAULT_TEMPLATE', 'report.html')
+    PDF_WORKERS = int(os.getenv('PDF_WORKERS', 1))  # Processes rendering PDFs
+    PDF_MAX_PENDING = int(os.getenv('PDF_MAX_PENDING', 16))  # Renders queued before requests get 503
+    PDF_FAILURE_TTL = int(os.getenv('PDF_FAILURE_TTL', 300))  # Seconds a failed render is reported before it is retried
+    PDF_MAX_FAILURES = int(os.getenv('PDF_MAX_FAILURES', 256))  # Failed renders remembered at most
+    
+    # Chat settings
+    CHAT_BUFFER_SIZE = int(os.getenv('CHAT_BUFFER_SIZE', 200))  # Newest messages per user kept in memory
+    CHAT_MAX_BUFFERED_USERS = int(os.getenv('CHAT_MAX_BUFFERED_USERS', 1000))  # Users whose messages are kept in memory
+    CHAT_POLL_TIMEOUT = float(os.getenv('CHAT_POLL_TIMEOUT', 25))  # Longest wait of a long-poll request
+    CHAT_POLL_INTERVAL = float(os.getenv('CHAT_POLL_INTERVAL', 1.0))  # Seconds between checks for other workers' messages
 
 class DevelopmentConfig(Config):
     DEBUG = True
@@ -0,0 +1,228 @@
+import os
+import time
+import shutil
+import logging
+import multiprocessing
+import numpy as np
+import pandas as pd
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Dict, Optional
+from .predictor import Predictor
+from ..utils.file_handler import iter_processed_chunks, save_processed_data, DEFAULT_CHUNK_SIZE
+from ..utils.jobs import update_job
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Predictor of a scoring worker process, loaded once by _init_worker
+_worker_predictor = None
+
+def _load_predictor(model_path: str) -> Predictor:
+    # Chunks are far larger than the compiled forest's batch limit, skip compiling it
+    return Predictor(model_path, mmap_mode='r', compile_forest=False)
+
+def _init_worker(model_path: str) -> None:
+    global _worker_predictor
+    _worker_predictor = _load_predictor(model_path)
+
+def _score_block(X: np.ndarray):
+    return _worker_predictor.predict_array(X, copy=False)
+
+def _scored_chunk(chunk: pd.DataFrame, valid: np.ndarray, labels, probabilities, classes) -> pd.DataFrame:
+    if valid.all():
+        chunk['prediction'] = labels
+    else:
+        predictions = np.full(len(chunk), None, dtype=object)
+        predictions[valid] = labels
+        chunk['prediction'] = predictions
+    
+    if probabilities is not None:
+        for i, label in enumerate(classes):
+            column = np.full(len(chunk), np.nan)
+            column[valid] = probabilities[:, i]
+            chunk[f'probability_{label}'] = column
+    return chunk
+
+def score_file(filepath: str,
+               model_path: str,
+               output_path: str,
+               chunksize: int = DEFAULT_CHUNK_SIZE,
+               workers: int = 1,
+               on_progress: Optional[Callable[[int, float], None]] = None,
+               read_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Score every row of an uploaded file and write the results to a CSV file.
+    
+    The file is read in chunks; each chunk is scored by a pool of worker
+    processes that memory-map the same model file, and written out in file
+    order with save_processed_data as soon as it is done. Only a few chunks
+    are in flight at once, so memory use is bounded by the chunk size.
+    Rows with missing or non-numeric feature values get an empty prediction.
+    
+    Args:
+        filepath (str): Path to the uploaded file
+        model_path (str): Path to the model file to score with
+        output_path (str): CSV file to write, replaced if it exists
+        chunksize (int): Number of rows to read per chunk
+        workers (int): Number of scoring processes, 1 scores in this process
+        on_progress (Callable, optional): Called after every written chunk with
+            the number of rows written and the fraction of the file read
+        read_options (Dict[str, Any], optional): Sheet and columns to read,
+            see file_handler.iter_processed_chunks
+    
+    Returns:
+        Dict[str, Any]: Row counts, classes and the output path
+    """
+    predictor = _load_predictor(model_path)
+    features = predictor.feature_names
+    if features is None:
+        raise ValueError("Model has no feature names to select the input columns by")
+    classes = list(getattr(predictor.model, 'classes_', []))
+    
+    if os.path.exists(output_path):
+        os.remove(output_path)
+    
+    pool = None
+    if workers > 1:
+        pool = ProcessPoolExecutor(max_workers=workers,
+                                   mp_context=multiprocessing.get_context('spawn'),
+                                   initializer=_init_worker,
+                                   initargs=(model_path,))
+    
+    rows = 0
+    scored_rows = 0
+    fraction_read = [0.0]
+    pending = deque()
+    
+    def track_position(fraction):
+        fraction_read[0] = fraction
+    
+    def write_next() -> None:
+        nonlocal rows
+        chunk, valid, future = pending.popleft()
+        labels, probabilities = future.result()
+        save_processed_data(_scored_chunk(chunk, valid, labels, probabilities, classes),
+                            output_path, append=True)
+        rows += len(chunk)
+        if on_progress is not None:
+            on_progress(rows, fraction_read[0])
+    
+    try:
+        for chunk in iter_processed_chunks(filepath, chunksize=chunksize, on_progress=track_position,
+                                           **(read_options or {})):
+            missing = set(features) - set(chunk.columns)
+            if missing:
+                raise ValueError(f"Missing required features: {missing}")
+            
+            # Values that are not numbers leave their row unscored, like missing ones
+            X = chunk[features].apply(pd.to_numeric, errors='coerce').to_numpy(dtype=np.float64)
+            valid = ~np.isnan(X).any(axis=1)
+            X = X[valid]
+            scored_rows += len(X)
+            
+            if len(X) == 0:
+                # No row of the chunk can be scored, the model is not called
+                future = Future()
+                future.set_result((np.empty(0, dtype=object),
+                                   np.empty((0, len(classes))) if hasattr(predictor.model, 'predict_proba') else None))
+            elif pool is not None:
+                future = pool.submit(_score_block, X)
+            else:
+                future = Future()
+                future.set_result(predictor.predict_array(X, copy=False))
+            pending.append((chunk, valid, future))
+            
+            # Keep every worker busy, but never more than two chunks per worker in memory
+            while len(pending) > 2 * max(1, workers):
+                write_next()
+        
+        while pending:
+            write_next()
+    finally:
+        if pool is not None:
+            pool.shutdown(wait=False, cancel_futures=True)
+    
+    if rows == 0:
+        # An empty upload still gets a file with the header row
+        save_processed_data(pd.DataFrame(columns=list(features) + ['prediction']), output_path)
+    
+    return {
+        'rows': rows,
+        'scored_rows': scored_rows,
+        'classes': [label.item() if hasattr(label, 'item') else label for label in classes],
+        'output_file': os.path.basename(output_path)
+    }
+
+def _pinned_path(jobs_folder: str, job_id: str) -> str:
+    return os.path.join(jobs_folder, f"{job_id}.model.pkl")
+
+def pin_model(model_path: str, jobs_folder: str, job_id: str) -> str:
+    """
+    Copy a model snapshot into the jobs folder, for the life of a scoring job.
+    
+    The registry deletes old snapshots as new versions arrive, which may
+    happen while a job is still queued. run_scoring_job removes the copy
+    when the job ends.
+    
+    Args:
+        model_path (str): Path to the model snapshot
+        jobs_folder (str): Directory holding job records
+        job_id (str): Job identifier
+    
+    Returns:
+        str: Path to the pinned copy
+    """
+    pinned_path = _pinned_path(jobs_folder, job_id)
+    try:
+        # Snapshots are never modified, a hard link is enough where it is possible
+        os.link(model_path, pinned_path)
+    except OSError:
+        shutil.copyfile(model_path, pinned_path)
+    return pinned_path
+
+def run_scoring_job(jobs_folder: str,
+                    job_id: str,
+                    filepath: str,
+                    model_path: str,
+                    output_path: str,
+                    chunksize: int = DEFAULT_CHUNK_SIZE,
+                    workers: int = 1,
+                    read_options: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Score an upload as a background job, reporting progress on the job record.
+    
+    Args:
+        jobs_folder (str): Directory holding job records
+        job_id (str): Job identifier
+        filepath (str): Path to the uploaded file
+        model_path (str): Path to the model file to score with, removed when
+            the job ends if it was pinned with pin_model
+        output_path (str): CSV file to write
+        chunksize (int): Number of rows to read per chunk
+        workers (int): Number of scoring processes
+        read_options (Dict[str, Any], optional): Sheet and columns to read
+    """
+    update_job(jobs_folder, job_id, status='running', started_at=time.time())
+    
+    def report_progress(rows: int, fraction: float) -> None:
+        update_job(jobs_folder, job_id, rows_processed=rows, progress=round(fraction, 4))
+    
+    try:
+        os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        result = score_file(filepath, model_path, output_path, chunksize, workers,
+                            on_progress=report_progress, read_options=read_options)
+    except Exception as e:
+        logger.error(f"Error in scoring job {job_id}: {str(e)}")
+        # Do not leave a partial output behind
+        if os.path.exists(output_path):
+            os.remove(output_path)
+        update_job(jobs_folder, job_id, status='failed', error=str(e))
+        return
+    finally:
+        if model_path == _pinned_path(jobs_folder, job_id) and os.path.exists(model_path):
+            os.remove(model_path)
+    
+    update_job(jobs_folder, job_id, status='completed', progress=1.0,
+               rows_processed=result['rows'], result=result)
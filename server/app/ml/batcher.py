@@ -0,0 +1,122 @@
+import time
+import queue
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, List, Sequence, Tuple
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class PredictionBatcher:
+    """
+    Merges concurrent single-row predictions into batched model calls.
+    
+    Callers submit one row each and block on their own future. A dispatcher
+    thread collects rows until either max_batch_size rows are waiting or the
+    oldest row has waited max_wait_ms, runs the model once for the batch and
+    hands every caller back its own row of the result. max_wait_ms therefore
+    bounds the latency that batching can add to a request.
+    """
+    
+    def __init__(self,
+                 predict_batch: Callable[[List[Any]], Tuple[Sequence, Sequence]],
+                 max_batch_size: int = 32,
+                 max_wait_ms: float = 2.0):
+        """
+        Initialize the batcher.
+        
+        Args:
+            predict_batch (Callable): Called with a list of rows, returns the
+                labels and probabilities for those rows in the same order
+            max_batch_size (int): Maximum number of rows per model call
+            max_wait_ms (float): Maximum time a row waits for others to join its batch
+        """
+        if max_batch_size < 1:
+            raise ValueError("max_batch_size must be at least 1")
+        
+        self.predict_batch = predict_batch
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.rows = 0
+    
+    def _ensure_started(self) -> None:
+        # Started lazily so forked server workers each get their own thread
+        if self._thread is None or not self._thread.is_alive():
+            with self._lock:
+                if self._thread is None or not self._thread.is_alive():
+                    self._thread = threading.Thread(target=self._run, name='prediction-batcher', daemon=True)
+                    self._thread.start()
+    
+    def submit(self, row: Any) -> Future:
+        """
+        Queue a single row for prediction.
+        
+        Args:
+            row: Input row accepted by predict_batch
+        
+        Returns:
+            Future: Resolves to the (label, probabilities) of the row
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((row, future))
+        return future
+    
+    def predict(self, row: Any, timeout: float = None) -> Tuple[Any, Any]:
+        """
+        Predict a single row, sharing a model call with concurrent callers.
+        
+        Args:
+            row: Input row accepted by predict_batch
+            timeout (float, optional): Seconds to wait for the result
+        
+        Returns:
+            Tuple: Label and probabilities of the row
+        """
+        return self.submit(row).result(timeout=timeout)
+    
+    def _collect(self) -> List[Tuple[Any, Future]]:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Still take rows that are already waiting, without blocking
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+    
+    def _run(self) -> None:
+        while True:
+            batch = self._collect()
+            rows = [row for row, _ in batch]
+            try:
+                labels, probabilities = self.predict_batch(rows)
+            except Exception as e:
+                if len(batch) == 1:
+                    batch[0][1].set_exception(e)
+                    continue
+                # One bad row must not fail the other callers, retry them one by one
+                logger.warning(f"Batched prediction failed, retrying rows individually: {str(e)}")
+                for row, future in batch:
+                    try:
+                        labels, probabilities = self.predict_batch([row])
+                        future.set_result((labels[0], probabilities[0]))
+                    except Exception as row_error:
+                        future.set_exception(row_error)
+                continue
+            
+            self.batches += 1
+            self.rows += len(batch)
+            for i, (_, future) in enumerate(batch):
+                future.set_result((labels[i], probabilities[i]))
@@ -0,0 +1,64 @@
+import sys
+import time
+import joblib
+import numpy as np
+from .forest_engine import CompiledForest
+
+def _time_call(fn, X, min_time: float = 0.5, min_runs: int = 5) -> float:
+    """Return the median seconds per call of fn(X)."""
+    fn(X)  # warm up
+    timings = []
+    started = time.perf_counter()
+    while len(timings) < min_runs or time.perf_counter() - started < min_time:
+        t0 = time.perf_counter()
+        fn(X)
+        timings.append(time.perf_counter() - t0)
+    return float(np.median(timings))
+
+def benchmark(model, batch_sizes=(1, 64, 10000), seed: int = 0):
+    """
+    Compare the compiled forest against model.predict_proba.
+    
+    Args:
+        model: Fitted forest classifier
+        batch_sizes (tuple): Batch sizes to time
+        seed (int): Seed for the random input rows
+    
+    Returns:
+        list: One result dict per batch size
+    """
+    engine = CompiledForest.from_sklearn(model)
+    rng = np.random.default_rng(seed)
+    results = []
+    for batch_size in batch_sizes:
+        X = rng.normal(size=(batch_size, engine.n_features))
+        if not np.array_equal(engine.predict(X), model.predict(X)):
+            raise AssertionError(f"Compiled forest labels differ from sklearn at batch size {batch_size}")
+        max_diff = float(np.abs(engine.predict_proba(X) - model.predict_proba(X)).max())
+        
+        sklearn_time = _time_call(model.predict_proba, X)
+        compiled_time = _time_call(engine.predict_proba, X)
+        results.append({
+            'batch_size': batch_size,
+            'sklearn_ms': sklearn_time * 1000,
+            'compiled_ms': compiled_time * 1000,
+            'speedup': sklearn_time / compiled_time,
+            'max_abs_diff': max_diff
+        })
+    return results
+
+def main(model_path: str) -> None:
+    """Benchmark the model stored at model_path and print a table."""
+    model_data = joblib.load(model_path)
+    model = model_data['model'] if isinstance(model_data, dict) else model_data
+    print(f"{type(model).__name__}: {len(model.estimators_)} trees")
+    print(f"{'batch':>7} {'sklearn ms':>12} {'compiled ms':>12} {'speedup':>8} {'max diff':>10}")
+    for row in benchmark(model):
+        print(f"{row['batch_size']:>7} {row['sklearn_ms']:>12.3f} {row['compiled_ms']:>12.3f} "
+              f"{row['speedup']:>7.1f}x {row['max_abs_diff']:>10.2g}")
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print("Usage: python -m app.ml.benchmark_forest <model.pkl>")
+        sys.exit(1)
+    main(sys.argv[1])
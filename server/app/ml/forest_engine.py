@@ -0,0 +1,211 @@
+import os
+import json
+import logging
+import numpy as np
+from typing import Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Rows traversed at once, bounds the (rows x trees) index arrays
+_ROW_BLOCK = 4096
+
+_ARRAYS = ('feature', 'threshold', 'left', 'right', 'missing_left', 'values', 'roots', 'classes')
+
+# Bumped when the saved layout changes, older caches are rebuilt
+_FORMAT = 2
+
+class CompiledForest:
+    """
+    A fitted tree ensemble flattened into packed, contiguous node arrays.
+    
+    All trees share one set of node arrays (feature, threshold, left and right
+    child, per-class leaf probabilities), indexed from each tree's root.
+    Leaves point back at themselves, so a batch is evaluated by stepping every
+    (row, tree) pair down one level at a time with vectorized gathers, for at
+    most max_depth steps. Inputs are compared as float32, as sklearn does, so
+    the probabilities match RandomForestClassifier.predict_proba. Missing
+    values (NaN) follow each node's missing_go_to_left, as in sklearn.
+    
+    This removes sklearn's per-call overhead, which dominates small batches.
+    For large batches sklearn's compiled traversal is faster, see
+    benchmark_forest.
+    """
+    
+    def __init__(self, feature, threshold, left, right, missing_left, values, roots, classes,
+                 n_features: int, max_depth: int, supports_missing: bool = True):
+        self.feature = feature
+        self.threshold = threshold
+        self.left = left
+        self.right = right
+        self.missing_left = missing_left
+        self.supports_missing = supports_missing
+        self.values = values
+        self.roots = roots
+        self.classes = classes
+        self.n_features = n_features
+        self.max_depth = max_depth
+        # Traversal works on native index types with both children interleaved,
+        # so one step is a single gather: children[2 * node + went_right]
+        self._feature = np.asarray(feature, dtype=np.intp)
+        self._threshold = np.asarray(threshold, dtype=np.float64)
+        self._children = np.empty(2 * len(left), dtype=np.intp)
+        self._children[0::2] = left
+        self._children[1::2] = right
+        self._missing_right = ~np.asarray(missing_left, dtype=bool)
+    
+    @classmethod
+    def from_sklearn(cls, model) -> 'CompiledForest':
+        """
+        Pack a fitted sklearn forest classifier.
+        
+        Args:
+            model: Fitted RandomForestClassifier or ExtraTreesClassifier
+        
+        Returns:
+            CompiledForest: Packed forest
+        """
+        estimators = getattr(model, 'estimators_', None)
+        if not estimators or not hasattr(estimators[0], 'tree_'):
+            raise ValueError(f"Cannot compile {type(model).__name__}: not a fitted tree ensemble")
+        if getattr(model, 'n_outputs_', 1) != 1:
+            raise ValueError("Cannot compile multi-output forests")
+        
+        n_classes = len(model.classes_)
+        features, thresholds, lefts, rights, missing_lefts, values, roots = [], [], [], [], [], [], []
+        # Trees of sklearn before 1.3 have no missing value routing and reject NaN
+        supports_missing = hasattr(estimators[0].tree_, 'missing_go_to_left')
+        offset = 0
+        max_depth = 0
+        for estimator in estimators:
+            tree = estimator.tree_
+            node_ids = np.arange(tree.node_count, dtype=np.int32)
+            is_leaf = tree.children_left < 0
+            
+            features.append(np.where(is_leaf, 0, tree.feature).astype(np.int32))
+            thresholds.append(tree.threshold.astype(np.float64))
+            lefts.append((np.where(is_leaf, node_ids, tree.children_left) + offset).astype(np.int32))
+            rights.append((np.where(is_leaf, node_ids, tree.children_right) + offset).astype(np.int32))
+            if supports_missing:
+                missing_lefts.append(np.asarray(tree.missing_go_to_left, dtype=np.uint8))
+            else:
+                missing_lefts.append(np.ones(tree.node_count, dtype=np.uint8))
+            
+            # Normalize leaf values to probabilities, as DecisionTreeClassifier.predict_proba does
+            proba = tree.value[:, 0, :n_classes].astype(np.float64)
+            normalizer = proba.sum(axis=1, keepdims=True)
+            normalizer[normalizer == 0.0] = 1.0
+            values.append(proba / normalizer)
+            
+            roots.append(offset)
+            offset += tree.node_count
+            max_depth = max(max_depth, tree.max_depth)
+        
+        return cls(
+            feature=np.concatenate(features),
+            threshold=np.concatenate(thresholds),
+            left=np.concatenate(lefts),
+            right=np.concatenate(rights),
+            missing_left=np.concatenate(missing_lefts),
+            values=np.ascontiguousarray(np.concatenate(values)),
+            roots=np.asarray(roots, dtype=np.int32),
+            classes=np.asarray(model.classes_),
+            n_features=int(model.n_features_in_),
+            max_depth=int(max_depth),
+            supports_missing=supports_missing
+        )
+    
+    def save(self, folder: str) -> None:
+        """
+        Save the packed arrays as .npy files so they can be memory-mapped.
+        
+        Args:
+            folder (str): Directory to write
+        """
+        os.makedirs(folder, exist_ok=True)
+        for name in _ARRAYS:
+            np.save(os.path.join(folder, name + '.npy'), getattr(self, name), allow_pickle=False)
+        with open(os.path.join(folder, 'meta.json'), 'w') as f:
+            json.dump({'format': _FORMAT, 'n_features': self.n_features, 'max_depth': self.max_depth,
+                       'supports_missing': self.supports_missing}, f)
+    
+    @classmethod
+    def load(cls, folder: str, mmap_mode: Optional[str] = 'r') -> 'CompiledForest':
+        """
+        Load packed arrays written by save().
+        
+        Args:
+            folder (str): Directory written by save()
+            mmap_mode (str, optional): numpy memory-map mode for the arrays
+        
+        Returns:
+            CompiledForest: Packed forest
+        """
+        with open(os.path.join(folder, 'meta.json')) as f:
+            meta = json.load(f)
+        if meta.get('format') != _FORMAT:
+            raise ValueError(f"Compiled forest in {folder} has an older layout")
+        arrays = {
+            name: np.load(os.path.join(folder, name + '.npy'), mmap_mode=mmap_mode, allow_pickle=False)
+            for name in _ARRAYS
+        }
+        return cls(n_features=meta['n_features'], max_depth=meta['max_depth'],
+                   supports_missing=meta['supports_missing'], **arrays)
+    
+    def _leaves(self, X: np.ndarray, missing: bool) -> np.ndarray:
+        n_rows = X.shape[0]
+        flat_X = X.ravel()
+        row_offsets = (np.arange(n_rows, dtype=np.intp) * self.n_features)[:, None]
+        node = np.broadcast_to(self.roots.astype(np.intp), (n_rows, len(self.roots))).copy()
+        for depth in range(self.max_depth):
+            values = flat_X[row_offsets + self._feature[node]]
+            went_right = values > self._threshold[node]
+            if missing:
+                missing_values = np.isnan(values)
+                went_right[missing_values] = self._missing_right[node[missing_values]]
+            node *= 2
+            node += went_right
+            node = self._children[node]
+        return node
+    
+    def predict_proba(self, X: np.ndarray) -> np.ndarray:
+        """
+        Compute class probabilities for a batch.
+        
+        Args:
+            X (np.ndarray): Matrix of shape (n_rows, n_features)
+        
+        Returns:
+            np.ndarray: Probabilities of shape (n_rows, n_classes)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if X.shape[1] != self.n_features:
+            raise ValueError(f"Expected {self.n_features} features, got {X.shape[1]}")
+        missing = bool(np.isnan(X).any())
+        if missing and not self.supports_missing:
+            raise ValueError("Input contains NaN")
+        
+        n_trees = len(self.roots)
+        proba = np.empty((X.shape[0], self.values.shape[1]), dtype=np.float64)
+        for start in range(0, X.shape[0], _ROW_BLOCK):
+            block = X[start:start + _ROW_BLOCK]
+            leaves = self._leaves(block, missing and bool(np.isnan(block).any()))
+            # Summing over the tree axis adds trees in order, like sklearn's accumulation
+            proba[start:start + _ROW_BLOCK] = self.values[leaves].sum(axis=1)
+        proba /= n_trees
+        return proba
+    
+    def predict(self, X: np.ndarray) -> np.ndarray:
+        """
+        Predict class labels for a batch.
+        
+        Args:
+            X (np.ndarray): Matrix of shape (n_rows, n_features)
+        
+        Returns:
+            np.ndarray: Predicted labels
+        """
+        return self.classes.take(np.argmax(self.predict_proba(X), axis=1))
@@ -0,0 +1,137 @@
+import time
+import hashlib
+import threading
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Sequence
+
+class PredictionCache:
+    """
+    Bounded LRU cache of prediction results with a time-to-live.
+    
+    Entries are keyed by a hash of the feature vector in model feature order
+    together with the model version, so results of different versions never
+    mix. clear() is meant to be registered as a model reload listener; it also
+    bumps a generation counter so results computed against the old version
+    while the reload happened are not stored afterwards.
+    """
+    
+    def __init__(self, max_entries: int = 10000, ttl: Optional[float] = 300.0):
+        """
+        Initialize the cache.
+        
+        Args:
+            max_entries (int): Maximum number of cached results
+            ttl (float, optional): Seconds a result stays valid, None for no expiry
+        """
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+    
+    @staticmethod
+    def make_key(version: str, values: Sequence[float]) -> bytes:
+        """
+        Build the cache key of a feature vector.
+        
+        Args:
+            version (str): Model version the result belongs to
+            values (Sequence[float]): Feature values in model feature order
+        
+        Returns:
+            bytes: Key, equal for numerically equal vectors (1 == 1.0, -0.0 == 0.0)
+        """
+        # Adding 0.0 turns -0.0 into 0.0, so both hash the same
+        vector = np.asarray(values, dtype=np.float64) + 0.0
+        digest = hashlib.blake2b(vector.tobytes(), digest_size=16)
+        digest.update(version.encode())
+        return digest.digest()
+    
+    def get(self, key: bytes) -> Any:
+        """
+        Look up a result.
+        
+        Args:
+            key (bytes): Key from make_key
+        
+        Returns:
+            Any: Cached result, or None on a miss
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            value, expires_at = entry
+            if expires_at is not None and expires_at <= time.monotonic():
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+    
+    def put(self, key: bytes, value: Any, generation: Optional[int] = None) -> None:
+        """
+        Store a result.
+        
+        Args:
+            key (bytes): Key from make_key
+            value: Result to cache
+            generation (int, optional): Generation read before computing the
+                result, the result is dropped if the cache was cleared since
+        """
+        if self.max_entries <= 0:
+            return
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != self.generation:
+                return
+            self._entries[key] = (value, expires_at)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+    
+    def clear(self, version: Optional[str] = None) -> None:
+        """
+        Drop every cached result.
+        
+        Args:
+            version (str, optional): Newly active model version, unused; accepted
+                so clear can be registered as a reload listener
+        """
+        with self._lock:
+            self._entries.clear()
+            self.generation += 1
+            self.invalidations += 1
+    
+    def stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters.
+        
+        Returns:
+            Dict[str, Any]: Size, limits and hit/miss/eviction counters
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl': self.ttl,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'evictions': self.evictions,
+                'expirations': self.expirations,
+                'invalidations': self.invalidations
+            }
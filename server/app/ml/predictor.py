@@ -1,26 +1,52 @@
+import os
+import uuid
+import shutil
 import joblib
 import pandas as pd
 import numpy as np
-from typing import Union, List, Dict
+from typing import Union, List, Dict, Optional
 import logging
+import threading
 from sklearn.preprocessing import StandardScaler
+from .batcher import PredictionBatcher
+from .forest_engine import CompiledForest
+from .prediction_cache import PredictionCache
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
 class Predictor:
-    def __init__(self, model_path: str):
+    def __init__(self,
+                 model_path: str,
+                 mmap_mode: Optional[str] = None,
+                 compile_forest: bool = True,
+                 compiled_max_batch: int = 512,
+                 forest_cache: Optional[str] = None):
         """
         Initialize the predictor with a trained model.
         
         Args:
             model_path (str): Path to the trained model file
+            mmap_mode (str, optional): joblib memory-map mode for the arrays
+                stored in the model file, e.g. 'r'
+            compile_forest (bool): Pack tree ensembles into a CompiledForest
+            compiled_max_batch (int): Largest batch evaluated by the compiled
+                forest, larger batches use the model's own predict_proba
+            forest_cache (str, optional): Directory to save the packed forest
+                arrays to, or memory-map them from if already saved
         """
         self.model_path = model_path
+        self.mmap_mode = mmap_mode
+        self.compile_forest = compile_forest
+        self.compiled_max_batch = compiled_max_batch
+        self.forest_cache = forest_cache
+        self.engine = None
         self.model = None
         self.scaler = None
         self.feature_names = None
+        self.metadata = {}
+        self._buffers = threading.local()
         self._load_model()
     
     def _load_model(self) -> None:
@@ -29,22 +55,81 @@ class Predictor:
         """
         try:
             # Load the model and scaler
-            model_data = joblib.load(self.model_path)
+            model_data = joblib.load(self.model_path, mmap_mode=self.mmap_mode)
             
             if isinstance(model_data, dict):
                 self.model = model_data['model']
                 self.scaler = model_data['scaler']
                 self.feature_names = model_data['feature_names']
+                self.metadata = model_data.get('metadata', {})
             else:
                 self.model = model_data
                 self.scaler = StandardScaler()  # Default scaler if none provided
             
+            self._prepare_fast_path()
+            if self.compile_forest:
+                self._prepare_engine()
+            
             logger.info(f"Model loaded successfully: {type(self.model).__name__}")
             
         except Exception as e:
             logger.error(f"Error loading model: {str(e)}")
             raise
     
+    def _prepare_fast_path(self) -> None:
+        """
+        Cache the scaler parameters and class labels used by predict_array.
+        """
+        self._offset = None
+        self._scale = None
+        self._scale_in_place = False
+        if isinstance(self.scaler, StandardScaler) and hasattr(self.scaler, 'scale_'):
+            # A fitted StandardScaler is just a subtract and a divide, done in place
+            self._scale_in_place = True
+            if self.scaler.with_mean:
+                self._offset = np.ascontiguousarray(self.scaler.mean_, dtype=np.float64)
+            if self.scaler.with_std:
+                self._scale = np.ascontiguousarray(self.scaler.scale_, dtype=np.float64)
+        
+        classes = getattr(self.model, 'classes_', None)
+        self._classes = classes if isinstance(classes, np.ndarray) else None
+    
+    def _prepare_engine(self) -> None:
+        """
+        Pack a tree ensemble model into flat node arrays for fast inference.
+        """
+        if not hasattr(self.model, 'estimators_'):
+            return
+        
+        cache = self.forest_cache
+        try:
+            if cache is not None and os.path.exists(os.path.join(cache, 'meta.json')):
+                try:
+                    self.engine = CompiledForest.load(cache, mmap_mode=self.mmap_mode)
+                    return
+                except ValueError as e:
+                    # Rebuilt in memory, the stale cache may be mapped by other workers
+                    logger.info(f"Not using compiled forest cache: {str(e)}")
+                    cache = None
+            
+            self.engine = CompiledForest.from_sklearn(self.model)
+            if cache is not None:
+                # Save to a temp directory and rename, another worker may be saving too
+                tmp_cache = f"{cache}.{uuid.uuid4().hex}.tmp"
+                self.engine.save(tmp_cache)
+                try:
+                    os.rename(tmp_cache, cache)
+                except OSError:
+                    shutil.rmtree(tmp_cache, ignore_errors=True)
+        except ValueError as e:
+            logger.info(f"Model not compiled: {str(e)}")
+    
+    def _labels_from_proba(self, data, probabilities: np.ndarray) -> np.ndarray:
+        # Same rule as the classifier's own predict, without a second pass over the trees
+        if self._classes is not None and isinstance(probabilities, np.ndarray):
+            return self._classes.take(np.argmax(probabilities, axis=1))
+        return self.model.predict(data)
+    
     def preprocess_data(self, data: pd.DataFrame) -> pd.DataFrame:
         """
         Preprocess the input data for prediction.
@@ -94,13 +179,14 @@ class Predictor:
             # Preprocess the data
             processed_data = self.preprocess_data(data)
             
-            # Make predictions
-            predictions = self.model.predict(processed_data)
-            
-            # Get prediction probabilities if available
+            # Get prediction probabilities if available, and derive the labels from them
             if hasattr(self.model, 'predict_proba'):
                 probabilities = self.model.predict_proba(processed_data)
+                predictions = self._labels_from_proba(processed_data, probabilities)
                 return predictions, probabilities
+            
+            # Make predictions
+            predictions = self.model.predict(processed_data)
                 
             return predictions
             
@@ -108,18 +194,173 @@ class Predictor:
             logger.error(f"Error making predictions: {str(e)}")
             raise
 
-# Global predictor instance
-_predictor = None
+    def rows_to_array(self, rows: List[Dict]) -> np.ndarray:
+        """
+        Pack feature dicts into a float matrix in feature_names order.
+        
+        The matrix is a view of a buffer reused by the calling thread, so it is
+        only valid until that thread's next call.
+        
+        Args:
+            rows (List[Dict]): Feature values by name, one dict per row
+            
+        Returns:
+            np.ndarray: Feature matrix of shape (len(rows), n_features)
+        """
+        if self.feature_names is None:
+            raise ValueError("Model has no feature names to order the input by")
+        
+        n_rows = len(rows)
+        buffer = getattr(self._buffers, 'array', None)
+        if buffer is None or buffer.shape[0] < n_rows:
+            buffer = np.empty((max(n_rows, 64), len(self.feature_names)), dtype=np.float64)
+            self._buffers.array = buffer
+        
+        X = buffer[:n_rows]
+        for i, row in enumerate(rows):
+            try:
+                X[i] = [row[name] for name in self.feature_names]
+            except KeyError:
+                raise ValueError(f"Missing required features: {set(self.feature_names) - set(row)}")
+        return X
+    
+    def predict_array(self, X: np.ndarray, copy: bool = True):
+        """
+        Make predictions from a dense feature matrix, bypassing pandas.
+        
+        Args:
+            X (np.ndarray): Matrix of shape (n_rows, n_features) with columns in
+                feature_names order
+            copy (bool): If False and X is a float64 array, X is scaled in place
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Predicted labels and class probabilities
+                (None if the model has no predict_proba)
+        """
+        try:
+            X = np.asarray(X, dtype=np.float64)
+            if X.ndim == 1:
+                X = X.reshape(1, -1)
+            if self.feature_names is not None and X.shape[1] != len(self.feature_names):
+                raise ValueError(f"Expected {len(self.feature_names)} features, got {X.shape[1]}")
+            
+            if self._scale_in_place:
+                if copy:
+                    X = X.copy()
+                if self._offset is not None:
+                    X -= self._offset
+                if self._scale is not None:
+                    X /= self._scale
+            elif self.scaler is not None:
+                X = self.scaler.transform(X)
+            
+            if self.engine is not None and X.shape[0] <= self.compiled_max_batch:
+                probabilities = self.engine.predict_proba(X)
+                return self.engine.classes.take(np.argmax(probabilities, axis=1)), probabilities
+            
+            if not hasattr(self.model, 'predict_proba'):
+                return self.model.predict(X), None
+            
+            probabilities = self.model.predict_proba(X)
+            return self._labels_from_proba(X, probabilities), probabilities
+            
+        except Exception as e:
+            logger.error(f"Error making predictions: {str(e)}")
+            raise
+    
+    def predict_rows(self, rows: List[Dict]):
+        """
+        Make predictions for feature dicts through the array fast path.
+        
+        Args:
+            rows (List[Dict]): Feature values by name, one dict per row
+            
+        Returns:
+            Tuple: Predicted labels and class probabilities
+        """
+        if self.feature_names is None:
+            result = self.predict(rows)
+            return result if isinstance(result, tuple) else (result, None)
+        return self.predict_array(self.rows_to_array(rows), copy=False)
+
+# Global model registry, serving the active Predictor
+_registry = None
 
-def init_predictor(model_path: str) -> None:
+# Dispatcher merging concurrent single-row predictions, None when batching is off
+_batcher = None
+
+# Results of repeated single-row predictions, None when caching is off
+_cache = None
+_init_lock = threading.Lock()
+
+def init_predictor(model_path: str,
+                   max_batch_size: int = 32,
+                   max_wait_ms: float = 2.0,
+                   max_versions: int = 3,
+                   reload_interval: float = 5.0,
+                   mmap_mode: Optional[str] = 'r',
+                   compile_forest: bool = True,
+                   compiled_max_batch: int = 512,
+                   cache_size: int = 10000,
+                   cache_ttl: Optional[float] = 300.0) -> None:
     """
     Initialize the global predictor instance.
     
     Args:
         model_path (str): Path to the trained model file
+        max_batch_size (int): Maximum rows merged into one model call, 1 disables batching
+        max_wait_ms (float): Maximum time a single-row request waits for a batch to fill
+        max_versions (int): Number of model versions kept loaded for rollback
+        reload_interval (float): Minimum seconds between checks for a retrained model file
+        mmap_mode (str, optional): joblib memory-map mode used when loading models
+        compile_forest (bool): Evaluate tree ensembles with the compiled forest engine
+        compiled_max_batch (int): Largest batch evaluated by the compiled forest
+        cache_size (int): Maximum cached single-row results, 0 disables the cache
+        cache_ttl (float, optional): Seconds a cached result stays valid
+    """
+    global _registry, _batcher, _cache
+    from .registry import ModelRegistry
+    
+    _registry = ModelRegistry(model_path, max_versions, reload_interval, mmap_mode,
+                              compile_forest=compile_forest, compiled_max_batch=compiled_max_batch)
+    _batcher = PredictionBatcher(_predict_rows, max_batch_size, max_wait_ms) if max_batch_size > 1 else None
+    _cache = PredictionCache(cache_size, cache_ttl) if cache_size > 0 else None
+    if _cache is not None:
+        # Results of the previous model must not be served after a reload
+        _registry.add_listener(_cache.clear)
+
+def ensure_predictor(model_path: str, **kwargs) -> None:
+    """
+    Initialize the global predictor instance unless it is initialized already.
+    
+    Args:
+        model_path (str): Path to the trained model file
+        **kwargs: Further arguments for init_predictor
+    """
+    if _registry is None:
+        with _init_lock:
+            if _registry is None:
+                init_predictor(model_path, **kwargs)
+
+def get_registry():
+    """
+    Get the global model registry.
+    
+    Returns:
+        ModelRegistry: Registry serving the active model
+    """
+    if _registry is None:
+        raise RuntimeError("Predictor not initialized. Call init_predictor first.")
+    return _registry
+
+def get_predictor() -> Predictor:
+    """
+    Get the predictor of the active model version.
+    
+    Returns:
+        Predictor: Active predictor
     """
-    global _predictor
-    _predictor = Predictor(model_path)
+    return get_registry().active()
 
 def make_prediction(data: Union[pd.DataFrame, Dict, List[Dict]]) -> np.ndarray:
     """
@@ -131,7 +372,66 @@ def make_prediction(data: Union[pd.DataFrame, Dict, List[Dict]]) -> np.ndarray:
     Returns:
         np.ndarray: Model predictions
     """
-    if _predictor is None:
-        raise RuntimeError("Predictor not initialized. Call init_predictor first.")
+    return get_predictor().predict(data)
+
+def _predict_rows(rows: List[Dict]):
+    labels, probabilities = get_predictor().predict_rows(rows)
+    if probabilities is None:
+        probabilities = [None] * len(labels)
+    return labels, probabilities
+
+def get_cache() -> Optional[PredictionCache]:
+    """
+    Get the global prediction cache.
+    
+    Returns:
+        PredictionCache: Cache of single-row results, None when caching is off
+    """
+    get_registry()
+    return _cache
+
+def _cache_key(version: str, predictor: Predictor, features: Dict) -> Optional[bytes]:
+    names = predictor.feature_names if predictor.feature_names is not None else sorted(features)
+    try:
+        return PredictionCache.make_key(version, [features[name] for name in names])
+    except (KeyError, TypeError, ValueError):
+        # Incomplete or non-numeric rows are not cached, the model reports the error
+        return None
+
+def _predict_uncached(features: Dict):
+    if _batcher is None:
+        labels, probabilities = _predict_rows([features])
+        return labels[0], probabilities[0]
+    return _batcher.predict(features)
+
+def predict_one(features: Dict):
+    """
+    Predict a single feature row, served from the cache for repeated rows and
+    batched with concurrent requests when enabled.
+    
+    Args:
+        features (Dict): Feature values by name
+        
+    Returns:
+        Tuple: Predicted label and class probabilities (None if the model has none)
+    """
+    registry = get_registry()
+    if _cache is None:
+        return _predict_uncached(features)
+    
+    version, predictor = registry.active_with_version()
+    key = _cache_key(version, predictor, features)
+    if key is None:
+        return _predict_uncached(features)
+    
+    result = _cache.get(key)
+    if result is not None:
+        return result
     
-    return _predictor.predict(data) 
\ No newline at end of file
+    generation = _cache.generation
+    label, probabilities = _predict_uncached(features)
+    if probabilities is not None:
+        # Copy the row so the cache does not keep the whole batch array alive
+        probabilities = np.array(probabilities)
+    _cache.put(key, (label, probabilities), generation)
+    return label, probabilities
@@ -0,0 +1,390 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Any
+from .predictor import Predictor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Versions are the first 16 hex digits of the snapshot's SHA-256
+_VERSION_PATTERN = re.compile(r'^[0-9a-f]{16}$')
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+class ModelRegistry:
+    """
+    Tracks the model file at ML_MODEL_PATH and serves its active version.
+    
+    Every new version of the file is snapshotted into a ``versions`` directory
+    next to it and loaded from there, so memory-mapped arrays always point at
+    an immutable file that forked workers can share. The last few versions
+    stay loaded for rollback. Changes to the model file are picked up on
+    access (at most once per check interval) and loaded in a background
+    thread; the active version is then swapped with a single reference
+    assignment, so in-flight predictions finish on the version they started
+    with.
+    
+    Every worker process has its own registry. The active version is also
+    written to ``versions/active.json``, which all of them follow, so a
+    rollback in one worker reaches the others on their next check. Each
+    process hard-links the snapshots it has loaded (``<version>.pkl.<pid>.pin``),
+    and a snapshot is deleted only once no link to it is left.
+    """
+    
+    def __init__(self,
+                 model_path: str,
+                 max_versions: int = 3,
+                 check_interval: float = 5.0,
+                 mmap_mode: Optional[str] = 'r',
+                 compile_forest: bool = True,
+                 compiled_max_batch: int = 512):
+        """
+        Initialize the registry and load the current model file.
+        
+        Args:
+            model_path (str): Path to the trained model file
+            max_versions (int): Number of loaded versions kept for rollback
+            check_interval (float): Minimum seconds between checks for a new model file
+            mmap_mode (str, optional): joblib memory-map mode used when loading versions
+            compile_forest (bool): Evaluate tree ensembles with the compiled forest engine
+            compiled_max_batch (int): Largest batch evaluated by the compiled forest
+        """
+        self.model_path = model_path
+        self.max_versions = max(1, max_versions)
+        self.check_interval = check_interval
+        self.mmap_mode = mmap_mode
+        self.compile_forest = compile_forest
+        self.compiled_max_batch = compiled_max_batch
+        self.versions_folder = os.path.join(os.path.dirname(os.path.abspath(model_path)), 'versions')
+        
+        self._versions = OrderedDict()
+        self._metadata = {}
+        self._active = (None, None)
+        self._fingerprint = None
+        self._pointer_stamp = None
+        self._last_check = 0.0
+        self._lock = threading.Lock()
+        self._reloading = False
+        self._listeners: List[Callable[[str], None]] = []
+        
+        self.reload(force=True)
+    
+    def _stat_fingerprint(self):
+        stat = os.stat(self.model_path)
+        return stat.st_mtime_ns, stat.st_size
+    
+    def _snapshot_path(self, version: str) -> str:
+        return os.path.join(self.versions_folder, version + '.pkl')
+    
+    def _pin_path(self, version: str, pid: Optional[int] = None) -> str:
+        return os.path.join(self.versions_folder, f"{version}.pkl.{pid or os.getpid()}.pin")
+    
+    def _pin(self, version: str) -> None:
+        # A hard link keeps the snapshot's link count above one while this process uses it
+        if not os.path.exists(self._pin_path(version)):
+            os.link(self._snapshot_path(version), self._pin_path(version))
+    
+    def _release(self, version: str) -> None:
+        # Drop this process's pin, and those of processes that are gone, then
+        # delete the snapshot if nothing else links to it
+        prefix = version + '.pkl.'
+        for name in os.listdir(self.versions_folder):
+            if not (name.startswith(prefix) and name.endswith('.pin')):
+                continue
+            try:
+                pid = int(name[len(prefix):-len('.pin')])
+            except ValueError:
+                continue
+            if pid == os.getpid() or not _process_alive(pid):
+                try:
+                    os.remove(os.path.join(self.versions_folder, name))
+                except FileNotFoundError:
+                    pass
+        
+        pointer = self._read_pointer()
+        if pointer is not None and pointer['version'] == version:
+            return
+        snapshot_path = self._snapshot_path(version)
+        try:
+            if os.stat(snapshot_path).st_nlink > 1:
+                return
+            os.remove(snapshot_path)
+        except FileNotFoundError:
+            return
+        shutil.rmtree(os.path.join(self.versions_folder, version + '.forest'), ignore_errors=True)
+    
+    def _pointer_path(self) -> str:
+        return os.path.join(self.versions_folder, 'active.json')
+    
+    def _stat_pointer(self) -> Optional[int]:
+        try:
+            return os.stat(self._pointer_path()).st_mtime_ns
+        except FileNotFoundError:
+            return None
+    
+    def _read_pointer(self) -> Optional[Dict[str, Any]]:
+        try:
+            with open(self._pointer_path()) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+    
+    def _write_pointer(self, version: str, fingerprint) -> None:
+        # The model file's fingerprint is kept so a newer model file wins over a rollback
+        os.makedirs(self.versions_folder, exist_ok=True)
+        tmp_path = f"{self._pointer_path()}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': version, 'model_fingerprint': list(fingerprint)}, f)
+        os.replace(tmp_path, self._pointer_path())
+    
+    def _snapshot(self) -> str:
+        # Copy first, then hash the copy, so the version matches the bytes we load
+        os.makedirs(self.versions_folder, exist_ok=True)
+        tmp_path = os.path.join(self.versions_folder, f".incoming.{os.getpid()}.{threading.get_ident()}")
+        shutil.copyfile(self.model_path, tmp_path)
+        
+        digest = hashlib.sha256()
+        with open(tmp_path, 'rb') as f:
+            for block in iter(lambda: f.read(1 << 20), b''):
+                digest.update(block)
+        version = digest.hexdigest()[:16]
+        
+        try:
+            # Pin an existing snapshot of these bytes right away, before anyone deletes it
+            self._pin(version)
+            os.remove(tmp_path)
+        except FileNotFoundError:
+            os.replace(tmp_path, self._snapshot_path(version))
+            self._pin(version)
+        return version
+    
+    def _load_snapshot(self, version: str, fingerprint) -> str:
+        if version in self._versions:
+            return version
+        
+        snapshot_path = self._snapshot_path(version)
+        # The packed forest arrays are kept next to the snapshot and memory-mapped too
+        predictor = Predictor(snapshot_path,
+                              mmap_mode=self.mmap_mode,
+                              compile_forest=self.compile_forest,
+                              compiled_max_batch=self.compiled_max_batch,
+                              forest_cache=os.path.join(self.versions_folder, version + '.forest'))
+        metadata = {
+            'version': version,
+            'model_type': type(predictor.model).__name__,
+            'features': list(predictor.feature_names) if predictor.feature_names is not None else [],
+            'last_updated': fingerprint[0] / 1e9,
+            'size': fingerprint[1],
+            'loaded_at': time.time(),
+            'metadata': predictor.metadata
+        }
+        
+        with self._lock:
+            self._versions[version] = predictor
+            self._metadata[version] = metadata
+        return version
+    
+    def _load_version(self, fingerprint) -> str:
+        return self._load_snapshot(self._snapshot(), fingerprint)
+    
+    def _load_pinned(self, version: str) -> str:
+        # A version chosen by another worker, loaded from its snapshot
+        if version not in self._versions:
+            self._pin(version)
+            stat = os.stat(self._snapshot_path(version))
+            self._load_snapshot(version, (stat.st_mtime_ns, stat.st_size))
+        return version
+    
+    def _activate(self, version: str) -> None:
+        evicted = []
+        with self._lock:
+            changed = version != self._active[0]
+            # One reference assignment, readers see either the old or the new pair
+            self._active = (version, self._versions[version])
+            self._versions.move_to_end(version)
+            # Drop the oldest inactive versions beyond the retention limit
+            while len(self._versions) > self.max_versions:
+                oldest = next(iter(self._versions))
+                self._versions.pop(oldest)
+                self._metadata.pop(oldest)
+                evicted.append(oldest)
+        
+        for oldest in evicted:
+            try:
+                self._release(oldest)
+            except OSError as e:
+                logger.error(f"Error releasing model version {oldest}: {str(e)}")
+        
+        if changed:
+            logger.info(f"Activated model version {version}")
+            for listener in list(self._listeners):
+                try:
+                    listener(version)
+                except Exception as e:
+                    logger.error(f"Model reload listener failed: {str(e)}")
+    
+    def reload(self, force: bool = False) -> bool:
+        """
+        Follow the shared active version, loading the model file if it changed.
+        
+        A rollback recorded for the current model file is followed; a model
+        file that changed since becomes the active version of every worker.
+        
+        Args:
+            force (bool): Reload even if nothing looks changed
+        
+        Returns:
+            bool: True if a different version became active
+        """
+        fingerprint = self._stat_fingerprint()
+        pointer_stamp = self._stat_pointer()
+        if not force and fingerprint == self._fingerprint and pointer_stamp == self._pointer_stamp:
+            return False
+        
+        previous = self._active[0]
+        pointer = self._read_pointer()
+        if pointer is not None and tuple(pointer['model_fingerprint']) == fingerprint:
+            version = self._load_pinned(pointer['version'])
+        else:
+            version = self._load_version(fingerprint)
+            self._write_pointer(version, fingerprint)
+            pointer_stamp = self._stat_pointer()
+        self._fingerprint = fingerprint
+        self._pointer_stamp = pointer_stamp
+        self._activate(version)
+        return version != previous
+    
+    def _reload_in_background(self) -> None:
+        try:
+            self.reload()
+        except Exception as e:
+            # Keep serving the current version, a half-written file is retried later
+            logger.error(f"Error reloading model: {str(e)}")
+        finally:
+            self._reloading = False
+    
+    def _check_for_update(self) -> None:
+        now = time.monotonic()
+        if self.check_interval is None or now - self._last_check < self.check_interval:
+            return
+        self._last_check = now
+        
+        try:
+            fingerprint = self._stat_fingerprint()
+        except OSError:
+            return
+        if fingerprint == self._fingerprint and self._stat_pointer() == self._pointer_stamp:
+            return
+        
+        with self._lock:
+            if self._reloading:
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload_in_background, name='model-reload', daemon=True).start()
+    
+    def active(self) -> Predictor:
+        """
+        Get the predictor of the active model version.
+        
+        Returns:
+            Predictor: Active predictor
+        """
+        self._check_for_update()
+        return self._active[1]
+    
+    def active_with_version(self):
+        """
+        Get the active version and its predictor as one consistent pair.
+        
+        Returns:
+            Tuple[str, Predictor]: Active version and predictor
+        """
+        self._check_for_update()
+        return self._active
+    
+    def version_path(self, version: Optional[str] = None) -> str:
+        """
+        Get the snapshot file of a model version, e.g. to load it in another process.
+        
+        Args:
+            version (str, optional): Version to locate, the active one if omitted
+        
+        Returns:
+            str: Path to the immutable model snapshot
+        """
+        version = version or self._active[0]
+        if version not in self._versions:
+            raise KeyError(f"Unknown model version: {version}")
+        return os.path.join(self.versions_folder, version + '.pkl')
+    
+    @property
+    def active_version(self) -> str:
+        return self._active[0]
+    
+    def metadata(self, version: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Get cached metadata of a model version without touching the model file.
+        
+        Args:
+            version (str, optional): Version to describe, the active one if omitted
+        
+        Returns:
+            Dict[str, Any]: Model metadata
+        """
+        self._check_for_update()
+        version = version or self._active[0]
+        metadata = self._metadata.get(version)
+        if metadata is None:
+            raise KeyError(f"Unknown model version: {version}")
+        return dict(metadata, active=version == self._active[0])
+    
+    def list_versions(self) -> List[Dict[str, Any]]:
+        """
+        Describe all loaded model versions, newest first.
+        
+        Returns:
+            List[Dict[str, Any]]: Metadata of every loaded version
+        """
+        with self._lock:
+            versions = list(reversed(self._versions))
+        return [self.metadata(version) for version in versions]
+    
+    def activate(self, version: str) -> None:
+        """
+        Make an earlier version active again in every worker, e.g. to roll back a bad model.
+        
+        Args:
+            version (str): Version to activate
+        """
+        if not _VERSION_PATTERN.match(version) or (
+                version not in self._versions and not os.path.exists(self._snapshot_path(version))):
+            raise KeyError(f"Unknown model version: {version}")
+        self._load_pinned(version)
+        self._write_pointer(version, self._fingerprint)
+        self._pointer_stamp = self._stat_pointer()
+        self._activate(version)
+    
+    def add_listener(self, callback: Callable[[str], None]) -> None:
+        """
+        Register a callback run with the new version whenever the active model changes.
+        
+        Args:
+            callback (Callable): Called with the newly active version
+        """
+        self._listeners.append(callback)
@@ -2,9 +2,30 @@ import pandas as pd
 import numpy as np
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.preprocessing import StandardScaler
-from sklearn.model_selection import train_test_split
+from sklearn.model_selection import train_test_split, GridSearchCV
 import joblib
 import os
+import sys
+import time
+import resource
+import argparse
+import threading
+import tracemalloc
+from contextlib import contextmanager
+from ..utils.file_handler import iter_processed_chunks, DEFAULT_CHUNK_SIZE
+
+# Hyperparameters searched when no grid is given
+DEFAULT_PARAM_GRID = {
+    'n_estimators': [100, 200],
+    'max_depth': [None, 20],
+    'min_samples_leaf': [1, 5]
+}
+
+# Rows scaled at once when standardizing the loaded data
+_SCALE_BLOCK = 1 << 16
+
+# Seconds between samples of the worker processes' memory during a stage
+_WORKER_SAMPLE_INTERVAL = 0.5
 
 def generate_sample_data(n_samples=1000):
     """Generate sample data for demonstration."""
@@ -64,5 +85,254 @@ def train_and_save_model():
     joblib.dump(model_data, model_path)
     print(f"Model saved to {model_path}")
 
+def _max_rss_mb(who) -> float:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    max_rss = resource.getrusage(who).ru_maxrss
+    return max_rss / (1 << 20) if sys.platform == 'darwin' else max_rss / (1 << 10)
+
+def _workers_rss_mb():
+    # Largest resident set of any live descendant process, e.g. a reused
+    # joblib worker, which RUSAGE_CHILDREN does not count. Read from /proc,
+    # None where it does not exist
+    if not os.path.isdir('/proc'):
+        return None
+    parents, rss = {}, {}
+    page_size = os.sysconf('SC_PAGE_SIZE')
+    for name in os.listdir('/proc'):
+        if not name.isdigit():
+            continue
+        try:
+            with open(f'/proc/{name}/stat') as f:
+                stat = f.read()
+            with open(f'/proc/{name}/statm') as f:
+                resident_pages = int(f.read().split()[1])
+        except (OSError, ValueError, IndexError):
+            continue
+        # The command name may contain spaces, the fields after it do not
+        parents[int(name)] = int(stat.rsplit(')', 1)[1].split()[1])
+        rss[int(name)] = resident_pages * page_size
+    
+    descendants, frontier = set(), {os.getpid()}
+    while frontier:
+        frontier = {pid for pid, parent in parents.items() if parent in frontier} - descendants
+        descendants |= frontier
+    return max((rss[pid] for pid in descendants), default=0) / (1 << 20)
+
+@contextmanager
+def _stage(name, report):
+    """Record wall time and peak memory of a training stage in report."""
+    tracing = tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.reset_peak()
+    
+    # Workers are sampled while the stage runs, they are still alive after it
+    workers_peak = [None]
+    done = threading.Event()
+    
+    def sample_workers():
+        while True:
+            current = _workers_rss_mb()
+            if current is not None:
+                workers_peak[0] = max(workers_peak[0] or 0.0, current)
+            if done.wait(_WORKER_SAMPLE_INTERVAL):
+                return
+    
+    sampler = threading.Thread(target=sample_workers, name=f'{name}-memory', daemon=True)
+    sampler.start()
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        done.set()
+        sampler.join()
+    
+    report[name] = {
+        'wall_time': round(time.perf_counter() - started, 3),
+        'max_rss_mb': round(_max_rss_mb(resource.RUSAGE_SELF), 1),
+        'workers_max_rss_mb': round(workers_peak[0], 1) if workers_peak[0] is not None else None
+    }
+    if tracing:
+        report[name]['peak_traced_mb'] = round(tracemalloc.get_traced_memory()[1] / (1 << 20), 1)
+    print(f"{name}: {report[name]['wall_time']:.2f}s, {report[name]['max_rss_mb']:.1f} MB RSS"
+          + (f", peak {report[name]['peak_traced_mb']:.1f} MB traced" if tracing else ''))
+
+def load_training_data(filepath, target, features=None, chunksize=DEFAULT_CHUNK_SIZE):
+    """
+    Read an uploaded dataset in chunks into a float64 feature matrix.
+    
+    Only the feature and target columns of each chunk are kept, so the full
+    DataFrame is never built.
+    
+    Returns:
+        tuple: Feature matrix, target vector and feature names
+    """
+    X_chunks, y_chunks = [], []
+    for chunk in iter_processed_chunks(filepath, chunksize=chunksize):
+        if target not in chunk.columns:
+            raise ValueError(f"Target column not found: {target}")
+        if features is None:
+            features = [column for column in chunk.select_dtypes(include=[np.number]).columns
+                        if column != target]
+            if not features:
+                raise ValueError("Dataset has no numeric feature columns")
+        
+        # Rows still missing values after the forward fill cannot be used
+        chunk = chunk[features + [target]].dropna()
+        if chunk.empty:
+            continue
+        X_chunks.append(chunk[features].to_numpy(dtype=np.float64))
+        y_chunks.append(chunk[target].to_numpy())
+    
+    if not X_chunks:
+        raise ValueError("Dataset has no complete rows to train on")
+    
+    X = np.concatenate(X_chunks)
+    del X_chunks
+    return X, np.concatenate(y_chunks), list(features)
+
+def fit_scaler(X, rows):
+    """
+    Fit a StandardScaler on some rows of a feature matrix, block by block.
+    
+    Returns:
+        StandardScaler: Fitted scaler
+    """
+    scaler = StandardScaler()
+    for start in range(0, len(rows), _SCALE_BLOCK):
+        scaler.partial_fit(X[rows[start:start + _SCALE_BLOCK]])
+    return scaler
+
+def scale_rows(X, rows, scaler):
+    """
+    Standardize some rows of a float64 feature matrix into a float32 matrix.
+    
+    Raw values are scaled in float64, as the predictor does, and only the
+    result is narrowed to float32, the type the forest compares in, so
+    training and serving see identical values.
+    
+    Returns:
+        np.ndarray: Scaled rows
+    """
+    scaled = np.empty((len(rows), X.shape[1]), dtype=np.float32)
+    for start in range(0, len(rows), _SCALE_BLOCK):
+        scaled[start:start + _SCALE_BLOCK] = scaler.transform(X[rows[start:start + _SCALE_BLOCK]])
+    return scaled
+
+def train_from_dataset(filepath, target, features=None, model_path=None, chunksize=DEFAULT_CHUNK_SIZE,
+                       param_grid=None, cv=3, search_rows=200000, test_size=0.2, n_jobs=-1,
+                       random_state=42, trace_memory=False):
+    """
+    Train a model on an uploaded dataset and save it in the predictor's layout.
+    
+    The hyperparameter search runs cross-validation folds in a process pool
+    on a random sample of at most search_rows training rows; the final
+    forest is then fitted on all training rows using every core. The scaler
+    is fitted on the training rows only. With trace_memory, the peak Python
+    allocation of every stage is traced too, which slows loading down.
+    
+    Returns:
+        dict: Scores, best parameters and per-stage wall time and memory
+    """
+    model_path = model_path or os.path.join(os.path.dirname(__file__), 'model.pkl')
+    param_grid = param_grid or DEFAULT_PARAM_GRID
+    report = {}
+    
+    tracing = tracemalloc.is_tracing()
+    if trace_memory and not tracing:
+        tracemalloc.start()
+    try:
+        with _stage('load', report):
+            X, y, feature_names = load_training_data(filepath, target, features, chunksize)
+            train_rows, test_rows = train_test_split(np.arange(len(X)), test_size=test_size,
+                                                     random_state=random_state)
+            scaler = fit_scaler(X, train_rows)
+            X_train, X_test = scale_rows(X, train_rows, scaler), scale_rows(X, test_rows, scaler)
+            y_train, y_test = y[train_rows], y[test_rows]
+            del X, y
+        
+        with _stage('search', report):
+            rng = np.random.default_rng(random_state)
+            if len(X_train) > search_rows:
+                sample = np.sort(rng.choice(len(X_train), search_rows, replace=False))
+                X_search, y_search = X_train[sample], y_train[sample]
+            else:
+                X_search, y_search = X_train, y_train
+            # Single-threaded forests, the pool parallelizes over candidates and folds
+            search = GridSearchCV(RandomForestClassifier(random_state=random_state, n_jobs=1),
+                                  param_grid, cv=cv, n_jobs=n_jobs)
+            search.fit(X_search, y_search)
+            del X_search, y_search
+        
+        with _stage('fit', report):
+            model = RandomForestClassifier(random_state=random_state, n_jobs=n_jobs, **search.best_params_)
+            model.fit(X_train, y_train)
+        
+        with _stage('evaluate', report):
+            test_score = model.score(X_test, y_test)
+            train_sample = slice(0, min(len(X_train), search_rows))
+            train_score = model.score(X_train[train_sample], y_train[train_sample])
+            # Serve single-threaded, requests are parallel already
+            model.n_jobs = None
+        
+        with _stage('save', report):
+            model_data = {
+                'model': model,
+                'scaler': scaler,
+                'feature_names': feature_names,
+                'metadata': {
+                    'training_accuracy': train_score,
+                    'testing_accuracy': test_score,
+                    'cv_accuracy': search.best_score_,
+                    'best_params': search.best_params_,
+                    'n_samples': len(X_train) + len(X_test),
+                    'n_features': len(feature_names),
+                    'feature_names': feature_names,
+                    'target': target,
+                    'stages': report
+                }
+            }
+            # Write beside the model and rename, the registry must never load a partial file
+            tmp_path = f"{model_path}.{os.getpid()}.tmp"
+            joblib.dump(model_data, tmp_path)
+            os.replace(tmp_path, model_path)
+    finally:
+        if trace_memory and not tracing:
+            tracemalloc.stop()
+    
+    print(f"Best parameters: {search.best_params_} (cv accuracy {search.best_score_:.4f})")
+    print(f"Training accuracy: {train_score:.4f}")
+    print(f"Testing accuracy: {test_score:.4f}")
+    print(f"Model saved to {model_path}")
+    return {
+        'training_accuracy': train_score,
+        'testing_accuracy': test_score,
+        'cv_accuracy': search.best_score_,
+        'best_params': search.best_params_,
+        'stages': report
+    }
+
+def main(argv=None):
+    """Train on an uploaded dataset, or on sample data without --data."""
+    parser = argparse.ArgumentParser(description="Train the prediction model.")
+    parser.add_argument('--data', help="CSV or Excel file to train on")
+    parser.add_argument('--target', help="Name of the label column")
+    parser.add_argument('--features', nargs='+', help="Feature columns, all numeric columns by default")
+    parser.add_argument('--output', help="Model file to write, model.pkl next to this script by default")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNK_SIZE)
+    parser.add_argument('--cv', type=int, default=3)
+    parser.add_argument('--search-rows', type=int, default=200000)
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--trace-memory', action='store_true', help="Trace peak Python allocations per stage")
+    args = parser.parse_args(argv)
+    
+    if args.data is None:
+        train_and_save_model()
+        return
+    if args.target is None:
+        parser.error("--target is required with --data")
+    train_from_dataset(args.data, args.target, features=args.features, model_path=args.output,
+                       chunksize=args.chunksize, cv=args.cv, search_rows=args.search_rows,
+                       n_jobs=args.n_jobs, trace_memory=args.trace_memory)
+
 if __name__ == '__main__':
-    train_and_save_model() 
\ No newline at end of file
+    main() 
\ No newline at end of file
@@ -1,11 +1,12 @@
 from . import db
+import json
 from datetime import datetime
 from werkzeug.security import generate_password_hash, check_password_hash
 
 class User(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     email = db.Column(db.String(120), unique=True, nullable=False)
-    password_hash = db.Column(db.String(128), nullable=False)
+    password_hash = db.Column(db.String(256), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     last_login = db.Column(db.DateTime)
     
@@ -21,4 +22,83 @@ class User(db.Model):
             'email': self.email,
             'created_at': self.created_at.isoformat(),
             'last_login': self.last_login.isoformat() if self.last_login else None
-        } 
\ No newline at end of file
+        } 
+
+class Report(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    user_email = db.Column(db.String(120), nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    fields = db.Column(db.Text, nullable=False)
+    payload_size = db.Column(db.Integer, nullable=False)
+    content_digest = db.Column(db.String(64), nullable=False)
+    sections = db.relationship('ReportSection', backref='report', lazy='dynamic', cascade='all, delete-orphan')
+    
+    # Listing a user's reports newest first walks this index
+    __table_args__ = (db.Index('ix_report_user_created', 'user_email', 'created_at', 'id'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user': self.user_email,
+            'timestamp': self.created_at.isoformat(),
+            'fields': json.loads(self.fields),
+            'size': self.payload_size,
+            'digest': self.content_digest
+        }
+
+class ReportSection(db.Model):
+    # One compressed top-level field of a report body, so fields load independently
+    report_id = db.Column(db.String(32), db.ForeignKey('report.id', ondelete='CASCADE'), primary_key=True)
+    name = db.Column(db.String(255), primary_key=True)
+    payload = db.Column(db.LargeBinary, nullable=False)
+
+class ChatMessage(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    user_email = db.Column(db.String(120), nullable=False)
+    message = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Pages of one user's history are ranges of this index
+    __table_args__ = (db.Index('ix_chat_message_user_id', 'user_email', 'id'),)
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'user': self.user_email,
+            'message': self.message,
+            'timestamp': self.created_at.isoformat()
+        }
+
+
+class Upload(db.Model):
+    id = db.Column(db.String(32), primary_key=True)
+    # None for files uploaded before the catalog existed, which everyone can see
+    owner = db.Column(db.String(120))
+    filename = db.Column(db.String(255), nullable=False)
+    content_hash = db.Column(db.String(64), nullable=False)
+    extension = db.Column(db.String(16), nullable=False)
+    size = db.Column(db.BigInteger, nullable=False)
+    row_count = db.Column(db.Integer)
+    column_count = db.Column(db.Integer)
+    stats = db.Column(db.Text)
+    # Sheet and columns the file was read with, JSON; None reads everything
+    read_options = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    # Listings walk the first index, dedupe looks content up in the second
+    __table_args__ = (
+        db.UniqueConstraint('owner', 'filename', name='uq_upload_owner_filename'),
+        db.Index('ix_upload_owner_created', 'owner', 'created_at', 'id'),
+        db.Index('ix_upload_content_hash', 'content_hash')
+    )
+    
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.filename,
+            'size': self.size,
+            'rows': self.row_count,
+            'columns': self.column_count,
+            'content_hash': self.content_hash,
+            'uploaded_at': self.created_at.isoformat()
+        }
@@ -1,32 +1,22 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
-from werkzeug.security import generate_password_hash, check_password_hash
+from .. import jwt
 from ..utils.auth import validate_email, validate_password
-import os
-import json
+from ..utils.hashing import hashing_pool, HashingBusyError
+from ..utils.user_store import get_user, create_user, record_login, update_password_hash, UserExistsError
 
 bp = Blueprint('auth', __name__, url_prefix='/api/auth')
 
-# File-based user storage
-USERS_FILE = 'users.json'
-
-def load_users():
-    if os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'r') as f:
-            return json.load(f)
-    return {}
-
-def save_users(users):
-    with open(USERS_FILE, 'w') as f:
-        json.dump(users, f)
-
-# Load users on startup
-users = load_users()
+@bp.errorhandler(HashingBusyError)
+def hashing_busy(e):
+    # Shed the request instead of queueing it behind the hashing backlog
+    response = jsonify({'error': 'Server busy, please retry'})
+    response.headers['Retry-After'] = str(current_app.config['PASSWORD_HASH_RETRY_AFTER'])
+    return response, 503
 
 @bp.route('/register', methods=['POST'])
 def register():
     data = request.get_json()
-    print("Register request received:", data)
     
     # Validate input
     if not all(k in data for k in ('email', 'password')):
@@ -42,15 +32,14 @@ def register():
         return jsonify({'error': 'Password must be at least 8 characters long'}), 400
     
     # Check if user already exists
-    if email in users:
+    if get_user(email) is not None:
         return jsonify({'error': 'User already exists'}), 409
     
     # Create new user
-    users[email] = {
-        'password_hash': generate_password_hash(password),
-        'email': email
-    }
-    save_users(users)
+    try:
+        create_user(email, hashing_pool.generate(password))
+    except UserExistsError:
+        return jsonify({'error': 'User already exists'}), 409
     
     # Create access token
     access_token = create_access_token(identity=email)
@@ -68,7 +57,6 @@ def login():
         
     try:
         data = request.get_json()
-        print("Login request received:", data)
         
         # Validate input
         if not all(k in data for k in ('email', 'password')):
@@ -79,15 +67,25 @@ def login():
         password = data['password']
         
         # Check if user exists
-        if email not in users:
+        user = get_user(email)
+        if user is None:
             print(f"User not found: {email}")
             return jsonify({'error': 'Invalid credentials'}), 401
         
         # Verify password
-        if not check_password_hash(users[email]['password_hash'], password):
+        if not hashing_pool.check(user.password_hash, password):
             print(f"Invalid password for user: {email}")
             return jsonify({'error': 'Invalid credentials'}), 401
         
+        # Upgrade hashes made with an older method or cost while we have the password
+        if hashing_pool.needs_rehash(user.password_hash):
+            try:
+                update_password_hash(user, hashing_pool.generate(password))
+            except HashingBusyError:
+                pass
+        
+        record_login(user)
+        
         # Create access token
         access_token = create_access_token(identity=email)
         print(f"Login successful for user: {email}")
@@ -98,6 +96,8 @@ def login():
         })
         
         return response, 200
+    except HashingBusyError:
+        raise
     except Exception as e:
         print(f"Login error: {str(e)}")
         return jsonify({'error': 'Internal server error'}), 500
@@ -109,4 +109,9 @@ def get_current_user():
     return jsonify({
         'email': current_user,
         'message': 'Protected route accessed successfully'
-    }), 200 
\ No newline at end of file
+    }), 200 
+
+@bp.route('/token-cache', methods=['GET'])
+@jwt_required()
+def get_token_cache_stats():
+    return jsonify(jwt.cache_stats()), 200
\ No newline at end of file
@@ -1,11 +1,11 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import datetime
+from ..utils.chat_store import chat_store
 
 bp = Blueprint('chat', __name__, url_prefix='/api/chat')
 
-# In-memory chat history (replace with database in production)
-chat_history = []
+# Largest page of messages returned by one history request
+MAX_PAGE_SIZE = 100
 
 @bp.route('/message', methods=['POST'])
 @jwt_required()
@@ -14,16 +14,42 @@ def send_message():
     if not data or 'message' not in data:
         return jsonify({'error': 'Message is required'}), 400
     
-    message = {
-        'user': get_jwt_identity(),
-        'message': data['message'],
-        'timestamp': datetime.datetime.now().isoformat()
-    }
-    
-    chat_history.append(message)
-    return jsonify({'message': 'Message sent successfully'}), 200
+    message = chat_store.append(get_jwt_identity(), str(data['message']))
+    return jsonify({
+        'message': 'Message sent successfully',
+        'id': message['id']
+    }), 200
 
 @bp.route('/history', methods=['GET'])
 @jwt_required()
 def get_history():
-    return jsonify({'messages': chat_history}), 200 
\ No newline at end of file
+    # Pages walk back from the newest message, ?cursor= continues from next_cursor
+    try:
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_PAGE_SIZE)
+        cursor = request.args.get('cursor')
+        before = int(cursor) if cursor else None
+    except ValueError:
+        return jsonify({'error': 'Invalid limit or cursor'}), 400
+    
+    messages, next_cursor = chat_store.history(get_jwt_identity(), before, limit)
+    return jsonify({
+        'messages': messages,
+        'next_cursor': next_cursor
+    }), 200
+
+@bp.route('/updates', methods=['GET'])
+@jwt_required()
+def get_updates():
+    # Long poll: answers when a message newer than ?after= arrives, or empty on timeout
+    try:
+        after = int(request.args.get('after', 0))
+        timeout = float(request.args.get('timeout', current_app.config['CHAT_POLL_TIMEOUT']))
+    except ValueError:
+        return jsonify({'error': 'Invalid after or timeout'}), 400
+    timeout = min(max(timeout, 0.0), current_app.config['CHAT_POLL_TIMEOUT'])
+    
+    messages = chat_store.wait_for_messages(get_jwt_identity(), after, timeout)
+    return jsonify({
+        'messages': messages,
+        'last_id': messages[-1]['id'] if messages else after
+    }), 200
@@ -0,0 +1,109 @@
+import os
+from flask import Blueprint, request, jsonify, current_app, send_file
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from werkzeug.utils import secure_filename
+from ..utils.query_engine import query_engine
+from ..utils.nl_query import question_to_query
+from ..utils.kpis import kpi_settings, kpi_path, materialize_kpis
+from ..utils.downsample import downsample_series
+
+bp = Blueprint('data', __name__, url_prefix='/api/data')
+
+@bp.route('/<filename>/query', methods=['POST'])
+@jwt_required()
+def query_dataset(filename):
+    spec = request.get_json(silent=True)
+    if spec is None:
+        return jsonify({'error': 'Query is required'}), 400
+    
+    try:
+        result = query_engine.run(get_jwt_identity(), secure_filename(filename), spec)
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify(result), 200
+
+@bp.route('/<filename>/ask', methods=['POST'])
+@jwt_required()
+def ask_dataset(filename):
+    data = request.get_json(silent=True)
+    if not data or not data.get('question'):
+        return jsonify({'error': 'Question is required'}), 400
+    
+    filename = secure_filename(filename)
+    try:
+        columns = query_engine.columns(get_jwt_identity(), filename)
+        spec, interpretation = question_to_query(str(data['question']), columns)
+        result = query_engine.run(get_jwt_identity(), filename, spec)
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'question': data['question'],
+        'interpretation': interpretation,
+        'query': spec,
+        'result': result
+    }), 200
+
+@bp.route('/<filename>/kpis', methods=['GET'])
+@jwt_required()
+def get_kpis(filename):
+    # KPIs are materialized when the file is uploaded, so this only sends a
+    # small file whatever the size of the dataset
+    try:
+        digest = query_engine.dataset_digest(get_jwt_identity(), secure_filename(filename))
+        settings = kpi_settings(current_app.config)
+        path = kpi_path(current_app.config['DATASET_CACHE_FOLDER'], digest, settings)
+        if not os.path.exists(path):
+            path = materialize_kpis(current_app.config['DATASET_CACHE_FOLDER'], digest, settings)
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    # The file name changes with the content, so clients can revalidate cheaply
+    response = send_file(path, mimetype='application/json', etag=os.path.basename(path), conditional=True)
+    response.cache_control.no_cache = True
+    return response
+
+@bp.route('/<filename>/series', methods=['GET'])
+@jwt_required()
+def get_series(filename):
+    # ?x=&y= name the columns, ?start=&end= zoom into a range of x
+    x_column = request.args.get('x')
+    y_column = request.args.get('y')
+    if not x_column or not y_column:
+        return jsonify({'error': 'x and y columns are required'}), 400
+    
+    try:
+        points = int(request.args.get('points', current_app.config['SERIES_DEFAULT_POINTS']))
+        points = min(points, current_app.config['SERIES_MAX_POINTS'])
+        digest = query_engine.dataset_digest(get_jwt_identity(), secure_filename(filename))
+        series = downsample_series(current_app.config['DATASET_CACHE_FOLDER'], digest,
+                                   x_column, y_column, points,
+                                   method=request.args.get('method', 'lttb'),
+                                   start=request.args.get('start'),
+                                   end=request.args.get('end'))
+    except FileNotFoundError:
+        return jsonify({'error': 'File not found'}), 404
+    except (KeyError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify(series), 200
+
+@bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    return jsonify(query_engine.cache_stats()), 200
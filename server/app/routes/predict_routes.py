@@ -1,12 +1,32 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required
+from flask import Blueprint, request, jsonify, current_app, send_file
+from werkzeug.utils import secure_filename
+from flask_jwt_extended import jwt_required, get_jwt_identity
 import pandas as pd
-import joblib
 import os
-from ..ml.predictor import make_prediction
+from ..ml.predictor import make_prediction, predict_one, ensure_predictor, get_registry, get_cache
+from ..ml.batch_scoring import pin_model, run_scoring_job
+from ..utils.jobs import job_queue, create_job, get_job
+from ..utils.upload_store import get_upload, upload_path, upload_read_options
+from ..utils.streaming import wants_stream, ndjson_response
 
 bp = Blueprint('predict', __name__, url_prefix='/api/predict')
 
+def _ensure_predictor():
+    ensure_predictor(current_app.config['ML_MODEL_PATH'],
+                     max_batch_size=current_app.config['PREDICT_BATCH_MAX_SIZE'],
+                     max_wait_ms=current_app.config['PREDICT_BATCH_MAX_WAIT_MS'],
+                     max_versions=current_app.config['MODEL_MAX_VERSIONS'],
+                     reload_interval=current_app.config['MODEL_RELOAD_INTERVAL'],
+                     compile_forest=current_app.config['ML_COMPILED_FOREST'],
+                     compiled_max_batch=current_app.config['ML_COMPILED_FOREST_MAX_BATCH'],
+                     cache_size=current_app.config['PREDICT_CACHE_SIZE'],
+                     cache_ttl=current_app.config['PREDICT_CACHE_TTL'])
+
+def _is_model_admin():
+    # Swapping the model changes predictions for everyone, so only the
+    # users listed in MODEL_ADMINS may do it
+    return get_jwt_identity() in current_app.config['MODEL_ADMINS']
+
 @bp.route('/model-info', methods=['GET'])
 @jwt_required()
 def get_model_info():
@@ -15,15 +35,74 @@ def get_model_info():
         if not os.path.exists(model_path):
             return jsonify({'error': 'Model not found'}), 404
         
-        model = joblib.load(model_path)
+        # Served from the registry's cached metadata, the model is not reloaded
+        _ensure_predictor()
+        info = get_registry().metadata()
+        return jsonify({
+            'model_type': info['model_type'],
+            'features': info['features'],
+            'last_updated': info['last_updated'],
+            'version': info['version']
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/models', methods=['GET'])
+@jwt_required()
+def list_models():
+    try:
+        _ensure_predictor()
+        registry = get_registry()
+        return jsonify({
+            'active_version': registry.active_version,
+            'versions': registry.list_versions()
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/models/reload', methods=['POST'])
+@jwt_required()
+def reload_model():
+    if not _is_model_admin():
+        return jsonify({'error': 'Not allowed to manage models'}), 403
+    try:
+        _ensure_predictor()
+        registry = get_registry()
+        changed = registry.reload()
         return jsonify({
-            'model_type': type(model).__name__,
-            'features': model.feature_names_in_.tolist() if hasattr(model, 'feature_names_in_') else [],
-            'last_updated': os.path.getmtime(model_path)
+            'reloaded': changed,
+            'active_version': registry.active_version
         }), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@bp.route('/models/<version>/activate', methods=['POST'])
+@jwt_required()
+def activate_model(version):
+    if not _is_model_admin():
+        return jsonify({'error': 'Not allowed to manage models'}), 403
+    try:
+        _ensure_predictor()
+        registry = get_registry()
+        registry.activate(version)
+        return jsonify({'active_version': registry.active_version}), 200
+    except KeyError:
+        return jsonify({'error': 'Model version not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/cache-stats', methods=['GET'])
+@jwt_required()
+def get_cache_stats():
+    try:
+        _ensure_predictor()
+        cache = get_cache()
+        if cache is None:
+            return jsonify({'enabled': False}), 200
+        return jsonify(dict(cache.stats(), enabled=True, model_version=get_registry().active_version)), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @bp.route('/predict', methods=['POST'])
 @jwt_required()
 def predict():
@@ -32,20 +111,31 @@ def predict():
         if not data or 'features' not in data:
             return jsonify({'error': 'No features provided'}), 400
         
-        # Convert features to DataFrame
-        features = pd.DataFrame([data['features']])
+        _ensure_predictor()
         
-        # Make prediction
-        prediction = make_prediction(features)
+        # Make prediction, batched with concurrent single-row requests
+        label, probabilities = predict_one(data['features'])
         
         return jsonify({
-            'prediction': prediction.tolist(),
-            'confidence': None  # Add confidence scores if available
+            'prediction': [label.item() if hasattr(label, 'item') else label],
+            'confidence': float(max(probabilities)) if probabilities is not None else None
         }), 200
-        
+    
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def _stream_predictions(features_list, chunk_size):
+    # One version for the whole stream, even if the model is reloaded meanwhile
+    version, predictor = get_registry().active_with_version()
+    for start in range(0, len(features_list), chunk_size):
+        labels, probabilities = predictor.predict_rows(features_list[start:start + chunk_size])
+        for i, label in enumerate(labels):
+            record = {'index': start + i, 'prediction': label}
+            if probabilities is not None:
+                record['confidence'] = float(probabilities[i].max())
+            yield record
+    yield {'count': len(features_list), 'model_version': version}
+
 @bp.route('/batch-predict', methods=['POST'])
 @jwt_required()
 def batch_predict():
@@ -54,16 +144,110 @@ def batch_predict():
         if not data or 'features_list' not in data:
             return jsonify({'error': 'No features list provided'}), 400
         
+        _ensure_predictor()
+        
+        # Opt-in streaming: records are sent as each chunk is predicted
+        if wants_stream():
+            if not isinstance(data['features_list'], list):
+                return jsonify({'error': 'features_list must be a list'}), 400
+            return ndjson_response(_stream_predictions(data['features_list'],
+                                                       current_app.config['PREDICT_STREAM_CHUNK_SIZE']))
+        
         # Convert features to DataFrame
         features = pd.DataFrame(data['features_list'])
         
         # Make predictions
         predictions = make_prediction(features)
+        if isinstance(predictions, tuple):
+            predictions = predictions[0]
         
         return jsonify({
             'predictions': predictions.tolist(),
             'count': len(predictions)
         }), 200
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500 
+
+@bp.route('/score', methods=['POST'])
+@jwt_required()
+def score_upload():
+    try:
+        data = request.get_json()
+        if not data or 'filename' not in data:
+            return jsonify({'error': 'No filename provided'}), 400
+        
+        filename = secure_filename(data['filename'])
+        upload = get_upload(get_jwt_identity(), filename)
+        if upload is None:
+            return jsonify({'error': 'File not found'}), 404
+        filepath = upload_path(current_app.config['UPLOAD_FOLDER'], upload)
+        
+        _ensure_predictor()
+        
+        # Score with a snapshot of the active version, so a reload mid-job does not mix models
+        registry = get_registry()
+        version = registry.active_version
+        
+        job = create_job(job_queue.jobs_folder, 'score', owner=get_jwt_identity(),
+                         filename=filename, model_version=version)
+        output_path = os.path.join(current_app.config['SCORING_OUTPUT_FOLDER'], f"{job['id']}.csv")
+        # Old snapshots are evicted as new versions load, keep this one until the job ends
+        model_path = pin_model(registry.version_path(version), job_queue.jobs_folder, job['id'])
+        job_queue.submit(job, run_scoring_job, filepath, model_path, output_path,
+                         current_app.config['UPLOAD_CHUNK_SIZE'],
+                         current_app.config['SCORING_WORKERS'],
+                         upload_read_options(upload))
+        
+        return jsonify({
+            'message': 'Scoring job accepted',
+            'filename': filename,
+            'model_version': version,
+            'job_id': job['id']
+        }), 202
+    
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def _get_score_job(job_id):
+    job = get_job(job_queue.jobs_folder, job_id)
+    if job is None or job['type'] != 'score' or job['owner'] != get_jwt_identity():
+        return None
+    return job
+
+@bp.route('/score/<job_id>', methods=['GET'])
+@jwt_required()
+def get_score_job(job_id):
+    try:
+        job = _get_score_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        
+        return jsonify({
+            'job_id': job['id'],
+            'filename': job['filename'],
+            'model_version': job['model_version'],
+            'status': job['status'],
+            'progress': job['progress'],
+            'rows_processed': job['rows_processed'],
+            'result': job['result'],
+            'error': job['error']
+        }), 200
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/score/<job_id>/download', methods=['GET'])
+@jwt_required()
+def download_scores(job_id):
+    try:
+        job = _get_score_job(job_id)
+        if job is None:
+            return jsonify({'error': 'Job not found'}), 404
+        if job['status'] != 'completed':
+            return jsonify({'error': 'Scoring has not completed'}), 409
         
+        output_path = os.path.join(current_app.config['SCORING_OUTPUT_FOLDER'], job['result']['output_file'])
+        return send_file(output_path, mimetype='text/csv', as_attachment=True,
+                         download_name=f"{os.path.splitext(job['filename'])[0]}_scored.csv")
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
\ No newline at end of file
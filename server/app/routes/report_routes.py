@@ -1,11 +1,12 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, send_file
 from flask_jwt_extended import jwt_required, get_jwt_identity
-import datetime
+from ..utils.report_store import create_report, get_report as load_report, list_reports
+from ..utils.pdf_renderer import pdf_renderer, RendererBusyError
 
 bp = Blueprint('report', __name__, url_prefix='/api/report')
 
-# In-memory report storage (replace with database in production)
-reports = {}
+# Largest page of reports returned by one listing request
+MAX_PAGE_SIZE = 100
 
 @bp.route('/generate', methods=['POST'])
 @jwt_required()
@@ -14,23 +15,74 @@ def generate_report():
     if not data:
         return jsonify({'error': 'No data provided'}), 400
     
-    report_id = str(len(reports) + 1)
-    reports[report_id] = {
-        'id': report_id,
-        'user': get_jwt_identity(),
-        'data': data,
-        'timestamp': datetime.datetime.now().isoformat()
-    }
+    try:
+        report = create_report(get_jwt_identity(), data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    # Start rendering the PDF right away, a full render queue only defers it
+    try:
+        pdf_status = pdf_renderer.submit(data, report.content_digest)
+    except RendererBusyError:
+        pdf_status = 'deferred'
     
     return jsonify({
         'message': 'Report generated successfully',
-        'report_id': report_id
+        'report_id': report.id,
+        'pdf_status': pdf_status
     }), 201
 
+@bp.route('/', methods=['GET'])
+@jwt_required()
+def get_reports():
+    try:
+        limit = min(max(int(request.args.get('limit', 20)), 1), MAX_PAGE_SIZE)
+        reports, next_cursor = list_reports(get_jwt_identity(), limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    return jsonify({
+        'reports': reports,
+        'next_cursor': next_cursor
+    }), 200
+
 @bp.route('/<report_id>', methods=['GET'])
 @jwt_required()
 def get_report(report_id):
-    if report_id not in reports:
+    # ?fields=a,b loads only those top-level fields, ?fields= only the metadata
+    fields = request.args.get('fields')
+    if fields is not None:
+        fields = [name for name in fields.split(',') if name]
+    
+    report = load_report(report_id, fields, user=get_jwt_identity())
+    if report is None:
+        return jsonify({'error': 'Report not found'}), 404
+    
+    return jsonify(report), 200
+
+
+@bp.route('/<report_id>/pdf', methods=['GET'])
+@jwt_required()
+def get_report_pdf(report_id):
+    report = load_report(report_id, fields=[], user=get_jwt_identity())
+    if report is None:
         return jsonify({'error': 'Report not found'}), 404
     
-    return jsonify(reports[report_id]), 200 
\ No newline at end of file
+    # Identical reports share one cached file
+    path = pdf_renderer.cached(report['digest'])
+    if path is not None:
+        return send_file(path, mimetype='application/pdf', as_attachment=True,
+                         download_name=f"report-{report_id}.pdf")
+    
+    error = pdf_renderer.error(report['digest'])
+    if error is not None:
+        return jsonify({'error': f'Rendering failed: {error}'}), 500
+    
+    try:
+        status = pdf_renderer.submit(load_report(report_id, user=get_jwt_identity())['data'], report['digest'])
+    except RendererBusyError:
+        response = jsonify({'error': 'Too many reports are being rendered, please retry'})
+        response.headers['Retry-After'] = '2'
+        return response, 503
+    
+    return jsonify({'report_id': report_id, 'status': status}), 202
\ No newline at end of file
@@ -1,12 +1,104 @@
 from flask import Blueprint, request, jsonify, current_app
 from werkzeug.utils import secure_filename
-from flask_jwt_extended import jwt_required
+from flask_jwt_extended import jwt_required, get_jwt_identity
 import os
+import time
 import pandas as pd
-from ..utils.file_handler import allowed_file, process_uploaded_file
+from ..utils.file_handler import allowed_file
+from ..utils.upload_store import (save_stream, find_processed, upload_stats, put_upload, set_stats, release_hold,
+                                  get_upload, list_uploads as list_catalog, delete_upload, discard_file)
+from ..utils.upload_sessions import (create_session, get_session, update_session, write_chunk,
+                                     received_chunks, claim_finalize, release_stale_claim, purge_sessions,
+                                     count_open_sessions, ChunkError, SessionClosedError)
+from ..utils.dataset_cache import dataset_key
+from ..utils.ingest import ingest_upload, run_upload_job, run_session_job
+from ..utils.kpis import kpi_settings
+from ..utils.jobs import job_queue, create_job, get_job
+from ..utils.streaming import wants_stream, ndjson_response, iter_callback_events
 
 bp = Blueprint('upload', __name__, url_prefix='/api/upload')
 
+# Largest page of uploads returned by one listing request
+MAX_PAGE_SIZE = 100
+
+# Seconds between purges of expired upload sessions
+SESSION_PURGE_INTERVAL = 60
+_last_purge = [0.0]
+
+def _stream_ingest(filepath, filename, cache_folder, chunksize, kpis, catalog, hold):
+    def run(emit):
+        def report_progress(rows, fraction):
+            emit({'event': 'progress', 'rows_processed': rows, 'progress': round(fraction, 4)})
+        
+        stats = ingest_upload(filepath, filename, cache_folder, chunksize,
+                              on_progress=report_progress, kpi_settings=kpis,
+                              digest=dataset_key(catalog['content_hash'], catalog['read_options']),
+                              read_options=catalog['read_options'])
+        return {
+            'event': 'completed',
+            'message': 'File uploaded successfully',
+            'filename': filename,
+            'stats': stats
+        }
+    
+    try:
+        for event in iter_callback_events(run):
+            if event.get('event') == 'completed':
+                # Cataloged here, the ingest itself runs outside the app context
+                put_upload(owner=get_jwt_identity(), filename=filename, stats=event['stats'], **catalog)
+                release_hold(hold)
+            yield event
+    except Exception:
+        # Clean up the file if processing fails, as the buffered upload does
+        release_hold(hold)
+        discard_file(catalog['upload_folder'], catalog['content_hash'], catalog['extension'])
+        raise
+    finally:
+        # Also when the client goes away mid-stream
+        release_hold(hold)
+
+def _read_options(values):
+    # Sheet and columns to read, from form fields or a JSON body; columns
+    # are a list or a comma separated string
+    options = {}
+    if values.get('sheet') not in (None, ''):
+        options['sheet'] = str(values['sheet'])
+    columns = values.get('columns')
+    if isinstance(columns, str):
+        columns = [column.strip() for column in columns.split(',') if column.strip()]
+    if columns:
+        options['columns'] = [str(column) for column in columns]
+    return options
+
+def _submit_upload_job(owner, filename, filepath, catalog):
+    # Cataloged without stats until the first poll after the job completes
+    upload, _ = put_upload(owner=owner, filename=filename, **catalog)
+    job = create_job(job_queue.jobs_folder, 'upload', owner=owner,
+                     filename=filename, upload_id=upload.id)
+    job_queue.submit(job, run_upload_job, filepath, filename,
+                     current_app.config['DATASET_CACHE_FOLDER'],
+                     current_app.config['UPLOAD_CHUNK_SIZE'],
+                     kpi_settings(current_app.config),
+                     dataset_key(catalog['content_hash'], catalog['read_options']),
+                     catalog['read_options'])
+    return job
+
+def _sync_catalog(job):
+    # The worker has no database access, so the first poll after the job
+    # ends brings the catalog entry up to date
+    if job.get('session_id'):
+        # Resumable uploads are cataloged along with their session
+        session = get_session(current_app.config['UPLOAD_SESSION_FOLDER'], job['session_id'])
+        if session is not None and session['status'] == 'processing':
+            _sync_session(session)
+        return
+    upload = get_upload(job['owner'], job['filename'])
+    if upload is not None and upload.id == job.get('upload_id') and upload.stats is None:
+        if job['status'] == 'completed':
+            set_stats(upload, job['result'])
+        elif job['status'] == 'failed':
+            delete_upload(current_app.config['UPLOAD_FOLDER'], job['owner'], job['filename'])
+
 @bp.route('/file', methods=['POST'])
 @jwt_required()
 def upload_file():
@@ -21,67 +113,301 @@ def upload_file():
         if not allowed_file(file.filename):
             return jsonify({'error': 'File type not allowed. Please upload a CSV file.'}), 400
         
-        # Ensure upload directory exists
-        os.makedirs(current_app.config['UPLOAD_FOLDER'], exist_ok=True)
-        
-        # Secure the filename and save the file
+        # Save the file under the hash of its content, computed while it is written
         filename = secure_filename(file.filename)
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], filename)
-        file.save(filepath)
+        extension = os.path.splitext(filename)[1].lower()
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        content_hash, size, filepath, hold = save_stream(file.stream, upload_folder, extension)
+        catalog = {
+            'upload_folder': upload_folder,
+            'content_hash': content_hash,
+            'extension': extension,
+            'size': size,
+            'read_options': _read_options(request.values)
+        }
         
-        # Process the uploaded file
-        df = process_uploaded_file(filepath)
+        # Content processed before is cataloged under the new name with the
+        # stats it had, without processing it again
+        known = find_processed(content_hash, catalog['read_options'])
+        if known is not None:
+            stats = upload_stats(known)
+            put_upload(owner=get_jwt_identity(), filename=filename, stats=stats, **catalog)
+            release_hold(hold)
+            return jsonify({
+                'message': 'File uploaded successfully',
+                'filename': filename,
+                'stats': stats,
+                'deduplicated': True
+            }), 200
         
-        # Get basic statistics about the data
-        stats = {
-            'rows': len(df),
-            'columns': list(df.columns),
-            'sample_data': df.head().to_dict('records')
-        }
+        # In async mode the file is processed by a background worker and the
+        # client polls the job for progress and the final stats
+        if request.values.get('async', '').lower() in ('1', 'true', 'yes'):
+            job = _submit_upload_job(get_jwt_identity(), filename, filepath, catalog)
+            release_hold(hold)
+            return jsonify({
+                'message': 'File upload accepted for processing',
+                'filename': filename,
+                'job_id': job['id']
+            }), 202
+        
+        # In streaming mode progress records are sent while the file is
+        # processed, followed by a record with the final stats
+        if wants_stream():
+            return ndjson_response(_stream_ingest(filepath, filename,
+                                                  current_app.config['DATASET_CACHE_FOLDER'],
+                                                  current_app.config['UPLOAD_CHUNK_SIZE'],
+                                                  kpi_settings(current_app.config),
+                                                  catalog, hold))
+        
+        # Process the uploaded file in chunks, building the stats as we go
+        stats = ingest_upload(filepath, filename,
+                              current_app.config['DATASET_CACHE_FOLDER'],
+                              current_app.config['UPLOAD_CHUNK_SIZE'],
+                              kpi_settings=kpi_settings(current_app.config),
+                              digest=dataset_key(content_hash, catalog['read_options']),
+                              read_options=catalog['read_options'])
+        put_upload(owner=get_jwt_identity(), filename=filename, stats=stats, **catalog)
+        release_hold(hold)
         
         return jsonify({
             'message': 'File uploaded successfully',
             'filename': filename,
-            'stats': stats
+            'stats': stats,
+            'deduplicated': False
         }), 200
+    
+    except Exception as e:
+        # Clean up the file if processing fails, unless other uploads share it
+        if 'catalog' in locals():
+            release_hold(hold)
+            discard_file(catalog['upload_folder'], catalog['content_hash'], catalog['extension'])
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/jobs/<job_id>', methods=['GET'])
+@jwt_required()
+def get_upload_job(job_id):
+    try:
+        job = get_job(job_queue.jobs_folder, job_id)
+        if job is None or job['type'] != 'upload' or job['owner'] != get_jwt_identity():
+            return jsonify({'error': 'Job not found'}), 404
+        
+        _sync_catalog(job)
         
+        return jsonify({
+            'job_id': job['id'],
+            'filename': job['filename'],
+            'status': job['status'],
+            'progress': job['progress'],
+            'rows_processed': job['rows_processed'],
+            'stats': job['result'],
+            'error': job['error']
+        }), 200
     except Exception as e:
-        # Clean up the file if processing fails
-        if 'filepath' in locals() and os.path.exists(filepath):
-            os.remove(filepath)
         return jsonify({'error': str(e)}), 500
 
 @bp.route('/list', methods=['GET'])
 @jwt_required()
 def list_uploads():
     try:
-        files = []
-        upload_folder = current_app.config['UPLOAD_FOLDER']
-        if not os.path.exists(upload_folder):
-            return jsonify({'files': []}), 200
-            
-        for filename in os.listdir(upload_folder):
-            if allowed_file(filename):
-                filepath = os.path.join(upload_folder, filename)
-                files.append({
-                    'name': filename,
-                    'size': os.path.getsize(filepath),
-                    'uploaded_at': os.path.getctime(filepath)
-                })
-        
-        return jsonify({'files': files}), 200
+        limit = min(max(int(request.args.get('limit', 50)), 1), MAX_PAGE_SIZE)
+        files, next_cursor = list_catalog(get_jwt_identity(), limit, request.args.get('cursor'))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     except Exception as e:
         return jsonify({'error': str(e)}), 500
+    
+    return jsonify({
+        'files': files,
+        'next_cursor': next_cursor
+    }), 200
 
 @bp.route('/<filename>', methods=['DELETE'])
 @jwt_required()
 def delete_file(filename):
     try:
-        filepath = os.path.join(current_app.config['UPLOAD_FOLDER'], secure_filename(filename))
-        if os.path.exists(filepath):
-            os.remove(filepath)
+        # Files uploaded before the catalog existed are shared, only upload admins remove them
+        legacy = get_jwt_identity() in current_app.config['UPLOAD_ADMINS']
+        if delete_upload(current_app.config['UPLOAD_FOLDER'], get_jwt_identity(), secure_filename(filename), legacy):
             return jsonify({'message': 'File deleted successfully'}), 200
         else:
             return jsonify({'error': 'File not found'}), 404
     except Exception as e:
-        return jsonify({'error': str(e)}), 500 
\ No newline at end of file
+        return jsonify({'error': str(e)}), 500
+
+def _get_own_session(session_id):
+    sessions_folder = current_app.config['UPLOAD_SESSION_FOLDER']
+    session = get_session(sessions_folder, session_id)
+    if session is None or session['owner'] != get_jwt_identity():
+        return None
+    if session['status'] == 'processing':
+        session = _sync_session(session)
+    else:
+        release_stale_claim(sessions_folder, session, current_app.config['UPLOAD_SESSION_FINALIZE_TIMEOUT'])
+    return session
+
+def _sync_session(session):
+    # A processing session takes the result of its upload job once the job
+    # ends, and is cataloged then under the content hash the job found
+    job = get_job(job_queue.jobs_folder, session['job_id'])
+    if job is None or job['status'] not in ('completed', 'failed'):
+        return session
+    if not job.get('session_id'):
+        # Jobs submitted before the content was hashed in the worker
+        _sync_catalog(job)
+    else:
+        upload_folder = current_app.config['UPLOAD_FOLDER']
+        extension = os.path.splitext(session['filename'])[1].lower()
+        if job['status'] == 'completed':
+            put_upload(upload_folder=upload_folder, owner=session['owner'], filename=session['filename'],
+                       content_hash=job['content_hash'], extension=extension, size=session['size'],
+                       stats=job['result'], read_options=session['read_options'])
+            release_hold(job.get('hold'))
+        elif job.get('content_hash'):
+            release_hold(job.get('hold'))
+            discard_file(upload_folder, job['content_hash'], extension)
+    return update_session(current_app.config['UPLOAD_SESSION_FOLDER'], session['id'],
+                          status=job['status'], stats=job['result'], error=job['error'],
+                          deduplicated=job.get('deduplicated', session['deduplicated']))
+
+def _purge_expired_sessions(force=False):
+    # Expired sessions are purged when sessions are used, at most once a minute
+    now = time.monotonic()
+    if force or now - _last_purge[0] >= SESSION_PURGE_INTERVAL:
+        _last_purge[0] = now
+        purge_sessions(current_app.config['UPLOAD_SESSION_FOLDER'], current_app.config['UPLOAD_SESSION_TTL'],
+                       current_app.config['UPLOAD_SESSION_FINALIZE_TIMEOUT'])
+
+def _session_status(session):
+    received = received_chunks(current_app.config['UPLOAD_SESSION_FOLDER'], session)
+    received_set = set(received)
+    return {
+        'session_id': session['id'],
+        'filename': session['filename'],
+        'size': session['size'],
+        'chunk_size': session['chunk_size'],
+        'chunk_count': session['chunk_count'],
+        'status': session['status'],
+        'received': received,
+        'missing': [index for index in range(session['chunk_count']) if index not in received_set],
+        'job_id': session['job_id'],
+        'stats': session['stats'],
+        'deduplicated': session['deduplicated'],
+        'error': session['error']
+    }
+
+def _finalize_session(session):
+    """Hand a complete session to an upload job, once."""
+    sessions_folder = current_app.config['UPLOAD_SESSION_FOLDER']
+    if not claim_finalize(sessions_folder, session['id']):
+        return get_session(sessions_folder, session['id'])
+    
+    try:
+        # Hashing and moving the assembled file take as long as reading it,
+        # so the job does both before ingesting it
+        job = create_job(job_queue.jobs_folder, 'upload', owner=session['owner'],
+                         filename=session['filename'], session_id=session['id'])
+        session = update_session(sessions_folder, session['id'], status='processing', job_id=job['id'])
+        job_queue.submit(job, run_session_job, sessions_folder, session['id'],
+                         current_app.config['UPLOAD_FOLDER'],
+                         current_app.config['DATASET_CACHE_FOLDER'],
+                         current_app.config['UPLOAD_CHUNK_SIZE'],
+                         kpi_settings(current_app.config),
+                         current_app.config['UPLOAD_SESSION_FINALIZE_TIMEOUT'])
+        return session
+    except Exception as e:
+        return update_session(sessions_folder, session['id'], status='failed', error=str(e))
+
+@bp.route('/sessions', methods=['POST'])
+@jwt_required()
+def create_upload_session():
+    data = request.get_json(silent=True)
+    if not data or not data.get('filename') or 'size' not in data:
+        return jsonify({'error': 'filename and size are required'}), 400
+    
+    filename = secure_filename(str(data['filename']))
+    if not allowed_file(filename):
+        return jsonify({'error': 'File type not allowed. Please upload a CSV file.'}), 400
+    
+    try:
+        size = int(data['size'])
+        chunk_size = int(data.get('chunk_size', current_app.config['UPLOAD_SESSION_CHUNK_SIZE']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'size and chunk_size must be integers'}), 400
+    if not 0 <= size <= current_app.config['UPLOAD_SESSION_MAX_SIZE']:
+        return jsonify({'error': 'File is too large'}), 413
+    # Every chunk is one request, so it has to fit the request size limit
+    if not 0 < chunk_size <= current_app.config['UPLOAD_SESSION_CHUNK_SIZE']:
+        return jsonify({'error': f"chunk_size must be between 1 and {current_app.config['UPLOAD_SESSION_CHUNK_SIZE']}"}), 400
+    
+    try:
+        sessions_folder = current_app.config['UPLOAD_SESSION_FOLDER']
+        _purge_expired_sessions(force=True)
+        # Every open session reserves disk space, so each user may only have a few
+        if count_open_sessions(sessions_folder, get_jwt_identity()) >= current_app.config['UPLOAD_SESSION_MAX_OPEN']:
+            return jsonify({'error': 'Too many unfinished uploads, complete or wait for one to expire'}), 429
+        session = create_session(sessions_folder, get_jwt_identity(), filename, size, chunk_size,
+                                 _read_options(data))
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+    
+    return jsonify(_session_status(session)), 201
+
+@bp.route('/sessions/<session_id>', methods=['GET'])
+@jwt_required()
+def get_upload_session(session_id):
+    try:
+        _purge_expired_sessions()
+        session = _get_own_session(session_id)
+        if session is None:
+            return jsonify({'error': 'Upload session not found'}), 404
+        return jsonify(_session_status(session)), 200
+    except ValueError:
+        return jsonify({'error': 'Upload session not found'}), 404
+
+@bp.route('/sessions/<session_id>/chunks/<int:index>', methods=['PUT'])
+@jwt_required()
+def put_upload_chunk(session_id, index):
+    try:
+        _purge_expired_sessions()
+        session = _get_own_session(session_id)
+        if session is None:
+            return jsonify({'error': 'Upload session not found'}), 404
+        if session['status'] != 'uploading':
+            return jsonify({'error': 'Upload session is already complete'}), 409
+        
+        sessions_folder = current_app.config['UPLOAD_SESSION_FOLDER']
+        write_chunk(sessions_folder, session, index, request.stream, request.headers.get('X-Chunk-SHA256'))
+        
+        # Processing starts as soon as the last missing chunk arrives
+        if len(received_chunks(sessions_folder, session)) == session['chunk_count']:
+            session = _finalize_session(session)
+        return jsonify(_session_status(session)), 200
+    except ChunkError as e:
+        return jsonify({'error': str(e)}), 400
+    except (SessionClosedError, FileNotFoundError):
+        # The session was finalized while this chunk was being sent
+        return jsonify({'error': 'Upload session is already complete'}), 409
+    except ValueError:
+        return jsonify({'error': 'Upload session not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@bp.route('/sessions/<session_id>/complete', methods=['POST'])
+@jwt_required()
+def complete_upload_session(session_id):
+    try:
+        session = _get_own_session(session_id)
+        if session is None:
+            return jsonify({'error': 'Upload session not found'}), 404
+        
+        if session['status'] == 'uploading':
+            status = _session_status(session)
+            if status['missing']:
+                return jsonify(dict(status, error='Chunks are missing')), 409
+            session = _finalize_session(session)
+        return jsonify(_session_status(session)), 202 if session['status'] == 'processing' else 200
+    except ValueError:
+        return jsonify({'error': 'Upload session not found'}), 404
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,98 @@
+import os
+import sys
+import time
+import resource
+import tempfile
+import multiprocessing
+import numpy as np
+import pandas as pd
+from openpyxl import Workbook
+from .file_handler import stream_uploaded_file, get_file_stats, DEFAULT_CHUNK_SIZE
+
+def write_workbook(path: str, rows: int, seed: int = 0) -> str:
+    """
+    Write a sales-like workbook to benchmark with.
+    
+    Args:
+        path (str): File to write
+        rows (int): Number of data rows
+        seed (int): Seed for the random values
+    
+    Returns:
+        str: Path to the workbook
+    """
+    rng = np.random.default_rng(seed)
+    workbook = Workbook(write_only=True)
+    worksheet = workbook.create_sheet('Sales')
+    worksheet.append(['date', 'region', 'product', 'units', 'price', 'revenue'])
+    dates = pd.Timestamp('2020-01-01') + pd.to_timedelta(rng.integers(0, 1500, rows), unit='D')
+    regions = rng.choice(['East', 'West', 'North', 'South'], rows)
+    products = rng.choice([f"Product {i}" for i in range(40)], rows)
+    units = rng.integers(1, 100, rows)
+    prices = np.round(rng.uniform(1, 500, rows), 2)
+    for row in zip(dates.to_pydatetime(), regions, products, units.tolist(), prices.tolist()):
+        worksheet.append([*row, round(row[3] * row[4], 2)])
+    workbook.save(path)
+    return path
+
+def _run_reader(reader: str, path: str, chunksize: int, queue) -> None:
+    # Runs in a fresh process so the peak RSS belongs to this reader alone
+    started = time.perf_counter()
+    if reader == 'read_excel':
+        stats = get_file_stats(pd.read_excel(path).dropna(how='all').ffill())
+    else:
+        stats = stream_uploaded_file(path, chunksize=chunksize)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    queue.put({
+        'reader': reader,
+        'seconds': elapsed,
+        # ru_maxrss is in kilobytes on Linux
+        'peak_rss_mb': peak / 1024,
+        'rows': stats['rows']
+    })
+
+def benchmark(path: str, chunksize: int = DEFAULT_CHUNK_SIZE) -> list:
+    """
+    Compare the streaming .xlsx ingest against pd.read_excel on one workbook.
+    
+    Both readers build the same upload stats, each in its own process.
+    
+    Args:
+        path (str): Workbook to read
+        chunksize (int): Rows per chunk of the streaming reader
+    
+    Returns:
+        list: One result dict per reader
+    """
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for reader in ('read_excel', 'streaming'):
+        queue = context.Queue()
+        process = context.Process(target=_run_reader, args=(reader, path, chunksize, queue))
+        process.start()
+        results.append(queue.get())
+        process.join()
+    if results[0]['rows'] != results[1]['rows']:
+        raise AssertionError(f"Readers disagree on the row count: {results[0]['rows']} != {results[1]['rows']}")
+    return results
+
+def main(path: str = None, rows: int = 1000000) -> None:
+    """Benchmark the workbook at path, or a generated one of rows rows, and print a table."""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        if path is None:
+            print(f"Writing a workbook of {rows} rows...")
+            path = write_workbook(os.path.join(tmp_dir, 'benchmark.xlsx'), rows)
+        print(f"{os.path.basename(path)}: {os.path.getsize(path) / 2 ** 20:.1f} MB")
+        print(f"{'reader':>12} {'rows':>10} {'seconds':>9} {'peak RSS MB':>12}")
+        for row in benchmark(path):
+            print(f"{row['reader']:>12} {row['rows']:>10} {row['seconds']:>9.2f} {row['peak_rss_mb']:>12.0f}")
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2:
+        print("Usage: python -m app.utils.benchmark_excel [<workbook.xlsx> | <rows>]")
+        sys.exit(1)
+    if len(sys.argv) == 2 and sys.argv[1].isdigit():
+        main(rows=int(sys.argv[1]))
+    else:
+        main(sys.argv[1] if len(sys.argv) == 2 else None)
@@ -0,0 +1,242 @@
+import time
+import logging
+import threading
+from collections import OrderedDict, deque
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_
+from .. import db
+from ..models import ChatMessage
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class ChatStore:
+    """
+    Per-user chat history with the newest messages kept in memory.
+    
+    Every message is written to the database first, so history survives
+    restarts and is shared by all workers. On top of that each process keeps
+    a ring buffer of the newest buffer_size messages of recently active
+    users, which serves the first page of history and new-message polls
+    without reading old rows. Messages written by other workers are pulled
+    in with an indexed query for ids past the newest buffered one.
+    
+    Long polls wait on a condition of their own user. While any poll is
+    waiting, a single thread per process queries the database every
+    poll_interval seconds for messages of the waiting users that other
+    workers wrote.
+    """
+    
+    def __init__(self, app=None):
+        self.buffer_size = 200
+        self.max_users = 1000
+        self.poll_interval = 1.0
+        self._app = None
+        self._buffers: Dict[str, deque] = OrderedDict()
+        self._lock = threading.Lock()
+        # Condition and number of waiting polls, by user
+        self._waiting: Dict[str, List] = {}
+        self._poller: Optional[threading.Thread] = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app) -> None:
+        """
+        Configure the store from the application config.
+        
+        Args:
+            app: Flask application
+        """
+        self.buffer_size = app.config['CHAT_BUFFER_SIZE']
+        self.max_users = app.config['CHAT_MAX_BUFFERED_USERS']
+        self.poll_interval = app.config['CHAT_POLL_INTERVAL']
+        with self._lock:
+            # Buffered messages and the poller belong to the previous app
+            self._buffers.clear()
+            self._app = app
+            self._poller = None
+    
+    def _buffer(self, user: str) -> deque:
+        # Caller holds the lock
+        buffer = self._buffers.get(user)
+        if buffer is None:
+            buffer = deque(maxlen=self.buffer_size)
+            self._buffers[user] = buffer
+            # Buffers of users with waiting polls are kept, the poller fills them
+            while len(self._buffers) > self.max_users:
+                evicted = next((name for name in self._buffers if name not in self._waiting), None)
+                if evicted is None:
+                    break
+                del self._buffers[evicted]
+        else:
+            self._buffers.move_to_end(user)
+        return buffer
+    
+    def _extend(self, user: str, messages: List[Dict[str, Any]]) -> deque:
+        # Caller holds the lock; messages are in id order
+        buffer = self._buffer(user)
+        newest = buffer[-1]['id'] if buffer else 0
+        added = False
+        for message in messages:
+            if message['id'] > newest:
+                buffer.append(message)
+                newest = message['id']
+                added = True
+        if added and user in self._waiting:
+            self._waiting[user][0].notify_all()
+        return buffer
+    
+    def _sync(self, user: str) -> deque:
+        with self._lock:
+            buffer = self._buffer(user)
+            newest = buffer[-1]['id'] if buffer else None
+        
+        query = ChatMessage.query.filter(ChatMessage.user_email == user)
+        if newest is not None:
+            query = query.filter(ChatMessage.id > newest)
+        # Newest first, so a long absence only loads what fits in the buffer
+        rows = query.order_by(ChatMessage.id.desc()).limit(self.buffer_size).all()
+        
+        with self._lock:
+            return self._extend(user, [row.to_dict() for row in reversed(rows)])
+    
+    def append(self, user: str, text: str) -> Dict[str, Any]:
+        """
+        Store a message and wake up pollers waiting for it.
+        
+        Args:
+            user (str): Sender's email
+            text (str): Message text
+        
+        Returns:
+            Dict[str, Any]: The stored message
+        """
+        row = ChatMessage(user_email=user, message=text)
+        db.session.add(row)
+        db.session.commit()
+        message = row.to_dict()
+        
+        # Wakes this user's polls waiting in this process
+        self._sync(user)
+        return message
+    
+    def history(self, user: str, before: Optional[int] = None, limit: int = 50) -> Tuple[List[Dict[str, Any]], Optional[int]]:
+        """
+        Get a page of a user's messages, walking back from the newest.
+        
+        Args:
+            user (str): User's email
+            before (int, optional): Cursor from the previous page, only older
+                messages are returned
+            limit (int): Maximum number of messages
+        
+        Returns:
+            Tuple: Messages oldest first, and the cursor of the next older page
+                (None when there are no older messages)
+        """
+        buffer = list(self._sync(user))
+        if before is not None:
+            buffer = [message for message in buffer if message['id'] < before]
+        
+        if len(buffer) > limit:
+            page = buffer[-limit:]
+            return page, page[0]['id']
+        
+        # The buffer holds fewer than a page, read the rest from the database
+        query = ChatMessage.query.filter(ChatMessage.user_email == user)
+        if before is not None:
+            query = query.filter(ChatMessage.id < before)
+        rows = query.order_by(ChatMessage.id.desc()).limit(limit + 1).all()
+        page = [row.to_dict() for row in reversed(rows[:limit])]
+        return page, page[0]['id'] if len(rows) > limit else None
+    
+    def wait_for_messages(self, user: str, after: int, timeout: float) -> List[Dict[str, Any]]:
+        """
+        Long-poll for messages newer than a cursor.
+        
+        Returns as soon as there is a newer message, or with an empty list
+        after timeout seconds. Messages sent through this process wake the
+        poll immediately; those sent through other workers are noticed by
+        the poller within poll_interval seconds.
+        
+        Args:
+            user (str): User's email
+            after (int): Id of the newest message the client has
+            timeout (float): Maximum seconds to wait
+        
+        Returns:
+            List[Dict[str, Any]]: New messages, oldest first
+        """
+        deadline = time.monotonic() + timeout
+        # Registered before the buffer is synced, so it is not evicted meanwhile
+        with self._lock:
+            waiting = self._waiting.setdefault(user, [threading.Condition(self._lock), 0])
+            waiting[1] += 1
+        try:
+            self._sync(user)
+            # End the read so the connection goes back to the pool while this
+            # request waits
+            db.session.close()
+            
+            with self._lock:
+                self._start_poller()
+                # Checked and waited for under one lock, so a message added
+                # in between always wakes the wait
+                while True:
+                    messages = [message for message in self._buffer(user) if message['id'] > after]
+                    remaining = deadline - time.monotonic()
+                    if messages or remaining <= 0:
+                        return messages
+                    waiting[0].wait(remaining)
+        finally:
+            with self._lock:
+                waiting[1] -= 1
+                if not waiting[1]:
+                    del self._waiting[user]
+    
+    def _start_poller(self) -> None:
+        # Caller holds the lock
+        if self._poller is None and self._app is not None:
+            self._poller = threading.Thread(target=self._poll, args=(self._app,),
+                                            name='chat-poller', daemon=True)
+            self._poller.start()
+    
+    def _poll(self, app) -> None:
+        # Pulls in messages other workers wrote for waiting users, until no
+        # poll is waiting any more
+        with app.app_context():
+            while True:
+                time.sleep(self.poll_interval)
+                with self._lock:
+                    if self._app is not app:
+                        return
+                    if not self._waiting:
+                        self._poller = None
+                        return
+                    newest = {}
+                    for user in self._waiting:
+                        buffer = self._buffers.get(user)
+                        newest[user] = buffer[-1]['id'] if buffer else 0
+                
+                try:
+                    rows = ChatMessage.query.filter(or_(*(
+                        and_(ChatMessage.user_email == user, ChatMessage.id > after)
+                        for user, after in newest.items()
+                    ))).order_by(ChatMessage.id).all()
+                    messages = [(row.user_email, row.to_dict()) for row in rows]
+                except Exception as e:
+                    logger.error(f"Error polling chat messages: {str(e)}")
+                    messages = []
+                finally:
+                    db.session.close()
+                
+                with self._lock:
+                    by_user: Dict[str, List[Dict[str, Any]]] = {}
+                    for user, message in messages:
+                        by_user.setdefault(user, []).append(message)
+                    for user, user_messages in by_user.items():
+                        self._extend(user, user_messages)
+
+# Global chat store, configured by create_app
+chat_store = ChatStore()
@@ -0,0 +1,256 @@
+import re
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict
+from pandas.tseries.api import guess_datetime_format
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Strings become categoricals when at most this share of the values is distinct
+MAX_CATEGORY_RATIO = 0.5
+
+# Distinct strings tracked per column, columns with more stay strings
+MAX_CATEGORIES = 10000
+
+# Narrowest first; unsigned types are left out so differences and negation
+# keep working on compacted columns
+_INTEGER_TYPES = (np.int8, np.int16, np.int32)
+
+# Text that looks like the start of a date, e.g. 2024-01-31 or 31/01/2024
+_DATE_LIKE = re.compile(r'^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}')
+
+def _parse_dates(series: pd.Series, date_format: str) -> pd.Series:
+    # Offsets in the text give UTC timestamps, a column may mix offsets
+    with warnings.catch_warnings():
+        warnings.simplefilter('ignore')
+        return pd.to_datetime(series, format=date_format, errors='coerce', utc='%z' in date_format)
+
+def _frame_memory(df: pd.DataFrame) -> int:
+    return int(df.memory_usage(index=False, deep=True).sum())
+
+class DtypeAccumulator:
+    """
+    Chooses compact dtypes for a DataFrame or its chunks, in one pass.
+    
+    pandas reads every integer as int64 and every string as an object.
+    While chunks go by, this keeps the range of every integer column, the
+    distinct values of every string column (up to MAX_CATEGORIES) and
+    whether a string column parses as dates in one format throughout. Once
+    all chunks are seen, integers get the narrowest type holding their
+    range, strings with few distinct values become categoricals and date
+    columns become datetimes. Every choice holds for all rows, so applying
+    the dtypes never changes a value. Floats keep float64, as float32 would
+    round values and lose precision in sums.
+    """
+    
+    def __init__(self, max_category_ratio: float = MAX_CATEGORY_RATIO, max_categories: int = MAX_CATEGORIES):
+        """
+        Initialize an empty accumulator.
+        
+        Args:
+            max_category_ratio (float): Largest share of distinct values of a categorical column
+            max_categories (int): Largest number of categories of a column
+        """
+        self.max_category_ratio = max_category_ratio
+        self.max_categories = max_categories
+        self.rows = 0
+        self._dtypes = None
+        self._memory = {}
+        self._ranges = {}
+        self._strings = set()
+        self._distinct = {}
+        self._date_formats = {}
+    
+    def _assign_columns(self, chunk: pd.DataFrame) -> None:
+        self._dtypes = chunk.dtypes.to_dict()
+        for column, dtype in self._dtypes.items():
+            self._memory[column] = 0
+            if pd.api.types.is_integer_dtype(dtype) and dtype.itemsize > 1:
+                self._ranges[column] = None
+            elif pd.api.types.is_object_dtype(dtype):
+                self._strings.add(column)
+                self._distinct[column] = set()
+                self._date_formats[column] = None
+    
+    def update(self, chunk: pd.DataFrame) -> 'DtypeAccumulator':
+        """
+        Add a chunk of cleaned data.
+        
+        Args:
+            chunk (pd.DataFrame): Cleaned chunk of the upload
+        
+        Returns:
+            DtypeAccumulator: self
+        """
+        if self._dtypes is None:
+            self._assign_columns(chunk)
+        self.rows += len(chunk)
+        for column, size in chunk.memory_usage(index=False, deep=True).items():
+            self._memory[column] += int(size)
+        
+        for column in list(self._ranges):
+            values = chunk[column]
+            if values.dtype != self._dtypes[column]:
+                # The type changed between chunks, leave the column as it is
+                del self._ranges[column]
+                continue
+            if values.empty:
+                continue
+            low, high = int(values.min()), int(values.max())
+            seen = self._ranges[column]
+            self._ranges[column] = (low, high) if seen is None else (min(seen[0], low), max(seen[1], high))
+        
+        for column in list(self._strings):
+            present = chunk[column].dropna()
+            if present.empty:
+                continue
+            if pd.api.types.infer_dtype(present, skipna=False) != 'string':
+                self._drop_strings(column)
+                continue
+            self._track_dates(column, present)
+            self._track_distinct(column, present)
+        
+        return self
+    
+    def _drop_strings(self, column: str) -> None:
+        self._strings.discard(column)
+        self._distinct.pop(column, None)
+        self._date_formats.pop(column, None)
+    
+    def _track_dates(self, column: str, present: pd.Series) -> None:
+        if column not in self._date_formats:
+            return
+        date_format = self._date_formats[column]
+        if date_format is None:
+            first = present.iloc[0]
+            if _DATE_LIKE.match(first):
+                with warnings.catch_warnings():
+                    warnings.simplefilter('ignore')
+                    date_format = guess_datetime_format(first.strip())
+            if date_format is None:
+                del self._date_formats[column]
+                return
+            self._date_formats[column] = date_format
+        # One value the format cannot read keeps the column as text
+        if _parse_dates(present, date_format).isna().any():
+            del self._date_formats[column]
+    
+    def _track_distinct(self, column: str, present: pd.Series) -> None:
+        if column not in self._distinct:
+            return
+        distinct = self._distinct[column]
+        distinct.update(present.unique())
+        if len(distinct) > self.max_categories:
+            del self._distinct[column]
+    
+    def dtypes(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Get the compact dtype of every column that changes.
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: Per column, the 'dtype' to convert to,
+                and the date 'format' of columns parsed as dates
+        """
+        compact = {}
+        for column, seen in self._ranges.items():
+            if seen is None:
+                continue
+            for integer_type in _INTEGER_TYPES:
+                info = np.iinfo(integer_type)
+                if info.min <= seen[0] and seen[1] <= info.max:
+                    if np.dtype(integer_type).itemsize < self._dtypes[column].itemsize:
+                        compact[column] = {'dtype': np.dtype(integer_type).name}
+                    break
+        
+        for column in self._strings:
+            if column in self._date_formats and self._date_formats[column] is not None:
+                date_format = self._date_formats[column]
+                compact[column] = {'dtype': 'datetime64[ns, UTC]' if '%z' in date_format else 'datetime64[ns]',
+                                   'format': date_format}
+            elif column in self._distinct and self._distinct[column]:
+                if len(self._distinct[column]) <= self.max_category_ratio * self.rows:
+                    compact[column] = {'dtype': 'category'}
+        return compact
+    
+    @property
+    def memory_before(self) -> int:
+        """Bytes the data takes with the dtypes it was read with."""
+        return sum(self._memory.values())
+    
+    def memory_after(self) -> int:
+        """
+        Get the memory the data takes with the compact dtypes, in bytes.
+        
+        Computed from what was tracked, without converting any data.
+        
+        Returns:
+            int: Bytes of the compacted data
+        """
+        compact = self.dtypes()
+        after = 0
+        for column, size in self._memory.items():
+            target = compact.get(column)
+            if target is None:
+                after += size
+            elif target['dtype'] == 'category':
+                categories = pd.Index(list(self._distinct[column]))
+                codes = pd.api.types.pandas_dtype(
+                    'int8' if len(categories) < 128 else 'int16' if len(categories) < 32768 else 'int32')
+                after += self.rows * codes.itemsize + int(categories.memory_usage(deep=True))
+            else:
+                after += self.rows * pd.api.types.pandas_dtype(target['dtype']).itemsize
+        return after
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the memory use before and after compaction, as reported in upload stats.
+        
+        Returns:
+            Dict[str, Any]: Bytes before and after, and the compact dtype of
+                every column that changes
+        """
+        return {
+            'before': self.memory_before,
+            'after': self.memory_after(),
+            'compacted_columns': {column: target['dtype'] for column, target in self.dtypes().items()}
+        }
+
+def apply_dtypes(df: pd.DataFrame, dtypes: Dict[str, Dict[str, Any]]) -> pd.DataFrame:
+    """
+    Convert columns to the dtypes chosen by DtypeAccumulator.
+    
+    Args:
+        df (pd.DataFrame): Data to convert
+        dtypes (Dict[str, Dict[str, Any]]): Output of DtypeAccumulator.dtypes
+    
+    Returns:
+        pd.DataFrame: Data with compact dtypes
+    """
+    converted = {}
+    for column, target in dtypes.items():
+        if column not in df.columns:
+            continue
+        if 'format' in target:
+            converted[column] = _parse_dates(df[column], target['format'])
+        else:
+            converted[column] = df[column].astype(target['dtype'])
+    return df.assign(**converted) if converted else df
+
+def compact_frame(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Convert a DataFrame to the most compact dtypes that keep every value.
+    
+    Args:
+        df (pd.DataFrame): Cleaned data
+    
+    Returns:
+        pd.DataFrame: Compacted data
+    """
+    accumulator = DtypeAccumulator().update(df)
+    compacted = apply_dtypes(df, accumulator.dtypes())
+    logger.info(f"Compacted {len(df)} rows from {accumulator.memory_before} to {_frame_memory(compacted)} bytes")
+    return compacted
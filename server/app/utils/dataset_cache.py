@@ -0,0 +1,423 @@
+import os
+import json
+import hashlib
+import logging
+import uuid
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+from typing import Any, Dict, Iterator, List, Optional, Union
+from .file_handler import process_uploaded_file
+from .compaction import apply_dtypes
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Cached datasets are stored as uncompressed Arrow IPC files so they can be
+# memory-mapped and read one column at a time without parsing
+CACHE_EXTENSION = '.arrow'
+
+def file_digest(filepath: str, block_size: int = 1 << 20) -> str:
+    """
+    Compute the SHA-256 content hash of a file.
+    
+    Args:
+        filepath (str): Path to the file
+        block_size (int): Number of bytes read at a time
+    
+    Returns:
+        str: Hex digest of the file contents
+    """
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def cached_dataset_path(cache_folder: str, digest: str) -> str:
+    """
+    Get the path of the cached dataset for a content hash.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Returns:
+        str: Path to the cached dataset
+    """
+    return os.path.join(cache_folder, digest + CACHE_EXTENSION)
+
+def has_cached_dataset(cache_folder: str, digest: str) -> bool:
+    """
+    Check whether a dataset has already been cached.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Returns:
+        bool: True if the cached dataset exists
+    """
+    return os.path.exists(cached_dataset_path(cache_folder, digest))
+
+def failure_path(cache_folder: str, digest: str) -> str:
+    """
+    Get the path of the note left when a dataset could not be cached.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Returns:
+        str: Path to the failure note
+    """
+    return os.path.join(cache_folder, digest + '.failed')
+
+def dataset_failure(cache_folder: str, digest: str) -> Optional[str]:
+    """
+    Get the reason a dataset could not be cached, so it is not parsed again.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Returns:
+        Optional[str]: Error message, or None if caching did not fail
+    """
+    try:
+        with open(failure_path(cache_folder, digest)) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+def _arrow_table(chunk: pd.DataFrame) -> pa.Table:
+    # Columns arrow cannot type, e.g. numbers mixed with text, are stored as text
+    arrays = []
+    for name in chunk.columns:
+        values = chunk[name]
+        try:
+            arrays.append(pa.Array.from_pandas(values))
+        except (pa.ArrowInvalid, pa.ArrowTypeError):
+            arrays.append(pa.Array.from_pandas(values.where(values.isna(), values.astype(str))))
+    return pa.Table.from_arrays(arrays, names=[str(name) for name in chunk.columns])
+
+def _wider_type(seen: pa.DataType, new: pa.DataType) -> pa.DataType:
+    if seen == new or pa.types.is_null(new):
+        return seen
+    if pa.types.is_null(seen):
+        return new
+    if pa.types.is_integer(seen) and pa.types.is_integer(new):
+        return pa.int64()
+    if (pa.types.is_integer(seen) or pa.types.is_floating(seen)) and \
+            (pa.types.is_integer(new) or pa.types.is_floating(new)):
+        return pa.float64()
+    # Anything else that disagrees is kept as text
+    return pa.string()
+
+class DatasetWriter:
+    """
+    Write cleaned DataFrame chunks to the dataset cache.
+    
+    Chunks are appended as Arrow record batches to a temporary file that is
+    moved into place on close, so readers never see a partial dataset. The
+    schema comes from the first chunk and is widened when a later chunk does
+    not fit it: integers become floats, empty columns take the type of their
+    first values and other disagreements become text. The batches written
+    so far are then rewritten once with the wider schema. Only chunks with
+    other columns abandon the write; the failure is noted so the upload is
+    not parsed again on every request.
+    """
+    
+    def __init__(self, cache_folder: str, digest: str):
+        os.makedirs(cache_folder, exist_ok=True)
+        self.cache_folder = cache_folder
+        self.digest = digest
+        self.path = cached_dataset_path(cache_folder, digest)
+        self.tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        self.schema = None
+        self.failed = False
+        self._sink = None
+        self._writer = None
+    
+    def _open(self, schema: pa.Schema) -> None:
+        self.schema = schema
+        self._sink = pa.OSFile(self.tmp_path, 'wb')
+        self._writer = pa.ipc.new_file(self._sink, schema)
+    
+    def _widen(self, schema: pa.Schema) -> None:
+        # Rewrite the batches written so far with the wider schema
+        self._writer.close()
+        self._sink.close()
+        old_path = self.tmp_path
+        self.tmp_path = f"{self.path}.{uuid.uuid4().hex}.tmp"
+        source = pa.memory_map(old_path, 'r')
+        try:
+            reader = pa.ipc.open_file(source)
+            self._open(schema)
+            for i in range(reader.num_record_batches):
+                self._writer.write_table(pa.Table.from_batches([reader.get_batch(i)]).cast(schema, safe=False))
+        finally:
+            source.close()
+            os.remove(old_path)
+        logger.info(f"Widened the schema of dataset {self.path}")
+    
+    def _fit(self, chunk: pd.DataFrame) -> pa.Table:
+        names = [str(name) for name in chunk.columns]
+        if names != self.schema.names:
+            raise pa.ArrowInvalid(f"Chunk columns {names} differ from {self.schema.names}")
+        try:
+            return pa.Table.from_pandas(chunk, schema=self.schema, preserve_index=False)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError):
+            pass
+        
+        table = _arrow_table(chunk)
+        schema = pa.schema([pa.field(field.name, _wider_type(field.type, table.schema.field(i).type))
+                            for i, field in enumerate(self.schema)])
+        if not schema.equals(self.schema):
+            self._widen(schema)
+        return table.cast(schema, safe=False)
+    
+    def write(self, chunk: pd.DataFrame) -> None:
+        """
+        Append a chunk to the cached dataset.
+        
+        Args:
+            chunk (pd.DataFrame): Cleaned chunk of the upload
+        """
+        if self.failed:
+            return
+        
+        try:
+            if self._writer is None:
+                try:
+                    table = pa.Table.from_pandas(chunk, preserve_index=False)
+                except (pa.ArrowInvalid, pa.ArrowTypeError):
+                    table = _arrow_table(chunk)
+                self._open(table.schema)
+            else:
+                table = self._fit(chunk)
+            self._writer.write_table(table)
+        except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+            logger.warning(f"Not caching dataset {self.path}: {str(e)}")
+            self.abort()
+            with open(failure_path(self.cache_folder, self.digest), 'w') as f:
+                f.write(str(e))
+    
+    def close(self) -> Optional[str]:
+        """
+        Finish the dataset and move it into place.
+        
+        Returns:
+            Optional[str]: Path to the cached dataset, or None if nothing was cached
+        """
+        if self.failed or self._writer is None:
+            self.abort()
+            return None
+        
+        self._writer.close()
+        self._sink.close()
+        os.replace(self.tmp_path, self.path)
+        return self.path
+    
+    def abort(self) -> None:
+        """
+        Discard the partially written dataset.
+        """
+        self.failed = True
+        if self._writer is not None:
+            try:
+                self._writer.close()
+            except pa.ArrowException:
+                pass
+            self._sink.close()
+            self._writer = None
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+def write_dataset(df: pd.DataFrame, cache_folder: str, digest: str) -> Optional[str]:
+    """
+    Cache a whole DataFrame under its content hash.
+    
+    Args:
+        df (pd.DataFrame): Cleaned data to cache
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Returns:
+        Optional[str]: Path to the cached dataset, or None if it could not be cached
+    """
+    with DatasetWriter(cache_folder, digest) as writer:
+        writer.write(df)
+    return None if writer.failed else writer.path
+
+def compact_dataset(cache_folder: str, digest: str, dtypes: Dict[str, Dict[str, Any]]) -> str:
+    """
+    Rewrite a cached dataset with compact column types.
+    
+    Chunks are cached with the types they were read with, as the compact
+    types are only known once the whole upload was seen. Only the columns
+    that change are converted, one at a time, the others are copied from the
+    memory-mapped file. The record batches keep their sizes.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        dtypes (Dict[str, Dict[str, Any]]): Output of DtypeAccumulator.dtypes
+    
+    Returns:
+        str: Path to the cached dataset
+    """
+    path = cached_dataset_path(cache_folder, digest)
+    if not dtypes:
+        return path
+    
+    source = pa.memory_map(path, 'r')
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    try:
+        table = pa.ipc.open_file(source).read_all()
+        lengths = [len(chunk) for chunk in table.column(0).chunks] if table.num_columns else []
+        offsets = np.cumsum([0] + lengths[:-1])
+        columns = []
+        for name, column in zip(table.column_names, table.columns):
+            if name in dtypes:
+                series = apply_dtypes(column.to_pandas().to_frame(name), {name: dtypes[name]})[name]
+                array = pa.Array.from_pandas(series)
+                column = pa.chunked_array([array.slice(offset, length) for offset, length in zip(offsets, lengths)],
+                                          type=array.type)
+            columns.append(column)
+        compacted = pa.table(columns, names=table.column_names)
+        
+        with pa.OSFile(tmp_path, 'wb') as sink, pa.ipc.new_file(sink, compacted.schema) as writer:
+            writer.write_table(compacted)
+        os.replace(tmp_path, path)
+    except (pa.ArrowInvalid, pa.ArrowTypeError, pa.ArrowNotImplementedError) as e:
+        # The dataset stays cached with the types it was read with
+        logger.warning(f"Not compacting dataset {path}: {str(e)}")
+    finally:
+        source.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return path
+
+def options_text(read_options: Optional[Dict[str, Any]]) -> Optional[str]:
+    """
+    Serialize read options the way the catalog stores them.
+    
+    Args:
+        read_options (Dict[str, Any], optional): Sheet and columns to read
+    
+    Returns:
+        Optional[str]: Canonical JSON, None when everything is read
+    """
+    read_options = {name: value for name, value in (read_options or {}).items() if value is not None}
+    return json.dumps(read_options, sort_keys=True, separators=(',', ':')) if read_options else None
+
+def dataset_key(content_hash: str, read_options: Optional[Dict[str, Any]] = None) -> str:
+    """
+    Get the key the parsed data of an upload is cached under.
+    
+    A file read whole is cached under its content hash. Reading another
+    sheet or a subset of columns gives other data, so the options are
+    hashed into the key.
+    
+    Args:
+        content_hash (str): SHA-256 of the content
+        read_options (Dict[str, Any], optional): Sheet and columns to read
+    
+    Returns:
+        str: Dataset cache key
+    """
+    serialized = options_text(read_options)
+    if serialized is None:
+        return content_hash
+    return hashlib.sha256(f"{content_hash}\0{serialized}".encode()).hexdigest()
+
+def cache_dataset_file(filepath: str,
+                       cache_folder: str,
+                       digest: str,
+                       sheet: Optional[Union[str, int]] = None,
+                       columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Parse and clean a saved upload and cache it under its content hash.
+    
+    Args:
+        filepath (str): Path to the saved upload
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        sheet (str or int, optional): Excel sheet name or position, the first sheet if omitted
+        columns (List[str], optional): Columns to read, all columns if omitted
+    
+    Returns:
+        pd.DataFrame: Cleaned data
+    """
+    df = process_uploaded_file(filepath, sheet=sheet, columns=columns)
+    write_dataset(df, cache_folder, digest)
+    return df
+
+def load_dataset(cache_folder: str, digest: str, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """
+    Load a cached dataset through a memory map.
+    
+    Only the requested columns are converted, the pages of the other columns
+    are never touched.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        columns (List[str], optional): Columns to load, all columns if omitted
+    
+    Returns:
+        pd.DataFrame: Cached data
+    """
+    source = pa.memory_map(cached_dataset_path(cache_folder, digest), 'r')
+    table = pa.ipc.open_file(source).read_all()
+    if columns is not None:
+        missing = set(columns) - set(table.column_names)
+        if missing:
+            raise ValueError(f"Unknown columns: {sorted(missing)}")
+        table = table.select(columns)
+    return table.to_pandas()
+
+def iter_dataset_batches(cache_folder: str, digest: str) -> Iterator[pd.DataFrame]:
+    """
+    Read a cached dataset one record batch at a time.
+    
+    Batches are the chunks the dataset was written in, so only one of them
+    is converted to pandas at a time.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Yields:
+        pd.DataFrame: Rows of one batch
+    """
+    source = pa.memory_map(cached_dataset_path(cache_folder, digest), 'r')
+    reader = pa.ipc.open_file(source)
+    for i in range(reader.num_record_batches):
+        yield reader.get_batch(i).to_pandas()
+
+def dataset_columns(cache_folder: str, digest: str) -> List[str]:
+    """
+    Get the column names of a cached dataset from its schema alone.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+    
+    Returns:
+        List[str]: Column names
+    """
+    source = pa.memory_map(cached_dataset_path(cache_folder, digest), 'r')
+    return pa.ipc.open_file(source).schema.names
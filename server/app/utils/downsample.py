@@ -0,0 +1,311 @@
+import os
+import json
+import uuid
+import shutil
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional, Tuple
+from .dataset_cache import load_dataset
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Each level keeps the min and max of every LEVEL_BUCKET points of the one below
+LEVEL_BUCKET = 8
+
+# Levels stop once a series is down to this many points
+MIN_LEVEL_POINTS = 2048
+
+# A request is served from the coarsest level holding this many times the
+# requested points in its range, so the final reduction has enough detail
+OVERSAMPLE = 4
+
+DOWNSAMPLE_METHODS = ('lttb', 'minmax')
+
+def lttb(x: np.ndarray, y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Select points with Largest-Triangle-Three-Buckets.
+    
+    The first and last points are kept. Every other bucket contributes the
+    point forming the largest triangle with the point chosen in the previous
+    bucket and the average of the next bucket, which keeps peaks and the
+    overall shape of the series.
+    
+    Args:
+        x (np.ndarray): Sorted x values
+        y (np.ndarray): y values
+        points (int): Number of points to keep
+    
+    Returns:
+        np.ndarray: Indices of the kept points, ascending
+    """
+    n = len(x)
+    if points >= n or n <= 2:
+        return np.arange(n)
+    if points < 3:
+        return np.array([0, n - 1])[:max(points, 1)]
+    
+    # Interior points split into points - 2 buckets
+    edges = (np.arange(points - 1) * ((n - 2) / (points - 2))).astype(np.int64) + 1
+    edges[-1] = n - 1
+    sizes = np.diff(edges)
+    mean_x = np.add.reduceat(x[1:n - 1], edges[:-1] - 1) / sizes
+    mean_y = np.add.reduceat(y[1:n - 1], edges[:-1] - 1) / sizes
+    # The bucket after the last one is the last point
+    mean_x = np.append(mean_x[1:], x[-1])
+    mean_y = np.append(mean_y[1:], y[-1])
+    
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        start, end = edges[i], edges[i + 1]
+        area = np.abs((x[a] - mean_x[i]) * (y[start:end] - y[a])
+                      - (x[a] - x[start:end]) * (mean_y[i] - y[a]))
+        a = start + int(np.argmax(area))
+        selected[i + 1] = a
+    return selected
+
+def minmax(y: np.ndarray, points: int) -> np.ndarray:
+    """
+    Select the minimum and maximum of equal-count buckets.
+    
+    Keeps every extreme of the series, so spikes survive any reduction.
+    
+    Args:
+        y (np.ndarray): y values, in x order
+        points (int): Number of points to keep, at most
+    
+    Returns:
+        np.ndarray: Indices of the kept points, ascending
+    """
+    n = len(y)
+    if points >= n:
+        return np.arange(n)
+    if points < 4:
+        # No room for a bucket's pair, keep the ends and then the extreme
+        # farthest from the mean
+        if points < 3:
+            return np.array([0, n - 1])[:max(points, 1)]
+        extreme = int(np.argmax(np.abs(y - np.mean(y))))
+        return np.unique([0, extreme, n - 1])
+    # Two points per bucket, plus the first and last point
+    buckets = max((points - 2) // 2, 1)
+    size = -(-n // buckets)
+    return _bucket_extremes(y, size)
+
+def _bucket_extremes(y: np.ndarray, size: int) -> np.ndarray:
+    n = len(y)
+    buckets = -(-n // size)
+    # Pad to whole buckets so every bucket reduces in one vectorized call
+    low = np.full(buckets * size, np.inf)
+    high = np.full(buckets * size, -np.inf)
+    low[:n] = y
+    high[:n] = y
+    offsets = np.arange(buckets) * size
+    lows = offsets + np.argmin(low.reshape(buckets, size), axis=1)
+    highs = offsets + np.argmax(high.reshape(buckets, size), axis=1)
+    selected = np.unique(np.concatenate([lows, highs, [0, n - 1]]))
+    return selected[selected < n]
+
+def series_key(x_column: str, y_column: str) -> str:
+    """
+    Get the name of the levels of a column pair.
+    
+    Args:
+        x_column (str): x column
+        y_column (str): y column
+    
+    Returns:
+        str: Short hash naming the pair
+    """
+    return hashlib.sha256(f"{x_column}\0{y_column}".encode()).hexdigest()[:16]
+
+def series_path(cache_folder: str, digest: str, x_column: str, y_column: str) -> str:
+    """
+    Get the directory holding the levels of a column pair of a dataset.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        x_column (str): x column
+        y_column (str): y column
+    
+    Returns:
+        str: Directory of the levels
+    """
+    return os.path.join(cache_folder, f"{digest}.series", series_key(x_column, y_column))
+
+def _as_xy(df: pd.DataFrame, x_column: str, y_column: str) -> Tuple[np.ndarray, np.ndarray, str]:
+    y = pd.to_numeric(df[y_column], errors='coerce')
+    if not pd.api.types.is_numeric_dtype(df[y_column]) and y.notna().sum() == 0:
+        raise ValueError(f"Column {y_column} is not numeric")
+    
+    x = df[x_column]
+    if pd.api.types.is_numeric_dtype(x) and not pd.api.types.is_bool_dtype(x):
+        x_type = 'number'
+        x = x.astype(np.float64)
+    else:
+        moments = x if pd.api.types.is_datetime64_any_dtype(x) else pd.to_datetime(x, errors='coerce', format='mixed')
+        if moments.notna().sum() == 0:
+            raise ValueError(f"Column {x_column} is neither numeric nor a date")
+        if getattr(moments.dt, 'tz', None) is not None:
+            moments = moments.dt.tz_convert(None)
+        x_type = 'datetime'
+        # Epoch milliseconds are exact in float64
+        x = moments.astype('datetime64[ms]').astype(np.int64).astype(np.float64).where(moments.notna())
+    
+    x = x.to_numpy(dtype=np.float64, na_value=np.nan)
+    y = y.to_numpy(dtype=np.float64, na_value=np.nan)
+    keep = ~(np.isnan(x) | np.isnan(y))
+    x, y = x[keep], y[keep]
+    order = np.argsort(x, kind='stable')
+    return x[order], y[order], x_type
+
+def build_levels(cache_folder: str, digest: str, x_column: str, y_column: str) -> str:
+    """
+    Precompute the resolution levels of a column pair.
+    
+    Level 0 is the whole series sorted by x, and every further level keeps
+    the minimum and maximum of each LEVEL_BUCKET points of the previous one,
+    until a level has at most MIN_LEVEL_POINTS points. Levels are stored as
+    .npy files and memory-mapped when read, so a request only touches the
+    range it asks for.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        x_column (str): x column
+        y_column (str): y column
+    
+    Returns:
+        str: Directory of the levels
+    """
+    path = series_path(cache_folder, digest, x_column, y_column)
+    if os.path.exists(os.path.join(path, 'meta.json')):
+        return path
+    
+    df = load_dataset(cache_folder, digest, list(dict.fromkeys([x_column, y_column])))
+    x, y, x_type = _as_xy(df, x_column, y_column)
+    del df
+    
+    # Save to a temp directory and rename, another worker may be building too
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    os.makedirs(tmp_path)
+    sizes = []
+    level = np.vstack([x, y])
+    while True:
+        np.save(os.path.join(tmp_path, f"level{len(sizes)}.npy"), level)
+        sizes.append(level.shape[1])
+        if level.shape[1] <= MIN_LEVEL_POINTS:
+            break
+        level = level[:, _bucket_extremes(level[1], LEVEL_BUCKET)]
+    
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'x': x_column, 'y': y_column, 'x_type': x_type, 'sizes': sizes}, f)
+    try:
+        os.rename(tmp_path, path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+    return path
+
+def _format_x(x: np.ndarray, x_type: str) -> List[Any]:
+    if x_type == 'datetime':
+        return pd.to_datetime(x.astype(np.int64), unit='ms').strftime('%Y-%m-%dT%H:%M:%S.%f').str[:-3].tolist()
+    return x.tolist()
+
+def _parse_bound(value: Optional[str], x_type: str) -> Optional[float]:
+    if value is None or value == '':
+        return None
+    if x_type == 'datetime':
+        try:
+            timestamp = pd.Timestamp(value)
+            # Dates are stored as UTC, so an offset moves the bound
+            if timestamp.tzinfo is not None:
+                timestamp = timestamp.tz_convert(None)
+            return float(timestamp.value // 1_000_000)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid date: {value}")
+    try:
+        return float(value)
+    except ValueError:
+        raise ValueError(f"Invalid number: {value}")
+
+def downsample_series(cache_folder: str,
+                      digest: str,
+                      x_column: str,
+                      y_column: str,
+                      points: int = 1000,
+                      method: str = 'lttb',
+                      start: Optional[str] = None,
+                      end: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Reduce a column pair of a dataset to a chart-ready series.
+    
+    The coarsest precomputed level that still holds OVERSAMPLE times the
+    requested points within [start, end] is sliced, and that slice is
+    reduced to the requested size. Zooming in therefore switches to finer
+    levels while the work per request stays proportional to the points
+    returned, not to the rows of the dataset.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        x_column (str): x column, numeric or dates
+        y_column (str): y column, numeric
+        points (int): Number of points to return, at most
+        method (str): 'lttb' or 'minmax'
+        start (str, optional): Smallest x to include
+        end (str, optional): Largest x to include
+    
+    Returns:
+        Dict[str, Any]: x and y values, the level used and the number of
+            rows of the dataset in the range
+    """
+    if method not in DOWNSAMPLE_METHODS:
+        raise ValueError(f"Unknown downsampling method: {method}")
+    if points < 2:
+        raise ValueError("At least 2 points must be requested")
+    
+    path = build_levels(cache_folder, digest, x_column, y_column)
+    with open(os.path.join(path, 'meta.json')) as f:
+        meta = json.load(f)
+    x_type = meta['x_type']
+    low = _parse_bound(start, x_type)
+    high = _parse_bound(end, x_type)
+    
+    def load(level: int) -> Tuple[np.ndarray, int]:
+        data = np.load(os.path.join(path, f"level{level}.npy"), mmap_mode='r')
+        first = 0 if low is None else int(np.searchsorted(data[0], low, side='left'))
+        last = data.shape[1] if high is None else int(np.searchsorted(data[0], high, side='right'))
+        return data[:, first:max(first, last)], max(last - first, 0)
+    
+    source, source_rows = load(0)
+    level = 0
+    for candidate in range(len(meta['sizes']) - 1, 0, -1):
+        data, count = load(candidate)
+        if count >= points * OVERSAMPLE:
+            source, level = data, candidate
+            break
+    
+    x = np.asarray(source[0])
+    y = np.asarray(source[1])
+    if method == 'lttb':
+        keep = lttb(x, y, points)
+    else:
+        keep = minmax(y, points)
+    
+    return {
+        'x': _format_x(x[keep], x_type),
+        'y': y[keep].tolist(),
+        'x_type': x_type,
+        'points': int(len(keep)),
+        'level': level,
+        'source_rows': source_rows,
+        'method': method
+    }
@@ -1,13 +1,18 @@
 import os
 import pandas as pd
-from typing import Tuple, Dict, Any
+from typing import Tuple, Dict, Any, Iterator, Optional, Callable, List, Union
 import logging
-from werkzeug.utils import secure_filename
+from openpyxl import load_workbook
+from .stats import StatsAccumulator
+from .compaction import compact_frame
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Default number of rows read per chunk by the streaming ingest path
+DEFAULT_CHUNK_SIZE = 100000
+
 def allowed_file(filename: str) -> bool:
     """
     Check if the file extension is allowed.
@@ -21,12 +26,16 @@ def allowed_file(filename: str) -> bool:
     ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def process_uploaded_file(filepath: str) -> pd.DataFrame:
+def process_uploaded_file(filepath: str,
+                          sheet: Optional[Union[str, int]] = None,
+                          columns: Optional[List[str]] = None) -> pd.DataFrame:
     """
     Process an uploaded file and return a DataFrame.
     
     Args:
         filepath (str): Path to the uploaded file
+        sheet (str or int, optional): Excel sheet name or position, the first sheet if omitted
+        columns (List[str], optional): Columns to read, all columns if omitted
         
     Returns:
         pd.DataFrame: Processed data
@@ -38,9 +47,12 @@ def process_uploaded_file(filepath: str) -> pd.DataFrame:
         
         # Read file based on extension
         if ext == '.csv':
-            df = pd.read_csv(filepath)
-        elif ext in ['.xlsx', '.xls']:
-            df = pd.read_excel(filepath)
+            df = pd.read_csv(filepath, usecols=columns)
+        elif ext == '.xlsx':
+            chunks = [chunk for chunk, _ in read_excel_chunks(filepath, sheet=sheet, columns=columns)]
+            df = pd.concat(chunks, ignore_index=True)
+        elif ext == '.xls':
+            df = _read_xls(filepath, sheet, columns)
         else:
             raise ValueError(f"Unsupported file type: {ext}")
         
@@ -48,49 +60,236 @@ def process_uploaded_file(filepath: str) -> pd.DataFrame:
         df = df.dropna(how='all')  # Drop rows that are all NA
         df = df.fillna(method='ffill')  # Forward fill missing values
         
-        return df
+        # Narrow numbers, categorical strings and parsed dates
+        return compact_frame(df)
         
     except Exception as e:
         logger.error(f"Error processing file {filepath}: {str(e)}")
         raise
 
+def _excel_columns(header: tuple) -> List[str]:
+    # Blank and repeated names are made unique the way read_excel does
+    names = []
+    seen = {}
+    for position, value in enumerate(header):
+        name = f"Unnamed: {position}" if value is None else str(value)
+        if name in seen:
+            seen[name] += 1
+            name = f"{name}.{seen[name]}"
+        seen.setdefault(name, 0)
+        names.append(name)
+    return names
+
+def read_excel_chunks(source,
+                      chunksize: int = DEFAULT_CHUNK_SIZE,
+                      sheet: Optional[Union[str, int]] = None,
+                      columns: Optional[List[str]] = None) -> Iterator[Tuple[pd.DataFrame, float]]:
+    """
+    Read an .xlsx sheet in chunks of rows.
+    
+    The workbook is opened read-only, so openpyxl parses the sheet XML as a
+    stream instead of building cell objects for the whole workbook, and only
+    one chunk of row values is held at a time. The first non-empty row is the
+    header; cells beyond it are ignored.
+    
+    Args:
+        source: Path or binary file object of the workbook
+        chunksize (int): Number of rows per chunk
+        sheet (str or int, optional): Sheet name or position, the first sheet if omitted
+        columns (List[str], optional): Columns to read, all columns if omitted
+        
+    Yields:
+        Tuple[pd.DataFrame, float]: Chunk of raw rows, and the fraction of the sheet read
+    """
+    workbook = load_workbook(source, read_only=True, data_only=True)
+    try:
+        if sheet is None:
+            worksheet = workbook.worksheets[0]
+        elif sheet in workbook.sheetnames:
+            worksheet = workbook[sheet]
+        elif str(sheet).isdigit() and int(sheet) < len(workbook.worksheets):
+            worksheet = workbook.worksheets[int(sheet)]
+        else:
+            raise ValueError(f"Sheet not found: {sheet}. Available sheets: {workbook.sheetnames}")
+        
+        rows = worksheet.iter_rows(values_only=True)
+        header = next((row for row in rows if any(value is not None for value in row)), None)
+        if header is None:
+            raise ValueError(f"Sheet {worksheet.title} is empty")
+        names = _excel_columns(header)
+        positions = list(range(len(names)))
+        if columns is not None:
+            missing = [column for column in columns if column not in names]
+            if missing:
+                raise ValueError(f"Unknown columns: {missing}")
+            positions = [names.index(column) for column in columns]
+            names = list(columns)
+        
+        # Only known when the workbook records its dimensions, as Excel does
+        total_rows = worksheet.max_row
+        rows_read = 1
+        chunk = []
+        for row in rows:
+            rows_read += 1
+            chunk.append([row[position] if position < len(row) else None for position in positions])
+            if len(chunk) == chunksize:
+                yield pd.DataFrame(chunk, columns=names), min(rows_read / total_rows, 1.0) if total_rows else 0.0
+                chunk = []
+        if chunk or rows_read == 1:
+            yield pd.DataFrame(chunk, columns=names), 1.0
+    finally:
+        workbook.close()
+
+def _read_xls(source, sheet: Optional[Union[str, int]], columns: Optional[List[str]]) -> pd.DataFrame:
+    # Sheets are looked up by name first, then by position, as in read_excel_chunks
+    with pd.ExcelFile(source) as workbook:
+        if sheet is not None and sheet not in workbook.sheet_names and str(sheet).isdigit():
+            sheet = int(sheet)
+        return workbook.parse(sheet_name=0 if sheet is None else sheet, usecols=columns)
+
+def _read_chunks(filepath: str,
+                 chunksize: int,
+                 sheet: Optional[Union[str, int]],
+                 columns: Optional[List[str]]) -> Iterator[Tuple[pd.DataFrame, float]]:
+    _, ext = os.path.splitext(filepath)
+    ext = ext.lower()
+    
+    if ext == '.xlsx':
+        yield from read_excel_chunks(filepath, chunksize, sheet, columns)
+        return
+    if ext not in ['.csv', '.xls']:
+        raise ValueError(f"Unsupported file type: {ext}")
+    
+    with open(filepath, 'rb') as f:
+        total_size = max(os.fstat(f.fileno()).st_size, 1)
+        if ext == '.xls':
+            # openpyxl cannot read the legacy format, the sheet is read in one go
+            yield _read_xls(f, sheet, columns), 1.0
+            return
+        
+        with pd.read_csv(f, chunksize=chunksize, usecols=columns) as reader:
+            for chunk in reader:
+                yield chunk, min(f.tell() / total_size, 1.0)
+
+def iter_processed_chunks(filepath: str,
+                          chunksize: int = DEFAULT_CHUNK_SIZE,
+                          on_progress: Optional[Callable[[float], None]] = None,
+                          sheet: Optional[Union[str, int]] = None,
+                          columns: Optional[List[str]] = None) -> Iterator[pd.DataFrame]:
+    """
+    Read an uploaded file in chunks and yield cleaned DataFrames.
+    
+    Applies the same cleaning as process_uploaded_file, but the forward fill
+    carries the last seen value of every column across chunk boundaries so
+    only one chunk is held in memory at a time. CSV and .xlsx files are both
+    streamed, only legacy .xls files are read whole.
+    
+    Args:
+        filepath (str): Path to the uploaded file
+        chunksize (int): Number of rows to read per chunk
+        on_progress (Callable, optional): Called with the fraction of the file read so far
+        sheet (str or int, optional): Excel sheet name or position, the first sheet if omitted
+        columns (List[str], optional): Columns to read, all columns if omitted
+        
+    Yields:
+        pd.DataFrame: Cleaned chunk of the file
+    """
+    carry = None
+    for chunk, fraction in _read_chunks(filepath, chunksize, sheet, columns):
+        if on_progress is not None:
+            on_progress(fraction)
+        
+        chunk = chunk.dropna(how='all')
+        if chunk.empty:
+            continue
+        
+        chunk = chunk.ffill()
+        if carry is not None:
+            # Leading gaps are filled from the end of the previous chunk
+            chunk = chunk.fillna(carry)
+        carry = chunk.iloc[-1]
+        
+        yield chunk
+
+def stream_uploaded_file(filepath: str,
+                         chunksize: int = DEFAULT_CHUNK_SIZE,
+                         sample_size: int = 5,
+                         on_chunk: Optional[Callable[[pd.DataFrame], None]] = None,
+                         on_progress: Optional[Callable[[int, float], None]] = None,
+                         sheet: Optional[Union[str, int]] = None,
+                         columns: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    Process an uploaded file chunk by chunk and build its summary as it goes.
+    
+    Memory use is bounded by the chunk size rather than the file size. The
+    returned summary has the same layout as get_file_stats, plus a sample of
+    the first rows.
+    
+    Args:
+        filepath (str): Path to the uploaded file
+        chunksize (int): Number of rows to read per chunk
+        sample_size (int): Number of leading rows to keep as sample data
+        on_chunk (Callable, optional): Called with every cleaned chunk
+        on_progress (Callable, optional): Called after every chunk with the
+            number of rows processed and the fraction of the file read
+        sheet (str or int, optional): Excel sheet name or position, the first sheet if omitted
+        columns (List[str], optional): Columns to read, all columns if omitted
+        
+    Returns:
+        Dict[str, Any]: Summary of the processed data
+    """
+    try:
+        accumulator = StatsAccumulator()
+        sample = []
+        fraction_read = [0.0]
+        
+        def track_position(fraction):
+            fraction_read[0] = fraction
+        
+        for chunk in iter_processed_chunks(filepath, chunksize, on_progress=track_position,
+                                           sheet=sheet, columns=columns):
+            accumulator.update(chunk)
+            if len(sample) < sample_size:
+                sample.extend(chunk.head(sample_size - len(sample)).to_dict('records'))
+            
+            if on_chunk is not None:
+                on_chunk(chunk)
+            if on_progress is not None:
+                on_progress(accumulator.rows, fraction_read[0])
+        
+        summary = accumulator.to_dict()
+        summary['sample_data'] = sample
+        return summary
+        
+    except Exception as e:
+        logger.error(f"Error streaming file {filepath}: {str(e)}")
+        raise
+
 def get_file_stats(df: pd.DataFrame) -> Dict[str, Any]:
     """
     Get basic statistics about a DataFrame.
     
+    All numeric columns are reduced together in a single vectorized pass,
+    see StatsAccumulator for the quantile, histogram and distinct count
+    sketches included in the result.
+    
     Args:
         df (pd.DataFrame): DataFrame to analyze
         
     Returns:
         Dict[str, Any]: Statistics about the data
     """
-    stats = {
-        'rows': len(df),
-        'columns': len(df.columns),
-        'column_types': df.dtypes.astype(str).to_dict(),
-        'missing_values': df.isnull().sum().to_dict(),
-        'numeric_stats': {}
-    }
-    
-    # Add statistics for numeric columns
-    numeric_cols = df.select_dtypes(include=['number']).columns
-    for col in numeric_cols:
-        stats['numeric_stats'][col] = {
-            'mean': df[col].mean(),
-            'std': df[col].std(),
-            'min': df[col].min(),
-            'max': df[col].max()
-        }
-    
-    return stats
+    return StatsAccumulator().update(df).to_dict()
 
-def save_processed_data(df: pd.DataFrame, output_path: str) -> str:
+def save_processed_data(df: pd.DataFrame, output_path: str, append: bool = False) -> str:
     """
     Save processed data to a file.
     
     Args:
         df (pd.DataFrame): Data to save
         output_path (str): Path to save the file
+        append (bool): Append the rows to an existing CSV file without
+            repeating the header, so large outputs can be written chunk by chunk
         
     Returns:
         str: Path to the saved file
@@ -102,8 +301,13 @@ def save_processed_data(df: pd.DataFrame, output_path: str) -> str:
         # Save based on file extension
         _, ext = os.path.splitext(output_path)
         if ext == '.csv':
-            df.to_csv(output_path, index=False)
+            if append and os.path.exists(output_path):
+                df.to_csv(output_path, mode='a', header=False, index=False)
+            else:
+                df.to_csv(output_path, index=False)
         elif ext in ['.xlsx', '.xls']:
+            if append:
+                raise ValueError("Appending is only supported for CSV output")
             df.to_excel(output_path, index=False)
         else:
             raise ValueError(f"Unsupported output format: {ext}")
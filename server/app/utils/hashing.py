@@ -0,0 +1,108 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+class HashingBusyError(Exception):
+    """Raised when too many password hashes are queued to accept another."""
+
+class HashingPool:
+    """
+    Runs password hashing on a small dedicated thread pool.
+    
+    The KDFs behind generate_password_hash release the GIL while they run,
+    so a few threads keep them off the request threads without a process
+    pool. Calls beyond max_pending queued or running hashes are rejected
+    with HashingBusyError instead of waiting, so a login storm is shed
+    rather than delaying every other request.
+    """
+    
+    def __init__(self, app=None):
+        self.method = 'pbkdf2:sha256:600000'
+        self.max_workers = 2
+        self.max_pending = 32
+        self._executor = None
+        self._pending = 0
+        self._lock = threading.Lock()
+        self._method_prefix = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app) -> None:
+        """
+        Configure the pool from the application config.
+        
+        Args:
+            app: Flask application
+        """
+        self.method = app.config['PASSWORD_HASH_METHOD']
+        self.max_workers = app.config['PASSWORD_HASH_WORKERS']
+        self.max_pending = app.config['PASSWORD_HASH_MAX_PENDING']
+        self._method_prefix = None
+    
+    @property
+    def executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                        thread_name_prefix='password-hash')
+        return self._executor
+    
+    def _run(self, fn, *args):
+        with self._lock:
+            if self._pending >= self.max_pending:
+                raise HashingBusyError("Too many password hashing requests")
+            self._pending += 1
+        try:
+            return self.executor.submit(fn, *args).result()
+        finally:
+            with self._lock:
+                self._pending -= 1
+    
+    def generate(self, password: str) -> str:
+        """
+        Hash a password with the configured method.
+        
+        Args:
+            password (str): Password to hash
+        
+        Returns:
+            str: Password hash
+        """
+        return self._run(generate_password_hash, password, self.method)
+    
+    def check(self, password_hash: str, password: str) -> bool:
+        """
+        Verify a password against its hash.
+        
+        Args:
+            password_hash (str): Stored password hash
+            password (str): Password to verify
+        
+        Returns:
+            bool: True if the password matches
+        """
+        return self._run(check_password_hash, password_hash, password)
+    
+    def needs_rehash(self, password_hash: str) -> bool:
+        """
+        Check whether a hash was made with a different method or cost.
+        
+        Args:
+            password_hash (str): Stored password hash
+        
+        Returns:
+            bool: True if the hash should be replaced with a new one
+        """
+        if self._method_prefix is None:
+            # Expand defaults, e.g. 'scrypt' to 'scrypt:32768:8:1', as stored in hashes
+            self._method_prefix = generate_password_hash('', self.method).split('$', 1)[0]
+        return password_hash.split('$', 1)[0] != self._method_prefix
+
+# Global hashing pool, configured by create_app
+hashing_pool = HashingPool()
@@ -0,0 +1,198 @@
+import os
+import time
+import shutil
+import logging
+from typing import Dict, Any, Callable, Optional
+from .file_handler import stream_uploaded_file, DEFAULT_CHUNK_SIZE
+from .dataset_cache import DatasetWriter, file_digest, dataset_key, has_cached_dataset, compact_dataset
+from .kpis import KpiAccumulator, kpi_path, save_kpis
+from .compaction import DtypeAccumulator
+from .jobs import update_job
+from .upload_sessions import get_session, data_path, wait_for_writers, release_data
+from .upload_store import stored_path, hold_content
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+def ingest_upload(filepath: str,
+                  filename: str,
+                  cache_folder: str,
+                  chunksize: int = DEFAULT_CHUNK_SIZE,
+                  on_progress: Optional[Callable[[int, float], None]] = None,
+                  kpi_settings: Optional[Dict[str, Any]] = None,
+                  digest: Optional[str] = None,
+                  read_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Process a saved upload and return the statistics reported to clients.
+    
+    The file is streamed in chunks, building the summary as it goes and
+    caching the cleaned data in columnar form unless this content is cached
+    already. The dashboard KPIs are materialized in the same pass, and the
+    compact dtypes of the data are worked out so the cached dataset can be
+    stored with them. Used both by the upload request and by background
+    upload jobs.
+    
+    Args:
+        filepath (str): Path to the saved upload
+        filename (str): Name the upload is known by
+        cache_folder (str): Dataset cache directory
+        chunksize (int): Number of rows to read per chunk
+        on_progress (Callable, optional): Called after every chunk with the
+            number of rows processed and the fraction of the file read
+        kpi_settings (Dict[str, Any], optional): KPI settings, see kpi_settings,
+            KPIs are not materialized if omitted
+        digest (str, optional): Dataset cache key, the content hash of the
+            file if omitted
+        read_options (Dict[str, Any], optional): Sheet and columns to read,
+            see file_handler.iter_processed_chunks
+    
+    Returns:
+        Dict[str, Any]: Upload statistics
+    """
+    digest = digest or dataset_key(file_digest(filepath), read_options)
+    compaction = DtypeAccumulator()
+    consumers = [compaction.update]
+    
+    writer = None
+    if not has_cached_dataset(cache_folder, digest):
+        writer = DatasetWriter(cache_folder, digest)
+        consumers.append(writer.write)
+    
+    kpis = None
+    if kpi_settings is not None and not os.path.exists(kpi_path(cache_folder, digest, kpi_settings)):
+        kpis = KpiAccumulator(**kpi_settings)
+        consumers.append(kpis.update)
+    
+    def consume(chunk):
+        for consumer in consumers:
+            consumer(chunk)
+    
+    try:
+        summary = stream_uploaded_file(filepath, chunksize=chunksize,
+                                       on_chunk=consume, on_progress=on_progress,
+                                       **(read_options or {}))
+    except Exception:
+        if writer is not None:
+            writer.abort()
+        raise
+    if writer is not None and writer.close() is not None:
+        compact_dataset(cache_folder, digest, compaction.dtypes())
+    
+    if kpis is not None and has_cached_dataset(cache_folder, digest):
+        save_kpis(kpis.to_dict(), kpi_path(cache_folder, digest, kpi_settings))
+    logger.info(f"Ingested {filename}: {summary['rows']} rows")
+    
+    return {
+        'rows': summary['rows'],
+        'columns': list(summary['column_types']),
+        'sample_data': summary['sample_data'],
+        'missing_values': summary['missing_values'],
+        'numeric_stats': summary['numeric_stats'],
+        'distinct_counts': summary['distinct_counts'],
+        'memory_usage': compaction.to_dict()
+    }
+
+def run_upload_job(jobs_folder: str,
+                   job_id: str,
+                   filepath: str,
+                   filename: str,
+                   cache_folder: str,
+                   chunksize: int = DEFAULT_CHUNK_SIZE,
+                   kpi_settings: Optional[Dict[str, Any]] = None,
+                   digest: Optional[str] = None,
+                   read_options: Optional[Dict[str, Any]] = None) -> None:
+    """
+    Ingest an upload as a background job, reporting progress on the job record.
+    
+    Args:
+        jobs_folder (str): Directory holding job records
+        job_id (str): Job identifier
+        filepath (str): Path to the saved upload
+        filename (str): Name the upload is known by
+        cache_folder (str): Dataset cache directory
+        chunksize (int): Number of rows to read per chunk
+        kpi_settings (Dict[str, Any], optional): KPI settings, see kpi_settings
+        digest (str, optional): Dataset cache key, the content hash of the
+            file if omitted
+        read_options (Dict[str, Any], optional): Sheet and columns to read
+    """
+    update_job(jobs_folder, job_id, status='running', started_at=time.time())
+    _ingest_job(jobs_folder, job_id, filepath, filename, cache_folder, chunksize,
+                kpi_settings, digest, read_options)
+
+def _ingest_job(jobs_folder, job_id, filepath, filename, cache_folder, chunksize,
+                kpi_settings, digest, read_options):
+    def report_progress(rows: int, fraction: float) -> None:
+        update_job(jobs_folder, job_id, rows_processed=rows, progress=round(fraction, 4))
+    
+    try:
+        stats = ingest_upload(filepath, filename, cache_folder, chunksize,
+                              on_progress=report_progress, kpi_settings=kpi_settings, digest=digest,
+                              read_options=read_options)
+    except Exception as e:
+        logger.error(f"Error in upload job {job_id}: {str(e)}")
+        update_job(jobs_folder, job_id, status='failed', error=str(e))
+        return
+    
+    update_job(jobs_folder, job_id, status='completed', progress=1.0,
+               rows_processed=stats['rows'], result=stats)
+
+def run_session_job(jobs_folder: str,
+                    job_id: str,
+                    sessions_folder: str,
+                    session_id: str,
+                    upload_folder: str,
+                    cache_folder: str,
+                    chunksize: int = DEFAULT_CHUNK_SIZE,
+                    kpi_settings: Optional[Dict[str, Any]] = None,
+                    writer_timeout: float = 300) -> None:
+    """
+    Store and ingest a completed resumable upload as a background job.
+    
+    The assembled file is hashed and moved under its content hash here
+    rather than in the request that completed the session, as both take as
+    long as reading the whole file. The content hash and the hold on the
+    stored file are recorded on the job, so the upload can be cataloged
+    once the job ends.
+    
+    Args:
+        jobs_folder (str): Directory holding job records
+        job_id (str): Job identifier
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier, claimed for finalizing
+        upload_folder (str): Upload directory
+        cache_folder (str): Dataset cache directory
+        chunksize (int): Number of rows to read per chunk
+        kpi_settings (Dict[str, Any], optional): KPI settings, see kpi_settings
+        writer_timeout (float): Seconds after which an unfinished chunk
+            write is no longer waited for
+    """
+    update_job(jobs_folder, job_id, status='running', started_at=time.time())
+    
+    try:
+        session = get_session(sessions_folder, session_id)
+        if session is None:
+            raise ValueError(f"Upload session not found: {session_id}")
+        # Chunk writes already under way when the session was claimed finish first
+        wait_for_writers(sessions_folder, session_id, writer_timeout)
+        
+        source = data_path(sessions_folder, session_id)
+        content_hash = file_digest(source)
+        extension = os.path.splitext(session['filename'])[1].lower()
+        filepath = stored_path(upload_folder, content_hash, extension)
+        os.makedirs(upload_folder, exist_ok=True)
+        # Released once the session is cataloged, see upload_store.hold_content
+        hold = hold_content(upload_folder, content_hash, extension)
+        digest = dataset_key(content_hash, session['read_options'])
+        update_job(jobs_folder, job_id, content_hash=content_hash, hold=hold,
+                   deduplicated=has_cached_dataset(cache_folder, digest))
+        shutil.move(source, filepath)
+        release_data(sessions_folder, session_id)
+    except Exception as e:
+        logger.error(f"Error in upload job {job_id}: {str(e)}")
+        update_job(jobs_folder, job_id, status='failed', error=str(e))
+        return
+    
+    _ingest_job(jobs_folder, job_id, filepath, session['filename'], cache_folder, chunksize,
+                kpi_settings, digest, session['read_options'])
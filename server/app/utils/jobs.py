@@ -0,0 +1,177 @@
+import os
+import re
+import json
+import time
+import uuid
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Dict, Any, Callable, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+def _job_path(jobs_folder: str, job_id: str) -> str:
+    if not JOB_ID_PATTERN.match(job_id):
+        raise ValueError(f"Invalid job id: {job_id}")
+    return os.path.join(jobs_folder, job_id + '.json')
+
+def _write_job(jobs_folder: str, job: Dict[str, Any]) -> None:
+    # Write to a temp file and rename so pollers never read a partial record
+    path = _job_path(jobs_folder, job['id'])
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f, default=str)
+    os.replace(tmp_path, path)
+
+def create_job(jobs_folder: str, job_type: str, owner: Optional[str] = None, **fields) -> Dict[str, Any]:
+    """
+    Create a queued job record.
+    
+    Job records are JSON files, so every worker process sees the same state.
+    
+    Args:
+        jobs_folder (str): Directory holding job records
+        job_type (str): Kind of job, e.g. 'upload'
+        owner (str, optional): Identity of the user who started the job
+        **fields: Extra fields stored with the job
+    
+    Returns:
+        Dict[str, Any]: The job record
+    """
+    os.makedirs(jobs_folder, exist_ok=True)
+    now = time.time()
+    job = {
+        'id': uuid.uuid4().hex,
+        'type': job_type,
+        'owner': owner,
+        'status': 'queued',
+        'progress': 0.0,
+        'rows_processed': 0,
+        'result': None,
+        'error': None,
+        'created_at': now,
+        'updated_at': now
+    }
+    job.update(fields)
+    _write_job(jobs_folder, job)
+    return job
+
+def get_job(jobs_folder: str, job_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a job record.
+    
+    Args:
+        jobs_folder (str): Directory holding job records
+        job_id (str): Job identifier
+    
+    Returns:
+        Optional[Dict[str, Any]]: The job record, or None if it does not exist
+    """
+    try:
+        with open(_job_path(jobs_folder, job_id)) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def update_job(jobs_folder: str, job_id: str, **fields) -> Dict[str, Any]:
+    """
+    Update fields of a job record.
+    
+    Args:
+        jobs_folder (str): Directory holding job records
+        job_id (str): Job identifier
+        **fields: Fields to set
+    
+    Returns:
+        Dict[str, Any]: The updated job record
+    """
+    job = get_job(jobs_folder, job_id)
+    if job is None:
+        raise KeyError(f"Job not found: {job_id}")
+    job.update(fields)
+    job['updated_at'] = time.time()
+    _write_job(jobs_folder, job)
+    return job
+
+class JobQueue:
+    """
+    Runs CPU-heavy jobs in a local process pool, off the request threads.
+    
+    Workers are started with the 'spawn' method so they do not inherit the
+    locks and threads of the web server process.
+    """
+    
+    def __init__(self, app=None):
+        self.jobs_folder = None
+        self.max_workers = None
+        self._executor = None
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app) -> None:
+        """
+        Configure the queue from the application config.
+        
+        Args:
+            app: Flask application
+        """
+        self.jobs_folder = app.config['JOBS_FOLDER']
+        self.max_workers = app.config['JOB_WORKERS']
+        os.makedirs(self.jobs_folder, exist_ok=True)
+    
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers,
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return self._executor
+    
+    def submit(self, job: Dict[str, Any], fn: Callable, *args, **kwargs) -> Future:
+        """
+        Run a job function in the process pool.
+        
+        The function receives the jobs folder and job id first and is
+        responsible for reporting its own progress and result with
+        update_job. Failures that escape it are recorded on the job.
+        
+        Args:
+            job (Dict[str, Any]): Job record returned by create_job
+            fn (Callable): Picklable module-level job function
+            *args: Further positional arguments for fn
+            **kwargs: Keyword arguments for fn
+        
+        Returns:
+            Future: Future of the job function
+        """
+        jobs_folder = self.jobs_folder
+        job_id = job['id']
+        future = self.executor.submit(fn, jobs_folder, job_id, *args, **kwargs)
+        
+        def record_failure(done: Future) -> None:
+            error = done.exception()
+            if error is not None:
+                logger.error(f"Job {job_id} failed: {str(error)}")
+                update_job(jobs_folder, job_id, status='failed', error=str(error))
+        
+        future.add_done_callback(record_failure)
+        return future
+    
+    def shutdown(self, wait: bool = True) -> None:
+        """
+        Stop the worker processes.
+        
+        Args:
+            wait (bool): Wait for running jobs to finish
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+# Global job queue, configured by create_app
+job_queue = JobQueue()
@@ -0,0 +1,88 @@
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict
+from flask_jwt_extended import JWTManager
+from flask_jwt_extended.config import config
+
+class CachingJWTManager(JWTManager):
+    """
+    JWTManager that remembers tokens it has already verified.
+    
+    Dashboards poll with the same token many times a second, and each poll
+    would otherwise decode the token and check its signature again. Verified
+    claims are kept in a bounded LRU keyed by the SHA-256 of the token and
+    dropped once the token expires, at which point it goes through the full
+    verification again and is rejected as usual. Only tokens decoded without
+    a CSRF value are cached, so cookie tokens keep their CSRF check.
+    """
+    
+    def __init__(self, app=None, max_entries: int = 4096, **kwargs):
+        self.max_entries = max_entries
+        self._tokens = OrderedDict()
+        self._cache_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.verify_time = 0.0
+        super().__init__(app, **kwargs)
+    
+    def init_app(self, app) -> None:
+        """
+        Register the manager with the app and size the cache from its config.
+        
+        Args:
+            app: Flask application
+        """
+        super().init_app(app)
+        self.max_entries = app.config.get('JWT_CACHE_SIZE', self.max_entries)
+    
+    def _decode_jwt_from_config(self, encoded_token: str, csrf_value=None, allow_expired: bool = False) -> dict:
+        if self.max_entries <= 0 or csrf_value is not None or allow_expired:
+            return super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        
+        key = hashlib.sha256(encoded_token.encode()).digest()
+        now = time.time()
+        with self._cache_lock:
+            entry = self._tokens.get(key)
+            if entry is not None:
+                claims, expires_at = entry
+                if expires_at is None or now < expires_at:
+                    self._tokens.move_to_end(key)
+                    self.hits += 1
+                    return dict(claims)
+                del self._tokens[key]
+        
+        started = time.perf_counter()
+        claims = super()._decode_jwt_from_config(encoded_token, csrf_value, allow_expired)
+        elapsed = time.perf_counter() - started
+        
+        expires_at = claims['exp'] + config.leeway if 'exp' in claims else None
+        with self._cache_lock:
+            self.misses += 1
+            self.verify_time += elapsed
+            self._tokens[key] = (dict(claims), expires_at)
+            while len(self._tokens) > self.max_entries:
+                self._tokens.popitem(last=False)
+        return claims
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Get cache counters and the verification time the cache saved.
+        
+        Returns:
+            Dict[str, Any]: Hits, misses, mean verification time and the time
+                saved by hits, assuming each would have cost the mean
+        """
+        with self._cache_lock:
+            mean_verify = self.verify_time / self.misses if self.misses else 0.0
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._tokens),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None,
+                'mean_verify_ms': mean_verify * 1000,
+                'saved_ms': self.hits * mean_verify * 1000
+            }
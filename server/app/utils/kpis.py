@@ -0,0 +1,287 @@
+import os
+import re
+import json
+import uuid
+import hashlib
+import logging
+import numpy as np
+import pandas as pd
+from typing import Any, Dict, List, Optional
+from .dataset_cache import iter_dataset_batches
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Aggregates a KPI set can report for every numeric column
+KPI_FUNCTIONS = ('count', 'sum', 'mean', 'min', 'max')
+
+# Label of the breakdown row holding missing category values
+MISSING_LABEL = '(missing)'
+
+# Text that looks like the start of a date, e.g. 2024-01-31 or 31/01/2024
+_DATE_LIKE = re.compile(r'^\s*\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4}')
+
+def kpi_settings(config) -> Dict[str, Any]:
+    """
+    Get the KPI settings from the application config.
+    
+    Args:
+        config: Flask application config
+    
+    Returns:
+        Dict[str, Any]: Settings for KpiAccumulator
+    """
+    functions = [name.strip() for name in config['KPI_FUNCTIONS'].split(',') if name.strip()]
+    unknown = set(functions) - set(KPI_FUNCTIONS)
+    if unknown:
+        raise ValueError(f"Unknown KPI functions: {sorted(unknown)}")
+    return {
+        'functions': functions,
+        'max_categories': config['KPI_MAX_CATEGORIES'],
+        'time_bucket': config['KPI_TIME_BUCKET']
+    }
+
+def kpi_path(cache_folder: str, digest: str, settings: Dict[str, Any]) -> str:
+    """
+    Get the file the KPIs of a dataset are materialized in.
+    
+    The name covers the dataset's content hash and the settings, so
+    changing the KPI config never serves KPIs computed with the old one.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        settings (Dict[str, Any]): KPI settings
+    
+    Returns:
+        str: Path to the KPI file
+    """
+    fingerprint = hashlib.sha256(json.dumps(settings, sort_keys=True).encode()).hexdigest()[:16]
+    return os.path.join(cache_folder, f"{digest}.{fingerprint}.kpis.json")
+
+def _number(value) -> Optional[float]:
+    if value is None or pd.isna(value):
+        return None
+    value = float(value)
+    return int(value) if value.is_integer() and abs(value) < 2 ** 53 else value
+
+def _is_time_column(series: pd.Series) -> bool:
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return True
+    if not (pd.api.types.is_object_dtype(series) or pd.api.types.is_string_dtype(series)):
+        return False
+    sample = series.dropna().astype(str).head(100)
+    if sample.empty or not sample.str.match(_DATE_LIKE).all():
+        return False
+    return pd.to_datetime(sample, errors='coerce', format='mixed').notna().mean() >= 0.9
+
+def _group_stats(keys: pd.Series, values: pd.DataFrame) -> pd.DataFrame:
+    """Row count and count/sum/min/max of every value column, per key."""
+    grouped = values.groupby(keys.to_numpy(), sort=False)
+    stats = grouped.agg(['count', 'sum', 'min', 'max']) if len(values.columns) else pd.DataFrame(index=grouped.size().index)
+    stats[('', 'rows')] = grouped.size()
+    return stats
+
+def _merge_stats(total: Optional[pd.DataFrame], part: pd.DataFrame) -> pd.DataFrame:
+    if total is None:
+        return part
+    combined = pd.concat([total, part])
+    how = {column: column[1] if column[1] in ('min', 'max') else 'sum' for column in combined.columns}
+    return combined.groupby(level=0, sort=False).agg(how)[combined.columns]
+
+class KpiAccumulator:
+    """
+    Dashboard KPIs built chunk by chunk while an upload is processed.
+    
+    Keeps running totals of every numeric column, breakdowns of the numeric
+    columns by every categorical column with at most max_categories values,
+    and the same breakdowns by time bucket for every date column. All of it
+    is a few small grouped frames merged after each chunk, so the memory
+    used does not grow with the number of rows. Column roles are fixed from
+    the first chunk.
+    """
+    
+    def __init__(self, functions=KPI_FUNCTIONS, max_categories: int = 50, time_bucket: str = 'M'):
+        """
+        Initialize an empty accumulator.
+        
+        Args:
+            functions: Aggregates reported for every numeric column
+            max_categories (int): Columns with more distinct values get no breakdown
+            time_bucket (str): Pandas period of the time series buckets, e.g. 'D', 'W' or 'M'
+        """
+        self.functions = list(functions)
+        self.max_categories = max_categories
+        self.time_bucket = time_bucket
+        self.rows = 0
+        self.numeric_columns = None
+        self.category_columns = []
+        self.time_columns = []
+        self.skipped_columns = []
+        self._totals = None
+        self._categories = {}
+        self._times = {}
+    
+    def _assign_columns(self, chunk: pd.DataFrame) -> None:
+        numeric = chunk.select_dtypes(include='number', exclude='bool').columns
+        self.numeric_columns = list(numeric)
+        for column in chunk.columns:
+            if column in numeric:
+                continue
+            if _is_time_column(chunk[column]):
+                self.time_columns.append(column)
+            else:
+                self.category_columns.append(column)
+    
+    def update(self, chunk: pd.DataFrame) -> 'KpiAccumulator':
+        """
+        Add a chunk of cleaned data.
+        
+        Args:
+            chunk (pd.DataFrame): Cleaned chunk of the upload
+        
+        Returns:
+            KpiAccumulator: self
+        """
+        if self.numeric_columns is None:
+            self._assign_columns(chunk)
+        if chunk.empty:
+            return self
+        self.rows += len(chunk)
+        
+        values = chunk[self.numeric_columns].apply(pd.to_numeric, errors='coerce')
+        part = values.agg(['count', 'sum', 'min', 'max']).T
+        if self._totals is None:
+            self._totals = part
+        else:
+            self._totals = pd.DataFrame({
+                'count': self._totals['count'] + part['count'],
+                'sum': self._totals['sum'] + part['sum'],
+                'min': np.fmin(self._totals['min'], part['min']),
+                'max': np.fmax(self._totals['max'], part['max'])
+            })
+        
+        for column in list(self.category_columns):
+            keys = chunk[column].astype('string').fillna(MISSING_LABEL)
+            merged = _merge_stats(self._categories.get(column), _group_stats(keys, values))
+            if len(merged) > self.max_categories:
+                # Too many values to chart, e.g. an id or free text column
+                self.category_columns.remove(column)
+                self.skipped_columns.append(column)
+                self._categories.pop(column, None)
+                continue
+            self._categories[column] = merged
+        
+        for column in self.time_columns:
+            if pd.api.types.is_datetime64_any_dtype(chunk[column]):
+                moments = chunk[column]
+            else:
+                moments = pd.to_datetime(chunk[column], errors='coerce', format='mixed')
+            # Bucketed in UTC, as dates are stored and filtered
+            if getattr(moments.dt, 'tz', None) is not None:
+                moments = moments.dt.tz_convert(None)
+            present = moments.notna().to_numpy()
+            if not present.any():
+                continue
+            keys = moments[present].dt.to_period(self.time_bucket).astype(str)
+            self._times[column] = _merge_stats(self._times.get(column), _group_stats(keys, values[present]))
+        
+        return self
+    
+    def _metrics(self, count, total, minimum, maximum) -> Dict[str, Optional[float]]:
+        values = {
+            'count': _number(count),
+            'sum': _number(total),
+            'mean': _number(total / count) if count else None,
+            'min': _number(minimum),
+            'max': _number(maximum)
+        }
+        return {name: values[name] for name in self.functions}
+    
+    def _groups(self, stats: pd.DataFrame, label: str) -> List[Dict[str, Any]]:
+        groups = []
+        for key, row in stats.iterrows():
+            groups.append({
+                label: key,
+                'rows': int(row[('', 'rows')]),
+                'metrics': {
+                    column: self._metrics(row[(column, 'count')], row[(column, 'sum')],
+                                          row[(column, 'min')], row[(column, 'max')])
+                    for column in self.numeric_columns
+                }
+            })
+        return groups
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the KPIs in the form served to the dashboard.
+        
+        Returns:
+            Dict[str, Any]: Totals per numeric column, breakdowns per category
+                column (largest groups first) and time series per date column
+        """
+        totals = {}
+        if self._totals is not None:
+            for column, row in self._totals.iterrows():
+                totals[column] = self._metrics(row['count'], row['sum'], row['min'], row['max'])
+        
+        breakdowns = {}
+        for column in self.category_columns:
+            stats = self._categories.get(column)
+            if stats is not None:
+                stats = stats.sort_values(('', 'rows'), ascending=False, kind='stable')
+                breakdowns[column] = self._groups(stats, 'value')
+        
+        time_series = {}
+        for column in self.time_columns:
+            stats = self._times.get(column)
+            time_series[column] = {
+                'bucket': self.time_bucket,
+                'points': self._groups(stats.sort_index(), 'period') if stats is not None else []
+            }
+        
+        return {
+            'rows': self.rows,
+            'totals': totals,
+            'breakdowns': breakdowns,
+            'time_series': time_series,
+            'skipped_columns': self.skipped_columns
+        }
+
+def save_kpis(kpis: Dict[str, Any], path: str) -> str:
+    """
+    Write materialized KPIs, replacing any previous file atomically.
+    
+    Args:
+        kpis (Dict[str, Any]): Output of KpiAccumulator.to_dict
+        path (str): File to write, see kpi_path
+    
+    Returns:
+        str: Path to the KPI file
+    """
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(kpis, f, separators=(',', ':'), default=str)
+    os.replace(tmp_path, path)
+    return path
+
+def materialize_kpis(cache_folder: str, digest: str, settings: Dict[str, Any]) -> str:
+    """
+    Compute the KPIs of a cached dataset that has none materialized yet.
+    
+    Used for datasets cached before KPIs existed or under other settings;
+    uploads get their KPIs while they are ingested.
+    
+    Args:
+        cache_folder (str): Dataset cache directory
+        digest (str): Content hash of the upload
+        settings (Dict[str, Any]): KPI settings
+    
+    Returns:
+        str: Path to the KPI file
+    """
+    accumulator = KpiAccumulator(**settings)
+    for batch in iter_dataset_batches(cache_folder, digest):
+        accumulator.update(batch)
+    return save_kpis(accumulator.to_dict(), kpi_path(cache_folder, digest, settings))
@@ -0,0 +1,164 @@
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+# Words that ask for an aggregate, with the query function they map to
+_AGGREGATE_WORDS = [
+    (r'\b(average|avg|mean)\b', 'mean'),
+    (r'\b(total|sum)\b', 'sum'),
+    (r'\b(maximum|max|highest|largest|biggest)\b', 'max'),
+    (r'\b(minimum|min|lowest|smallest)\b', 'min'),
+    (r'\bmedian\b', 'median'),
+    (r'\b(distinct|unique)\b', 'nunique'),
+    (r'\b(how many|count|number of)\b', 'count')
+]
+
+# Comparison phrases, longest first so "at least" wins over "at"
+_COMPARISONS = [
+    ('greater than or equal to', '>='), ('less than or equal to', '<='),
+    ('at least', '>='), ('at most', '<='), ('more than', '>'), ('greater than', '>'),
+    ('above', '>'), ('over', '>'), ('less than', '<'), ('below', '<'), ('under', '<'),
+    ('>=', '>='), ('<=', '<='), ('!=', '!='), ('is not', '!='), ('>', '>'), ('<', '<'),
+    ('==', '=='), ('=', '=='), ('equals', '=='), ('is', '==')
+]
+
+def _column_pattern(column: str) -> str:
+    # "unit_price" also matches "unit price" and "Unit-Prices"
+    words = [re.escape(word) for word in re.split(r'[\s_\-]+', str(column).strip()) if word]
+    return r'\b' + r'[\s_\-]+'.join(words) + r'(?:e?s)?\b'
+
+def _find_columns(text: str, columns: List[str]) -> List[Tuple[int, int, str]]:
+    """Columns mentioned in text, with their spans, longest names matched first."""
+    found = []
+    for column in sorted(columns, key=lambda c: len(str(c)), reverse=True):
+        if not str(column).strip():
+            continue
+        for match in re.finditer(_column_pattern(column), text, re.IGNORECASE):
+            if any(start < match.end() and match.start() < end for start, end, _ in found):
+                continue
+            found.append((match.start(), match.end(), column))
+            break
+    return sorted(found, key=lambda item: item[0])
+
+def _parse_value(text: str) -> Any:
+    text = text.strip().strip('\'"')
+    try:
+        number = float(text)
+        return int(number) if number.is_integer() and '.' not in text else number
+    except ValueError:
+        return text
+
+def _aggregate_word(text: str) -> Optional[str]:
+    for pattern, name in _AGGREGATE_WORDS:
+        if re.search(pattern, text, re.IGNORECASE):
+            return name
+    return None
+
+def question_to_query(question: str, columns: List[str]) -> Tuple[Dict[str, Any], str]:
+    """
+    Translate a plain-English question about a dataset into a query.
+    
+    A rule-based stand-in for a language model: it recognizes an aggregate
+    word ("average", "total", "how many", ...), the columns named in the
+    question, a "by"/"per" grouping, "top"/"bottom N" and simple "where"
+    conditions. Questions it cannot map raise ValueError.
+    
+    Args:
+        question (str): Question from the user
+        columns (List[str]): Columns of the dataset
+    
+    Returns:
+        Tuple[Dict[str, Any], str]: Query for the query engine, and a
+            description of how the question was read
+    """
+    text = re.sub(r'\s+', ' ', question).strip().rstrip('?.! ')
+    if not text:
+        raise ValueError("Question is empty")
+    
+    # Split off the condition, so its columns are not read as the subject
+    condition = None
+    match = re.search(r'\b(where|when|with|for which|if)\b(.*)$', text, re.IGNORECASE)
+    if match:
+        condition = match.group(2).strip()
+        text = text[:match.start()].strip()
+    
+    # Split off the grouping. "top 5 regions by total sales" ranks groups by
+    # an aggregate, so there the columns before "by" are the groups instead
+    group_by = []
+    match = re.search(r'\b(by|per|for each|across)\b(.*)$', text, re.IGNORECASE)
+    if match:
+        head, tail = text[:match.start()].strip(), match.group(2).strip()
+        if _aggregate_word(tail) and not _aggregate_word(head):
+            head, tail = tail, head
+        group_by = [column for _, _, column in _find_columns(tail, columns)]
+        if not group_by:
+            raise ValueError("Could not tell which column to group by")
+        text = head
+    
+    func = _aggregate_word(text)
+    subjects = [column for _, _, column in _find_columns(text, columns) if column not in group_by]
+    
+    spec: Dict[str, Any] = {}
+    if func is None and not group_by:
+        if not subjects:
+            raise ValueError("Could not find a column or an aggregate in the question")
+        spec['select'] = subjects
+    elif func == 'count' and not subjects:
+        spec['aggregates'] = [{'func': 'count', 'as': 'count'}]
+    else:
+        if not subjects:
+            raise ValueError("Could not tell which column to aggregate")
+        func = func or 'sum'
+        spec['aggregates'] = [{'func': func, 'column': column} for column in subjects]
+    if group_by:
+        spec['group_by'] = group_by
+    
+    if condition:
+        spec['filters'] = _parse_conditions(condition, columns)
+    
+    match = re.search(r'\b(top|bottom|first|last)\s+(\d+)\b', question, re.IGNORECASE)
+    if match and 'aggregates' in spec:
+        first = spec['aggregates'][0]
+        name = first.get('as') or f"{first['func']}_{first['column']}"
+        spec['sort'] = [{'column': name, 'desc': match.group(1).lower() in ('top', 'first')}]
+        spec['limit'] = int(match.group(2))
+    elif group_by:
+        spec['sort'] = list(group_by)
+    
+    return spec, _describe(spec)
+
+def _parse_conditions(condition: str, columns: List[str]) -> List[Dict[str, Any]]:
+    filters = []
+    for part in re.split(r'\band\b', condition, flags=re.IGNORECASE):
+        part = part.strip()
+        mentioned = _find_columns(part, columns)
+        if not mentioned:
+            raise ValueError(f"Could not find a column in the condition '{part}'")
+        _, end, column = mentioned[0]
+        rest = part[end:].strip()
+        
+        op: Optional[str] = None
+        for phrase, symbol in _COMPARISONS:
+            if rest.lower().startswith(phrase):
+                op = symbol
+                rest = rest[len(phrase):].strip()
+                break
+        if op is None or not rest:
+            raise ValueError(f"Could not read the condition '{part}'")
+        filters.append({'column': column, 'op': op, 'value': _parse_value(rest)})
+    return filters
+
+def _describe(spec: Dict[str, Any]) -> str:
+    if 'select' in spec:
+        parts = [f"showing {', '.join(map(str, spec['select']))}"]
+    else:
+        parts = [', '.join(
+            'number of rows' if a.get('column') is None else f"{a['func']} of {a['column']}"
+            for a in spec['aggregates']
+        )]
+    if spec.get('group_by'):
+        parts.append(f"by {', '.join(map(str, spec['group_by']))}")
+    if spec.get('filters'):
+        parts.append('where ' + ' and '.join(f"{f['column']} {f['op']} {f['value']}" for f in spec['filters']))
+    if 'limit' in spec:
+        parts.append(f"({'top' if spec['sort'][0]['desc'] else 'bottom'} {spec['limit']})")
+    return ' '.join(parts)
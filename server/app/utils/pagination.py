@@ -0,0 +1,36 @@
+import json
+import base64
+from datetime import datetime
+from typing import Any, Tuple
+
+def encode_cursor(row: Any) -> str:
+    """
+    Encode the position after a row for the next page of a listing.
+    
+    Listings are ordered by creation time and id, newest first, so the
+    position is the pair of both.
+    
+    Args:
+        row: Last row of the current page, with created_at and id
+    
+    Returns:
+        str: Opaque cursor
+    """
+    position = json.dumps([row.created_at.isoformat(), row.id])
+    return base64.urlsafe_b64encode(position.encode()).decode()
+
+def decode_cursor(cursor: str) -> Tuple[datetime, str]:
+    """
+    Decode a cursor from encode_cursor.
+    
+    Args:
+        cursor (str): Opaque cursor
+    
+    Returns:
+        Tuple[datetime, str]: Creation time and id of the last row seen
+    """
+    try:
+        created_at, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), str(row_id)
+    except (ValueError, TypeError):
+        raise ValueError("Invalid cursor")
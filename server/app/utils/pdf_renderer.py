@@ -0,0 +1,259 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import threading
+import multiprocessing
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, Future
+from typing import Any, Dict, Optional, Tuple
+from fpdf import FPDF
+from jinja2 import Environment, FileSystemLoader
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Longest value text rendered for a single report field
+MAX_VALUE_CHARS = 20000
+
+# Templates compiled in this process, by name, with digests of their sources
+_templates = {}
+_template_digests = {}
+
+class RendererBusyError(Exception):
+    """Raised when too many PDFs are waiting to be rendered to accept another."""
+
+def _pretty(value: Any) -> str:
+    text = json.dumps(value, indent=2, default=str)
+    if len(text) > MAX_VALUE_CHARS:
+        text = text[:MAX_VALUE_CHARS] + '\n...'
+    return text
+
+def compile_templates(template_folder: str) -> Dict[str, str]:
+    """
+    Compile every HTML template in a folder for this process.
+    
+    Args:
+        template_folder (str): Folder holding the report templates
+    
+    Returns:
+        Dict[str, str]: SHA-256 of each template's source, by template name
+    """
+    environment = Environment(loader=FileSystemLoader(template_folder), autoescape=True)
+    environment.filters['pretty'] = _pretty
+    _templates.clear()
+    _template_digests.clear()
+    for name in sorted(os.listdir(template_folder)):
+        if not name.endswith('.html'):
+            continue
+        _templates[name] = environment.get_template(name)
+        with open(os.path.join(template_folder, name), 'rb') as f:
+            _template_digests[name] = hashlib.sha256(f.read()).hexdigest()
+    return dict(_template_digests)
+
+def data_digest(data: Any) -> str:
+    """
+    Hash report data independently of key order.
+    
+    Args:
+        data: Report body
+    
+    Returns:
+        str: SHA-256 of the canonical JSON of data
+    """
+    canonical = json.dumps(data, sort_keys=True, separators=(',', ':'), default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+def render_pdf(template_name: str, data: Any, output_path: str) -> str:
+    """
+    Render report data to a PDF file with a compiled template.
+    
+    Args:
+        template_name (str): Name of the template
+        data: Report body
+        output_path (str): PDF file to write
+    
+    Returns:
+        str: Path to the written PDF
+    """
+    title = data.get('title', 'Report') if isinstance(data, dict) else 'Report'
+    html = _templates[template_name].render(title=title, fields=data)
+    
+    pdf = FPDF()
+    pdf.add_page()
+    pdf.set_font('Helvetica', size=10)
+    # The core fonts only cover latin-1
+    pdf.write_html(html.encode('latin-1', 'replace').decode('latin-1'))
+    
+    # Write beside the target and rename, so a cached file is always complete
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    pdf.output(tmp_path)
+    os.replace(tmp_path, output_path)
+    return output_path
+
+class PdfRenderer:
+    """
+    Renders report PDFs in a process pool with a content-addressed cache.
+    
+    A PDF is stored under PDF_OUTPUT_PATH as <hash>.pdf, where the hash
+    covers the template source and the report data, so identical reports
+    are rendered once and served from disk afterwards. Templates are
+    compiled once at startup and once in every worker. At most max_pending
+    renders may wait for the pool; further requests are rejected with
+    RendererBusyError so a burst of reports does not pile up. A failed
+    render is reported for failure_ttl seconds and retried after that; at
+    most max_failures failures are remembered.
+    """
+    
+    def __init__(self, app=None):
+        self.template_folder = None
+        self.output_folder = None
+        self.default_template = 'report.html'
+        self.max_workers = 1
+        self.max_pending = 16
+        self.failure_ttl = 300
+        self.max_failures = 256
+        self.template_digests = {}
+        self._executor = None
+        self._pending: Dict[str, Future] = {}
+        # Error and time of failed renders, oldest first
+        self._failed: 'OrderedDict[str, Tuple[str, float]]' = OrderedDict()
+        self._lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app) -> None:
+        """
+        Configure the renderer and compile the templates.
+        
+        Args:
+            app: Flask application
+        """
+        self.template_folder = app.config['PDF_TEMPLATE_PATH']
+        self.output_folder = app.config['PDF_OUTPUT_PATH']
+        self.default_template = app.config['PDF_DEFAULT_TEMPLATE']
+        self.max_workers = app.config['PDF_WORKERS']
+        self.max_pending = app.config['PDF_MAX_PENDING']
+        self.failure_ttl = app.config['PDF_FAILURE_TTL']
+        self.max_failures = app.config['PDF_MAX_FAILURES']
+        os.makedirs(self.output_folder, exist_ok=True)
+        # Fails at startup rather than on the first report if a template is broken
+        self.template_digests = compile_templates(self.template_folder)
+    
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            with self._lock:
+                if self._executor is None:
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=compile_templates,
+                        initargs=(self.template_folder,)
+                    )
+        return self._executor
+    
+    def cache_path(self, digest: str, template_name: Optional[str] = None) -> str:
+        """
+        Get the cache file of a report's PDF.
+        
+        Args:
+            digest (str): data_digest of the report body
+            template_name (str, optional): Template, the default one if omitted
+        
+        Returns:
+            str: Path the PDF is cached at
+        """
+        template_name = template_name or self.default_template
+        if template_name not in self.template_digests:
+            raise KeyError(f"Unknown template: {template_name}")
+        key = hashlib.sha256(f"{self.template_digests[template_name]}:{digest}".encode()).hexdigest()
+        return os.path.join(self.output_folder, key + '.pdf')
+    
+    def cached(self, digest: str, template_name: Optional[str] = None) -> Optional[str]:
+        """
+        Get the cached PDF of a report if it was rendered already.
+        
+        Args:
+            digest (str): data_digest of the report body
+            template_name (str, optional): Template, the default one if omitted
+        
+        Returns:
+            Optional[str]: Path to the PDF, None if it is not rendered yet
+        """
+        path = self.cache_path(digest, template_name)
+        return path if os.path.exists(path) else None
+    
+    def error(self, digest: str, template_name: Optional[str] = None) -> Optional[str]:
+        """
+        Get the error of a failed render.
+        
+        Args:
+            digest (str): data_digest of the report body
+            template_name (str, optional): Template, the default one if omitted
+        
+        Returns:
+            Optional[str]: Error message, None unless rendering failed
+        """
+        path = self.cache_path(digest, template_name)
+        with self._lock:
+            return self._failure(path)
+    
+    def _failure(self, path: str) -> Optional[str]:
+        # Called with the lock held; an expired failure is forgotten so the
+        # next request renders the report again
+        failure = self._failed.get(path)
+        if failure is None:
+            return None
+        if time.monotonic() - failure[1] >= self.failure_ttl:
+            del self._failed[path]
+            return None
+        return failure[0]
+    
+    def submit(self, data: Any, digest: str, template_name: Optional[str] = None) -> str:
+        """
+        Render a report's PDF in the background unless it is cached or rendering.
+        
+        Args:
+            data: Report body
+            digest (str): data_digest of data
+            template_name (str, optional): Template, the default one if omitted
+        
+        Returns:
+            str: 'ready' if the PDF is cached, 'failed' if rendering it failed,
+                'rendering' otherwise
+        """
+        template_name = template_name or self.default_template
+        path = self.cache_path(digest, template_name)
+        if os.path.exists(path):
+            return 'ready'
+        
+        executor = self.executor
+        with self._lock:
+            if self._failure(path) is not None:
+                return 'failed'
+            if path in self._pending:
+                return 'rendering'
+            if len(self._pending) >= self.max_pending:
+                raise RendererBusyError("Too many reports are being rendered")
+            future = executor.submit(render_pdf, template_name, data, path)
+            self._pending[path] = future
+        
+        def finished(done: Future) -> None:
+            error = done.exception()
+            with self._lock:
+                self._pending.pop(path, None)
+                if error is not None:
+                    self._failed[path] = (str(error), time.monotonic())
+                    while len(self._failed) > self.max_failures:
+                        self._failed.popitem(last=False)
+            if error is not None:
+                logger.error(f"Error rendering {path}: {str(error)}")
+        
+        future.add_done_callback(finished)
+        return 'rendering'
+
+# Global PDF renderer, configured by create_app
+pdf_renderer = PdfRenderer()
@@ -0,0 +1,433 @@
+import json
+import logging
+import threading
+import numpy as np
+import pandas as pd
+from collections import OrderedDict
+from typing import Any, Dict, List
+from .dataset_cache import (has_cached_dataset, cache_dataset_file, load_dataset, dataset_columns, dataset_key,
+                            dataset_failure)
+from .upload_store import get_upload, upload_path, upload_read_options
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Comparison operators accepted in filters
+FILTER_OPS = ('==', '!=', '<', '<=', '>', '>=', 'in', 'not_in', 'contains', 'is_null', 'not_null')
+
+# Aggregate functions, by query name, with the pandas reduction behind each
+AGGREGATES = {
+    'count': 'count',
+    'sum': 'sum',
+    'mean': 'mean',
+    'avg': 'mean',
+    'min': 'min',
+    'max': 'max',
+    'median': 'median',
+    'std': 'std',
+    'nunique': 'nunique'
+}
+
+# Aggregates that only make sense for numbers
+NUMERIC_AGGREGATES = ('sum', 'mean', 'median', 'std')
+
+class QueryPlan:
+    """
+    A validated query with everything needed to run it.
+    
+    Built once per distinct query by compile_query. The plan records the
+    columns the query reads, so only those are loaded from the dataset;
+    columns is None when the query returns every column.
+    """
+    
+    def __init__(self, filters, group_by, aggregates, select, sort, limit):
+        self.filters = filters
+        self.group_by = group_by
+        self.aggregates = aggregates
+        self.select = select
+        self.sort = sort
+        self.limit = limit
+        
+        if aggregates or select:
+            columns = [f['column'] for f in filters] + group_by + select
+            columns += [a['column'] for a in aggregates if a['column'] is not None]
+            if not aggregates:
+                columns += [s['column'] for s in sort]
+            # Keep the first mention of each column, in query order
+            self.columns = list(dict.fromkeys(columns))
+        else:
+            self.columns = None
+        self.key = json.dumps(self.to_dict(), sort_keys=True, default=str)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'filters': self.filters,
+            'group_by': self.group_by,
+            'aggregates': self.aggregates,
+            'select': self.select,
+            'sort': self.sort,
+            'limit': self.limit
+        }
+
+def _as_list(value: Any, name: str) -> list:
+    if value is None:
+        return []
+    if isinstance(value, str):
+        return [value]
+    if not isinstance(value, list):
+        raise ValueError(f"'{name}' must be a list")
+    return value
+
+def compile_query(spec: Dict[str, Any], max_rows: int = 10000) -> QueryPlan:
+    """
+    Validate and normalize a query.
+    
+    A query is a JSON object with optional keys:
+        filters: [{"column", "op", "value"}], all of which must hold
+        group_by: [column, ...]
+        aggregates: [{"func", "column", "as"}], "column" may be omitted for count
+        select: [column, ...], the columns returned when nothing is aggregated
+        sort: [{"column", "desc"}], by output column
+        limit: maximum number of rows returned
+    
+    Args:
+        spec (Dict[str, Any]): Query from the client
+        max_rows (int): Largest limit allowed
+    
+    Returns:
+        QueryPlan: Validated plan
+    """
+    if not isinstance(spec, dict):
+        raise ValueError("Query must be a JSON object")
+    unknown = set(spec) - {'filters', 'group_by', 'aggregates', 'select', 'sort', 'limit'}
+    if unknown:
+        raise ValueError(f"Unknown query keys: {sorted(unknown)}")
+    
+    filters = []
+    for item in _as_list(spec.get('filters'), 'filters'):
+        if not isinstance(item, dict) or 'column' not in item:
+            raise ValueError("Each filter needs a column")
+        op = item.get('op', '==')
+        if op not in FILTER_OPS:
+            raise ValueError(f"Unknown filter operator: {op}")
+        value = item.get('value')
+        if op in ('in', 'not_in') and not isinstance(value, list):
+            raise ValueError(f"Filter operator {op} needs a list value")
+        if op not in ('is_null', 'not_null', 'in', 'not_in') and value is None:
+            raise ValueError(f"Filter operator {op} needs a value")
+        filters.append({'column': str(item['column']), 'op': op, 'value': value})
+    
+    group_by = [str(column) for column in _as_list(spec.get('group_by'), 'group_by')]
+    
+    aggregates = []
+    for item in _as_list(spec.get('aggregates'), 'aggregates'):
+        if not isinstance(item, dict):
+            raise ValueError("Each aggregate must be an object")
+        func = str(item.get('func', '')).lower()
+        if func not in AGGREGATES:
+            raise ValueError(f"Unknown aggregate function: {func}")
+        column = item.get('column')
+        if column is None and func != 'count':
+            raise ValueError(f"Aggregate {func} needs a column")
+        column = None if column is None else str(column)
+        name = item.get('as') or (f"{func}_{column}" if column is not None else 'count')
+        aggregates.append({'func': AGGREGATES[func], 'column': column, 'as': str(name)})
+    if group_by and not aggregates:
+        aggregates.append({'func': 'count', 'column': None, 'as': 'count'})
+    
+    select = [str(column) for column in _as_list(spec.get('select'), 'select')]
+    if aggregates and select:
+        raise ValueError("'select' cannot be combined with aggregates")
+    
+    sort = []
+    for item in _as_list(spec.get('sort'), 'sort'):
+        if isinstance(item, str):
+            item = {'column': item}
+        if not isinstance(item, dict) or 'column' not in item:
+            raise ValueError("Each sort key needs a column")
+        sort.append({'column': str(item['column']), 'desc': bool(item.get('desc', False))})
+    
+    output = group_by + [a['as'] for a in aggregates] if aggregates else None
+    if output is not None:
+        missing = [s['column'] for s in sort if s['column'] not in output]
+        if missing:
+            raise ValueError(f"Cannot sort by columns not in the result: {missing}")
+    
+    try:
+        limit = int(spec.get('limit', max_rows))
+    except (TypeError, ValueError):
+        raise ValueError("'limit' must be an integer")
+    limit = min(max(limit, 0), max_rows)
+    
+    return QueryPlan(filters, group_by, aggregates, select, sort, limit)
+
+def _filter_mask(series: pd.Series, op: str, value: Any) -> np.ndarray:
+    if op == 'is_null':
+        return series.isna().to_numpy()
+    if op == 'not_null':
+        return series.notna().to_numpy()
+    if isinstance(series.dtype, pd.CategoricalDtype):
+        # Test the distinct values once and spread the result over the rows
+        matches = _filter_mask(pd.Series(series.cat.categories), op, value)
+        # Missing values have code -1, which picks the trailing entry: a
+        # missing value tested the way an uncompacted text column tests it
+        missing = _filter_mask(pd.Series([np.nan], dtype=object), op, value)
+        return np.append(matches, missing)[series.cat.codes.to_numpy()]
+    if op == 'in':
+        return series.isin(value).to_numpy()
+    if op == 'not_in':
+        return ~series.isin(value).to_numpy()
+    if op == 'contains':
+        return series.astype(str).str.contains(str(value), case=False, regex=False).to_numpy()
+    
+    # Compare dates and numbers with values of their own type
+    if pd.api.types.is_datetime64_any_dtype(series):
+        value = pd.Timestamp(value)
+        # Dates with an offset are compacted to UTC, naive values are taken as UTC too
+        tz = getattr(series.dtype, 'tz', None)
+        if tz is not None:
+            value = value.tz_localize(tz) if value.tzinfo is None else value.tz_convert(tz)
+        elif value.tzinfo is not None:
+            value = value.tz_convert('UTC').tz_localize(None)
+    elif pd.api.types.is_numeric_dtype(series) and isinstance(value, str):
+        value = float(value)
+    
+    if op == '==':
+        result = series == value
+    elif op == '!=':
+        result = series != value
+    elif op == '<':
+        result = series < value
+    elif op == '<=':
+        result = series <= value
+    elif op == '>':
+        result = series > value
+    else:
+        result = series >= value
+    return result.to_numpy(dtype=bool, na_value=False)
+
+def _to_records(df: pd.DataFrame) -> List[Dict[str, Any]]:
+    df = df.copy()
+    for column in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[column]):
+            df[column] = df[column].dt.strftime('%Y-%m-%dT%H:%M:%S')
+    # NaN is not valid JSON
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+def execute_plan(plan: QueryPlan, df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Run a plan against a DataFrame holding at least the plan's columns.
+    
+    Filters are combined into one boolean mask before any row is copied,
+    and grouping and aggregation run as single pandas reductions.
+    
+    Args:
+        plan (QueryPlan): Compiled query
+        df (pd.DataFrame): Dataset
+    
+    Returns:
+        Dict[str, Any]: Result columns and rows, the number of rows matched
+            by the filters and whether the rows were cut off at the limit
+    """
+    if plan.filters:
+        mask = np.ones(len(df), dtype=bool)
+        for f in plan.filters:
+            try:
+                mask &= _filter_mask(df[f['column']], f['op'], f['value'])
+            except (TypeError, ValueError) as e:
+                raise ValueError(f"Cannot apply filter on {f['column']}: {str(e)}")
+        df = df[mask]
+    matched = len(df)
+    
+    for a in plan.aggregates:
+        if a['func'] in NUMERIC_AGGREGATES and not pd.api.types.is_numeric_dtype(df[a['column']]):
+            raise ValueError(f"Cannot take the {a['func']} of non-numeric column {a['column']}")
+    
+    try:
+        if plan.aggregates and plan.group_by:
+            # A count without a column counts the rows of each group
+            named = {a['as']: (a['column'] or plan.group_by[0], a['func'] if a['column'] else 'size')
+                     for a in plan.aggregates}
+            result = df.groupby(plan.group_by, dropna=False, sort=False, observed=True).agg(**named).reset_index()
+        elif plan.aggregates:
+            result = pd.DataFrame([{
+                a['as']: df[a['column']].agg(a['func']) if a['column'] else len(df)
+                for a in plan.aggregates
+            }])
+        else:
+            result = df[plan.select] if plan.select else df
+        
+        if plan.sort:
+            result = result.sort_values([s['column'] for s in plan.sort],
+                                        ascending=[not s['desc'] for s in plan.sort],
+                                        kind='stable')
+    except TypeError as e:
+        raise ValueError(f"Cannot run query: {str(e)}")
+    
+    truncated = len(result) > plan.limit
+    result = result.head(plan.limit)
+    return {
+        'columns': [str(column) for column in result.columns],
+        'rows': _to_records(result),
+        'row_count': len(result),
+        'matched_rows': matched,
+        'truncated': truncated
+    }
+
+class QueryEngine:
+    """
+    Runs queries against cached uploads with plan and result caches.
+    
+    Compiled plans are kept by the text of the query, and results by the
+    upload's content hash and the plan. A cached dataset never changes
+    under its hash, so results stay valid until they are evicted; replacing
+    an upload gives it a new hash and therefore fresh results. Only the
+    columns a query reads are loaded from the memory-mapped dataset.
+    """
+    
+    def __init__(self, app=None):
+        self.upload_folder = None
+        self.cache_folder = None
+        self.max_rows = 10000
+        self.plan_cache_size = 256
+        self.result_cache_size = 256
+        self._plans = OrderedDict()
+        self._results = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        if app is not None:
+            self.init_app(app)
+    
+    def init_app(self, app) -> None:
+        """
+        Configure the engine from the application config.
+        
+        Args:
+            app: Flask application
+        """
+        self.upload_folder = app.config['UPLOAD_FOLDER']
+        self.cache_folder = app.config['DATASET_CACHE_FOLDER']
+        self.max_rows = app.config['QUERY_MAX_ROWS']
+        self.plan_cache_size = app.config['QUERY_PLAN_CACHE_SIZE']
+        self.result_cache_size = app.config['QUERY_RESULT_CACHE_SIZE']
+    
+    def _remember(self, cache: OrderedDict, key, value, max_entries: int) -> None:
+        # Caller holds the lock
+        cache[key] = value
+        cache.move_to_end(key)
+        while len(cache) > max_entries:
+            cache.popitem(last=False)
+    
+    def plan(self, spec: Dict[str, Any]) -> QueryPlan:
+        """
+        Compile a query, reusing the plan of an identical earlier query.
+        
+        Args:
+            spec (Dict[str, Any]): Query from the client
+        
+        Returns:
+            QueryPlan: Validated plan
+        """
+        text = json.dumps(spec, sort_keys=True, default=str)
+        with self._lock:
+            plan = self._plans.get(text)
+            if plan is not None:
+                self._plans.move_to_end(text)
+                return plan
+        
+        plan = compile_query(spec, self.max_rows)
+        with self._lock:
+            self._remember(self._plans, text, plan, self.plan_cache_size)
+        return plan
+    
+    def dataset_digest(self, owner: str, filename: str) -> str:
+        """
+        Get the dataset cache key of a user's upload, caching the upload if needed.
+        
+        Args:
+            owner (str): User's email
+            filename (str): Name of the uploaded file
+        
+        Returns:
+            str: Key of the cached dataset
+        """
+        upload = get_upload(owner, filename)
+        if upload is None:
+            raise FileNotFoundError(f"Upload not found: {filename}")
+        
+        read_options = upload_read_options(upload)
+        digest = dataset_key(upload.content_hash, read_options)
+        if not has_cached_dataset(self.cache_folder, digest):
+            failure = dataset_failure(self.cache_folder, digest)
+            if failure is not None:
+                raise ValueError(f"Upload {filename} cannot be queried: {failure}")
+            # Parses the upload once and caches it for later queries
+            cache_dataset_file(upload_path(self.upload_folder, upload), self.cache_folder, digest, **read_options)
+            if not has_cached_dataset(self.cache_folder, digest):
+                raise ValueError(f"Upload {filename} cannot be queried")
+        return digest
+    
+    def columns(self, owner: str, filename: str) -> List[str]:
+        """
+        Get the column names of a user's upload.
+        
+        Args:
+            owner (str): User's email
+            filename (str): Name of the uploaded file
+        
+        Returns:
+            List[str]: Column names
+        """
+        return dataset_columns(self.cache_folder, self.dataset_digest(owner, filename))
+    
+    def run(self, owner: str, filename: str, spec: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Run a query against a user's upload.
+        
+        Args:
+            owner (str): User's email
+            filename (str): Name of the uploaded file
+            spec (Dict[str, Any]): Query from the client
+        
+        Returns:
+            Dict[str, Any]: Query result, see execute_plan, with 'cached' set
+                when it was served from the result cache
+        """
+        plan = self.plan(spec)
+        digest = self.dataset_digest(owner, filename)
+        key = (digest, plan.key)
+        with self._lock:
+            result = self._results.get(key)
+            if result is not None:
+                self._results.move_to_end(key)
+                self.hits += 1
+                return dict(result, cached=True)
+            self.misses += 1
+        
+        df = load_dataset(self.cache_folder, digest, plan.columns)
+        result = execute_plan(plan, df)
+        with self._lock:
+            self._remember(self._results, key, result, self.result_cache_size)
+        return dict(result, cached=False)
+    
+    def cache_stats(self) -> Dict[str, Any]:
+        """
+        Get the sizes and hit counts of the caches.
+        
+        Returns:
+            Dict[str, Any]: Cache statistics
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'plans': len(self._plans),
+                'results': len(self._results),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else None
+            }
+
+# Global query engine, configured by create_app
+query_engine = QueryEngine()
@@ -0,0 +1,139 @@
+import json
+import zlib
+import uuid
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, inspect, text
+from .. import db
+from ..models import Report, ReportSection
+from .pdf_renderer import data_digest
+from .pagination import encode_cursor, decode_cursor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Section holding a report body that is not a JSON object
+_WHOLE_BODY = ''
+
+def _compress(value: Any) -> bytes:
+    return zlib.compress(json.dumps(value, separators=(',', ':')).encode(), 6)
+
+def _decompress(payload: bytes) -> Any:
+    return json.loads(zlib.decompress(payload))
+
+def create_report(user: str, data: Any) -> Report:
+    """
+    Store a report body, compressing each top-level field separately.
+    
+    Args:
+        user (str): Owner's email
+        data: Report body
+    
+    Returns:
+        Report: The stored report
+    """
+    if isinstance(data, dict):
+        sections = {str(name): _compress(value) for name, value in data.items()}
+        fields = list(sections)
+        if any(len(name) > 255 for name in fields):
+            raise ValueError("Report field names must be at most 255 characters")
+    else:
+        sections = {_WHOLE_BODY: _compress(data)}
+        fields = None
+    
+    # Random ids cannot collide across workers, unlike a per-process counter
+    report = Report(
+        id=uuid.uuid4().hex,
+        user_email=user,
+        fields=json.dumps(fields),
+        payload_size=sum(len(payload) for payload in sections.values()),
+        content_digest=data_digest(data)
+    )
+    report.sections = [ReportSection(name=name, payload=payload) for name, payload in sections.items()]
+    db.session.add(report)
+    db.session.commit()
+    return report
+
+def get_report(report_id: str, fields: Optional[List[str]] = None, user: Optional[str] = None) -> Optional[Dict[str, Any]]:
+    """
+    Load a report, decompressing only the requested fields.
+    
+    Args:
+        report_id (str): Report id
+        fields (List[str], optional): Top-level fields to load, all if omitted
+        user (str, optional): Owner's email, reports of other users are not found
+    
+    Returns:
+        Optional[Dict[str, Any]]: Report metadata and data, None if not found
+    """
+    report = db.session.get(Report, report_id)
+    if report is None or (user is not None and report.user_email != user):
+        return None
+    
+    result = report.to_dict()
+    stored_fields = result['fields']
+    if stored_fields is None:
+        section = report.sections.filter_by(name=_WHOLE_BODY).one()
+        result['data'] = _decompress(section.payload)
+        return result
+    
+    sections = report.sections
+    if fields is not None:
+        wanted = [name for name in fields if name in stored_fields]
+        if not wanted:
+            result['data'] = {}
+            return result
+        sections = sections.filter(ReportSection.name.in_(wanted))
+    
+    loaded = {section.name: _decompress(section.payload) for section in sections}
+    # Keep the order the fields were stored in
+    result['data'] = {name: loaded[name] for name in stored_fields if name in loaded}
+    return result
+
+def list_reports(user: str, limit: int = 20, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    List a user's reports, newest first, without loading their bodies.
+    
+    Args:
+        user (str): Owner's email
+        limit (int): Maximum number of reports to return
+        cursor (str, optional): Cursor returned with the previous page
+    
+    Returns:
+        Tuple: Report metadata, and the cursor of the next page (None on the last page)
+    """
+    query = Report.query.filter(Report.user_email == user)
+    if cursor is not None:
+        created_at, report_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Report.created_at < created_at,
+            and_(Report.created_at == created_at, Report.id < report_id)
+        ))
+    
+    # Fetch one extra row to know whether another page follows
+    reports = query.order_by(Report.created_at.desc(), Report.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(reports[limit - 1]) if len(reports) > limit else None
+    return [report.to_dict() for report in reports[:limit]], next_cursor
+
+def upgrade_report_table() -> None:
+    """
+    Add columns introduced after the report table was first created.
+    
+    db.create_all only creates missing tables, so databases created by an
+    earlier version get new columns here. Existing reports get the digest
+    of their stored body.
+    """
+    existing = {column['name'] for column in inspect(db.engine).get_columns(Report.__tablename__)}
+    if 'content_digest' in existing:
+        return
+    
+    with db.engine.begin() as connection:
+        connection.execute(text(f"ALTER TABLE {Report.__tablename__} "
+                                "ADD COLUMN content_digest VARCHAR(64) NOT NULL DEFAULT ''"))
+    
+    report_ids = [row.id for row in db.session.query(Report.id).filter(Report.content_digest == '')]
+    for report_id in report_ids:
+        db.session.get(Report, report_id).content_digest = data_digest(get_report(report_id)['data'])
+    db.session.commit()
+    logger.info(f"Added content_digest to the report table, {len(report_ids)} reports updated")
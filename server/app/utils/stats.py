@@ -0,0 +1,413 @@
+import copy
+import warnings
+import logging
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, List, Optional, Sequence
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Quantiles reported for every numeric column
+DEFAULT_QUANTILES = (0.25, 0.5, 0.75)
+
+# Magnitudes outside this range fall into the zero bucket or the outermost
+# bucket of the quantile sketch
+_SKETCH_MIN_MAGNITUDE = 1e-9
+_SKETCH_MAX_MAGNITUDE = 1e15
+
+# Upper bound on cells reduced at once, which bounds the temporaries of update()
+_BLOCK_CELLS = 1 << 22
+
+def _mix64(values: np.ndarray) -> np.ndarray:
+    """
+    Scramble 64-bit keys with the splitmix64 finalizer.
+    
+    Args:
+        values (np.ndarray): uint64 keys
+    
+    Returns:
+        np.ndarray: Well-distributed uint64 hashes
+    """
+    with np.errstate(over='ignore'):
+        z = values + np.uint64(0x9E3779B97F4A7C15)
+        z ^= z >> np.uint64(30)
+        z *= np.uint64(0xBF58476D1CE4E5B9)
+        z ^= z >> np.uint64(27)
+        z *= np.uint64(0x94D049BB133111EB)
+        z ^= z >> np.uint64(31)
+        return z
+
+class StatsAccumulator:
+    """
+    Single-pass, mergeable statistics over a DataFrame or its chunks.
+    
+    Numeric columns are reduced as one float block, so every statistic is a
+    single vectorized reduction over all columns instead of a Python loop per
+    column. Alongside exact moments, every numeric column keeps a log-bucketed
+    quantile sketch (relative error bounded by ``relative_accuracy``) that
+    also backs the histograms, and every column keeps a HyperLogLog sketch
+    for distinct counts. Accumulators built over separate chunks or
+    partitions can be combined with merge().
+    
+    Column roles follow the dtypes of the data. A later chunk read with
+    another numeric dtype widens the reported type to float64, and a
+    numeric column whose chunk is read as text drops its numeric
+    statistics and is counted as text from then on.
+    """
+    
+    def __init__(self,
+                 relative_accuracy: float = 0.02,
+                 hll_precision: int = 12,
+                 histogram_bins: int = 10,
+                 quantiles: Sequence[float] = DEFAULT_QUANTILES):
+        """
+        Initialize an empty accumulator.
+        
+        Args:
+            relative_accuracy (float): Relative error of the quantile sketch
+            hll_precision (int): Number of HyperLogLog index bits (4 to 16)
+            histogram_bins (int): Number of equal-width histogram bins
+            quantiles (Sequence[float]): Quantiles to report
+        """
+        if not 0 < relative_accuracy < 1:
+            raise ValueError("relative_accuracy must be between 0 and 1")
+        if not 4 <= hll_precision <= 16:
+            raise ValueError("hll_precision must be between 4 and 16")
+        
+        self.relative_accuracy = relative_accuracy
+        self.hll_precision = hll_precision
+        self.histogram_bins = histogram_bins
+        self.quantiles = tuple(quantiles)
+        
+        gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = np.log(gamma)
+        self._gamma = gamma
+        self._min_key = int(np.ceil(np.log(_SKETCH_MIN_MAGNITUDE) / self._log_gamma))
+        self._max_key = int(np.ceil(np.log(_SKETCH_MAX_MAGNITUDE) / self._log_gamma))
+        self._n_keys = self._max_key - self._min_key + 1
+        
+        self.rows = 0
+        self.columns: Optional[List[str]] = None
+        self.column_types: Dict[str, str] = {}
+        self.numeric_columns: List[str] = []
+        self.null_counts = None
+        self.count = self.mean = self.m2 = self.min = self.max = None
+        self.sketch = None
+        self.registers = None
+        self._numeric_positions: List[int] = []
+        self._other_columns: List[str] = []
+        self._other_positions: List[int] = []
+    
+    def _index_roles(self) -> None:
+        # Positions are worked out once per role change rather than per block
+        positions = {col: i for i, col in enumerate(self.columns)}
+        numeric = set(self.numeric_columns)
+        self._numeric_positions = [positions[col] for col in self.numeric_columns]
+        self._other_columns = [col for col in self.columns if col not in numeric]
+        self._other_positions = [positions[col] for col in self._other_columns]
+    
+    def _start(self, df: pd.DataFrame) -> None:
+        self.columns = list(df.columns)
+        self.column_types = df.dtypes.astype(str).to_dict()
+        self.numeric_columns = list(df.select_dtypes(include=['number']).columns)
+        self._index_roles()
+        n_numeric = len(self.numeric_columns)
+        
+        self.null_counts = np.zeros(len(self.columns), dtype=np.int64)
+        self.count = np.zeros(n_numeric, dtype=np.int64)
+        self.mean = np.zeros(n_numeric)
+        self.m2 = np.zeros(n_numeric)
+        self.min = np.full(n_numeric, np.inf)
+        self.max = np.full(n_numeric, -np.inf)
+        # Negative buckets (descending magnitude), the zero bucket, then positive buckets
+        self.sketch = np.zeros((n_numeric, 2 * self._n_keys + 1), dtype=np.int64)
+        self.registers = np.zeros((len(self.columns), 1 << self.hll_precision), dtype=np.uint8)
+    
+    def _numeric_block(self, df: pd.DataFrame) -> np.ndarray:
+        return df[self.numeric_columns].to_numpy(dtype=np.float64, na_value=np.nan)
+    
+    def _track_types(self, df: pd.DataFrame) -> None:
+        numeric = set(df.select_dtypes(include=['number']).columns)
+        demoted = [col for col in self.numeric_columns if col not in numeric]
+        for col, dtype in df.dtypes.astype(str).items():
+            if dtype != self.column_types[col]:
+                both_numeric = col in numeric and col in self.numeric_columns
+                self.column_types[col] = 'float64' if both_numeric else 'object'
+        if demoted:
+            logger.warning(f"Columns read as text in a later chunk, numeric statistics dropped: {demoted}")
+            self._demote(demoted)
+    
+    def _demote(self, columns: List[str]) -> None:
+        # Text columns keep their null counts and HyperLogLog registers; values
+        # hashed as numbers before may be counted again when hashed as text
+        demoted = set(columns)
+        drop = [i for i, col in enumerate(self.numeric_columns) if col in demoted]
+        for name in ('count', 'mean', 'm2', 'min', 'max', 'sketch'):
+            setattr(self, name, np.delete(getattr(self, name), drop, axis=0))
+        self.numeric_columns = [col for col in self.numeric_columns if col not in demoted]
+        self.column_types = dict(self.column_types, **{col: 'object' for col in columns})
+        self._index_roles()
+    
+    def update(self, df: pd.DataFrame) -> 'StatsAccumulator':
+        """
+        Add a DataFrame or chunk to the statistics.
+        
+        Args:
+            df (pd.DataFrame): Data to add, with the same columns as earlier chunks
+        
+        Returns:
+            StatsAccumulator: This accumulator
+        """
+        if self.columns is None:
+            self._start(df)
+        elif list(df.columns) != self.columns:
+            raise ValueError("Chunk columns do not match the accumulated columns")
+        else:
+            self._track_types(df)
+        
+        if df.empty:
+            return self
+        
+        self.rows += len(df)
+        step = max(1, _BLOCK_CELLS // max(1, len(self.columns)))
+        for start in range(0, len(df), step):
+            self._update_block(df.iloc[start:start + step])
+        
+        return self
+    
+    def _update_block(self, df: pd.DataFrame) -> None:
+        if self.numeric_columns:
+            values = self._numeric_block(df)
+            missing = np.isnan(values)
+            self._update_moments(values, missing)
+            self._update_sketch(values, missing)
+            self._update_registers(
+                self._numeric_positions,
+                _mix64((values + 0.0).view(np.uint64)),
+                missing
+            )
+            numeric_nulls = missing.sum(axis=0)
+        
+        other_columns = self._other_columns
+        null_counts = pd.Series(0, index=self.columns, dtype=np.int64)
+        if self.numeric_columns:
+            null_counts[self.numeric_columns] = numeric_nulls
+        if other_columns:
+            other = df[other_columns]
+            other_missing = other.isna().to_numpy()
+            null_counts[other_columns] = other_missing.sum(axis=0)
+            hashes = np.column_stack([
+                pd.util.hash_pandas_object(other[col], index=False).to_numpy() for col in other_columns
+            ])
+            self._update_registers(
+                self._other_positions,
+                _mix64(hashes),
+                other_missing
+            )
+        self.null_counts += null_counts.to_numpy()
+    
+    def _update_moments(self, values: np.ndarray, missing: np.ndarray) -> None:
+        count = values.shape[0] - missing.sum(axis=0)
+        deviations = np.where(missing, 0.0, values)
+        mean = deviations.sum(axis=0) / np.maximum(count, 1)
+        np.subtract(values, mean, out=deviations)
+        deviations[missing] = 0.0
+        m2 = np.einsum('ij,ij->j', deviations, deviations)
+        
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', RuntimeWarning)
+            minimum = np.fmin.reduce(values, axis=0)
+            maximum = np.fmax.reduce(values, axis=0)
+        self._combine_moments(count, mean, m2, minimum, maximum)
+    
+    def _combine_moments(self, count, mean, m2, minimum, maximum) -> None:
+        # Chan's parallel update keeps the combined variance numerically stable
+        combined = self.count + count
+        safe_combined = np.maximum(combined, 1)
+        delta = mean - self.mean
+        self.mean = self.mean + delta * count / safe_combined
+        self.m2 = self.m2 + m2 + delta ** 2 * self.count * count / safe_combined
+        self.count = combined
+        # fmin/fmax skip the NaN bounds of columns without values
+        self.min = np.fmin(self.min, minimum)
+        self.max = np.fmax(self.max, maximum)
+    
+    def _update_sketch(self, values: np.ndarray, missing: np.ndarray) -> None:
+        # Log-magnitude keys only need float32 precision, which halves the work
+        with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+            keys = np.abs(values, dtype=np.float32)
+            np.log(keys, out=keys)
+            keys *= np.float32(1 / self._log_gamma)
+            np.ceil(keys, out=keys)
+            is_zero = keys < self._min_key
+            np.clip(keys, self._min_key, self._max_key, out=keys)
+            slots = keys.astype(np.int64)
+        
+        # Offset from the zero bucket, negated for negative values
+        slots -= self._min_key - 1
+        slots[is_zero] = 0
+        np.negative(slots, where=values < 0, out=slots)
+        slots += self._n_keys + np.arange(values.shape[1], dtype=np.int64) * self.sketch.shape[1]
+        
+        flat = slots[~missing]
+        self.sketch += np.bincount(flat, minlength=self.sketch.size).reshape(self.sketch.shape)
+    
+    def _update_registers(self, positions: List[int], hashes: np.ndarray, missing: np.ndarray) -> None:
+        p = self.hll_precision
+        m = self.registers.shape[1]
+        flat = (hashes >> np.uint64(64 - p)).astype(np.int64)
+        flat += np.asarray(positions, dtype=np.int64) * m
+        # frexp gives the bit length of the remaining bits; they are split in
+        # 32-bit halves, which a double holds exactly for any precision
+        rest = hashes & np.uint64((1 << (64 - p)) - 1)
+        _, high_length = np.frexp((rest >> np.uint64(32)).astype(np.float64))
+        _, low_length = np.frexp((rest & np.uint64(0xFFFFFFFF)).astype(np.float64))
+        bit_length = np.where(high_length > 0, high_length + 32, low_length)
+        rank = (64 - p + 1 - bit_length).astype(np.uint8)
+        
+        present = ~missing
+        np.maximum.at(self.registers.reshape(-1), flat[present], rank[present])
+    
+    def merge(self, other: 'StatsAccumulator') -> 'StatsAccumulator':
+        """
+        Combine the statistics of another accumulator into this one.
+        
+        Args:
+            other (StatsAccumulator): Accumulator built over other rows of the same columns
+        
+        Returns:
+            StatsAccumulator: This accumulator
+        """
+        if other.columns is None:
+            return self
+        if self.columns is None:
+            self.columns = list(other.columns)
+            self.column_types = dict(other.column_types)
+            self.numeric_columns = list(other.numeric_columns)
+            self.rows = other.rows
+            for name in ('null_counts', 'count', 'mean', 'm2', 'min', 'max', 'sketch', 'registers'):
+                setattr(self, name, getattr(other, name).copy())
+            self._index_roles()
+            return self
+        if (other.columns != self.columns or other.sketch.shape[1:] != self.sketch.shape[1:]
+                or other.registers.shape != self.registers.shape):
+            raise ValueError("Cannot merge statistics over different columns or settings")
+        
+        # A column that is text on either side is text in the result
+        if other.numeric_columns != self.numeric_columns:
+            numeric = set(self.numeric_columns) & set(other.numeric_columns)
+            self._demote([col for col in self.numeric_columns if col not in numeric])
+            other = copy.copy(other)
+            other._demote([col for col in other.numeric_columns if col not in numeric])
+        for col, dtype in other.column_types.items():
+            if dtype != self.column_types[col]:
+                self.column_types[col] = 'float64' if col in self.numeric_columns else 'object'
+        
+        self._combine_moments(other.count, other.mean, other.m2, other.min, other.max)
+        self.rows += other.rows
+        self.null_counts = self.null_counts + other.null_counts
+        self.sketch = self.sketch + other.sketch
+        self.registers = np.maximum(self.registers, other.registers)
+        return self
+    
+    def _bucket_values(self) -> np.ndarray:
+        keys = np.arange(self._min_key, self._max_key + 1, dtype=np.float64)
+        positive = 2 * self._gamma ** keys / (self._gamma + 1)
+        return np.concatenate([-positive[::-1], [0.0], positive])
+    
+    def _quantile_values(self) -> np.ndarray:
+        representatives = self._bucket_values()
+        cumulative = np.cumsum(self.sketch, axis=1)
+        result = np.empty((len(self.numeric_columns), len(self.quantiles)))
+        for j, q in enumerate(self.quantiles):
+            rank = q * (self.count - 1)
+            slot = np.argmax(cumulative > rank[:, None], axis=1)
+            result[:, j] = representatives[slot]
+        # Bucket representatives can overshoot the observed range at the extremes
+        return np.clip(result, self.min[:, None], self.max[:, None])
+    
+    def _histograms(self) -> np.ndarray:
+        bins = self.histogram_bins
+        low = np.where(self.count > 0, self.min, 0.0)
+        span = np.where(self.max > self.min, self.max - self.min, 1.0)
+        position = (self._bucket_values()[None, :] - low[:, None]) / span[:, None]
+        slots = np.clip((position * bins).astype(np.int64), 0, bins - 1)
+        slots += np.arange(len(self.numeric_columns), dtype=np.int64)[:, None] * bins
+        counts = np.bincount(slots.ravel(), weights=self.sketch.ravel(), minlength=len(self.numeric_columns) * bins)
+        return counts.reshape(len(self.numeric_columns), bins).astype(np.int64)
+    
+    def distinct_counts(self) -> np.ndarray:
+        """
+        Estimate the number of distinct non-null values per column.
+        
+        Estimates are capped at the number of non-null values, which the
+        HyperLogLog error could otherwise exceed on small columns.
+        
+        Returns:
+            np.ndarray: HyperLogLog estimates in column order
+        """
+        m = self.registers.shape[1]
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / np.sum(np.exp2(-self.registers.astype(np.float64)), axis=1)
+        zeros = np.sum(self.registers == 0, axis=1)
+        with np.errstate(divide='ignore'):
+            linear = m * np.log(m / np.maximum(zeros, 1))
+        # Linear counting is more accurate for small cardinalities
+        estimate = np.where((estimate <= 2.5 * m) & (zeros > 0), linear, estimate)
+        return np.minimum(estimate, self.rows - self.null_counts)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Get the accumulated statistics.
+        
+        Returns:
+            Dict[str, Any]: Statistics in the layout of get_file_stats
+        """
+        if self.columns is None:
+            return {
+                'rows': 0,
+                'columns': 0,
+                'column_types': {},
+                'missing_values': {},
+                'numeric_stats': {},
+                'distinct_counts': {}
+            }
+        
+        stats = {
+            'rows': self.rows,
+            'columns': len(self.columns),
+            'column_types': dict(self.column_types),
+            'missing_values': {col: int(n) for col, n in zip(self.columns, self.null_counts)},
+            'numeric_stats': {},
+            'distinct_counts': {col: int(round(n)) for col, n in zip(self.columns, self.distinct_counts())}
+        }
+        
+        if self.numeric_columns:
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                std = np.sqrt(self.m2 / (self.count - 1))
+            quantiles = self._quantile_values()
+            histograms = self._histograms()
+        
+        for i, col in enumerate(self.numeric_columns):
+            count = self.count[i]
+            if count == 0:
+                stats['numeric_stats'][col] = {
+                    'mean': None, 'std': None, 'min': None, 'max': None,
+                    'quantiles': {}, 'histogram': {'edges': [], 'counts': []}
+                }
+                continue
+            
+            edges = np.linspace(self.min[i], self.max[i], self.histogram_bins + 1)
+            stats['numeric_stats'][col] = {
+                'mean': float(self.mean[i]),
+                'std': float(std[i]) if count > 1 else None,
+                'min': float(self.min[i]),
+                'max': float(self.max[i]),
+                'quantiles': {f"p{int(round(q * 100))}": float(v) for q, v in zip(self.quantiles, quantiles[i])},
+                'histogram': {'edges': edges.tolist(), 'counts': histograms[i].tolist()}
+            }
+        
+        return stats
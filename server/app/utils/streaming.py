@@ -0,0 +1,101 @@
+import json
+import queue
+import logging
+import threading
+import numpy as np
+from flask import Response, request, stream_with_context
+from typing import Any, Callable, Dict, Iterable, Iterator
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+def wants_stream() -> bool:
+    """
+    Check whether the current request opted in to a streamed response.
+    
+    Clients opt in with a ``stream`` query or form value of 1/true/yes, or by
+    accepting application/x-ndjson.
+    
+    Returns:
+        bool: True if the response should be streamed
+    """
+    if request.values.get('stream', '').lower() in ('1', 'true', 'yes'):
+        return True
+    return request.accept_mimetypes.best == NDJSON_MIMETYPE
+
+def _json_default(value: Any) -> Any:
+    # numpy scalars and arrays coming straight from the model
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def ndjson_response(records: Iterable[Dict[str, Any]], status: int = 200) -> Response:
+    """
+    Stream records as newline-delimited JSON, one line per record.
+    
+    Records are serialized as the generator produces them, so the client
+    gets the first lines before the last ones are computed. An exception
+    raised by the generator ends the stream with an error record, since the
+    status code has been sent already.
+    
+    Args:
+        records (Iterable): Records to send, usually a generator
+        status (int): HTTP status code
+    
+    Returns:
+        Response: Streaming response
+    """
+    def generate() -> Iterator[str]:
+        try:
+            for record in records:
+                yield json.dumps(record, default=_json_default) + '\n'
+        except Exception as e:
+            logger.error(f"Error while streaming response: {str(e)}")
+            yield json.dumps({'error': str(e)}) + '\n'
+    
+    response = Response(stream_with_context(generate()), status=status, mimetype=NDJSON_MIMETYPE)
+    # Ask proxies not to buffer the stream
+    response.headers['X-Accel-Buffering'] = 'no'
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def iter_callback_events(run: Callable[[Callable[[Dict[str, Any]], None]], Dict[str, Any]]) -> Iterator[Dict[str, Any]]:
+    """
+    Turn a function that reports progress through a callback into a generator.
+    
+    run is called in a worker thread with an emit callback; every record it
+    emits is yielded as soon as it arrives, followed by the record run
+    returns. Exceptions raised by run are re-raised in the consumer. The
+    queue is unbounded so run finishes even if the client goes away; it is
+    meant for small progress records, not for bulk data.
+    
+    Args:
+        run (Callable): Called with emit, returns the final record
+    
+    Yields:
+        Dict[str, Any]: Emitted records, then the final record
+    """
+    events = queue.Queue()
+    done = object()
+    
+    def worker() -> None:
+        try:
+            events.put(('record', run(lambda record: events.put(('record', record)))))
+        except Exception as e:
+            events.put(('error', e))
+        finally:
+            events.put((done, None))
+    
+    threading.Thread(target=worker, name='ndjson-producer', daemon=True).start()
+    while True:
+        kind, value = events.get()
+        if kind is done:
+            return
+        if kind == 'error':
+            raise value
+        yield value
@@ -0,0 +1,384 @@
+import os
+import re
+import json
+import time
+import uuid
+import shutil
+import hashlib
+import logging
+from typing import Any, BinaryIO, Dict, Optional
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+SESSION_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# Bytes copied from a chunk request to the data file at a time
+COPY_BLOCK_SIZE = 1 << 20
+
+class ChunkError(ValueError):
+    """Raised when a chunk does not match its session."""
+
+class SessionClosedError(RuntimeError):
+    """Raised when a chunk arrives for a session that is being finalized."""
+
+def _session_dir(sessions_folder: str, session_id: str) -> str:
+    if not SESSION_ID_PATTERN.match(session_id):
+        raise ValueError(f"Invalid upload session id: {session_id}")
+    return os.path.join(sessions_folder, session_id)
+
+def data_path(sessions_folder: str, session_id: str) -> str:
+    """
+    Get the file a session's chunks are assembled in.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier
+    
+    Returns:
+        str: Path to the data file
+    """
+    return os.path.join(_session_dir(sessions_folder, session_id), 'data')
+
+def _claim_path(sessions_folder: str, session_id: str) -> str:
+    return os.path.join(_session_dir(sessions_folder, session_id), 'finalizing')
+
+def _write_session(sessions_folder: str, session: Dict[str, Any]) -> None:
+    # Write to a temp file and rename so other workers never read a partial record
+    path = os.path.join(_session_dir(sessions_folder, session['id']), 'session.json')
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(session, f, default=str)
+    os.replace(tmp_path, path)
+
+def create_session(sessions_folder: str,
+                   owner: str,
+                   filename: str,
+                   size: int,
+                   chunk_size: int,
+                   read_options: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Start a resumable upload.
+    
+    The data file is created at its final size up front, so every chunk is
+    written straight to its own offset, in any order and from any worker.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        owner (str): User's email
+        filename (str): Name of the file being uploaded
+        size (int): Total size in bytes
+        chunk_size (int): Size of every chunk but the last
+        read_options (Dict[str, Any], optional): Sheet and columns to read once complete
+    
+    Returns:
+        Dict[str, Any]: The session record
+    """
+    session = {
+        'id': uuid.uuid4().hex,
+        'owner': owner,
+        'filename': filename,
+        'size': size,
+        'chunk_size': chunk_size,
+        'chunk_count': max(-(-size // chunk_size), 1),
+        'read_options': read_options or {},
+        'status': 'uploading',
+        'job_id': None,
+        'stats': None,
+        'deduplicated': None,
+        'error': None,
+        'created_at': time.time()
+    }
+    directory = _session_dir(sessions_folder, session['id'])
+    os.makedirs(os.path.join(directory, 'chunks'))
+    with open(os.path.join(directory, 'data'), 'wb') as f:
+        f.truncate(size)
+    _write_session(sessions_folder, session)
+    return session
+
+def get_session(sessions_folder: str, session_id: str) -> Optional[Dict[str, Any]]:
+    """
+    Read a session record.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier
+    
+    Returns:
+        Optional[Dict[str, Any]]: The session record, or None if it does not exist
+    """
+    try:
+        with open(os.path.join(_session_dir(sessions_folder, session_id), 'session.json')) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+def update_session(sessions_folder: str, session_id: str, **fields) -> Dict[str, Any]:
+    """
+    Update fields of a session record.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier
+        **fields: Fields to set
+    
+    Returns:
+        Dict[str, Any]: The updated session record
+    """
+    session = get_session(sessions_folder, session_id)
+    if session is None:
+        raise KeyError(f"Upload session not found: {session_id}")
+    session.update(fields)
+    _write_session(sessions_folder, session)
+    return session
+
+def expected_length(session: Dict[str, Any], index: int) -> int:
+    """
+    Get the size a chunk of a session must have.
+    
+    Args:
+        session (Dict[str, Any]): Session record
+        index (int): Chunk number, from 0
+    
+    Returns:
+        int: Size of the chunk in bytes
+    """
+    if not 0 <= index < session['chunk_count']:
+        raise ChunkError(f"Chunk {index} is out of range 0-{session['chunk_count'] - 1}")
+    return min(session['chunk_size'], session['size'] - index * session['chunk_size'])
+
+def write_chunk(sessions_folder: str,
+                session: Dict[str, Any],
+                index: int,
+                stream: BinaryIO,
+                checksum: Optional[str] = None) -> None:
+    """
+    Copy a chunk from a request stream to its place in the data file.
+    
+    The chunk is streamed block by block with positional writes, so it is
+    never held in memory as a whole, and chunks sent in parallel do not
+    interfere. A chunk counts as received only once all of its bytes are
+    written, so an interrupted chunk is simply sent again.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session (Dict[str, Any]): Session record
+        index (int): Chunk number, from 0
+        stream (BinaryIO): Request body
+        checksum (str, optional): Expected SHA-256 of the chunk, hex encoded
+    """
+    length = expected_length(session, index)
+    offset = index * session['chunk_size']
+    digest = hashlib.sha256() if checksum else None
+    written = 0
+    
+    # A writer registers before it checks the finalize claim, and the
+    # finalizer waits for registered writers after claiming, so no chunk
+    # lands in the data file once it is being hashed and moved
+    writers = os.path.join(_session_dir(sessions_folder, session['id']), 'writers')
+    os.makedirs(writers, exist_ok=True)
+    writer = os.path.join(writers, uuid.uuid4().hex)
+    open(writer, 'w').close()
+    try:
+        if os.path.exists(_claim_path(sessions_folder, session['id'])):
+            raise SessionClosedError(f"Upload session {session['id']} is being finalized")
+        
+        fd = os.open(data_path(sessions_folder, session['id']), os.O_WRONLY)
+        try:
+            while written <= length:
+                block = stream.read(min(COPY_BLOCK_SIZE, length + 1 - written))
+                if not block:
+                    break
+                if written + len(block) > length:
+                    raise ChunkError(f"Chunk {index} is longer than {length} bytes")
+                os.pwrite(fd, block, offset + written)
+                if digest is not None:
+                    digest.update(block)
+                written += len(block)
+        finally:
+            os.close(fd)
+        
+        if written != length:
+            raise ChunkError(f"Chunk {index} has {written} bytes, expected {length}")
+        if digest is not None and digest.hexdigest() != checksum.lower():
+            raise ChunkError(f"Chunk {index} does not match its checksum")
+        
+        marker = os.path.join(_session_dir(sessions_folder, session['id']), 'chunks', str(index))
+        open(marker, 'w').close()
+    finally:
+        try:
+            os.remove(writer)
+        except FileNotFoundError:
+            pass
+
+def wait_for_writers(sessions_folder: str, session_id: str, timeout: float, interval: float = 0.1) -> None:
+    """
+    Wait for chunk writes that started before a session was claimed.
+    
+    Writers that registered after the claim give up by themselves, so the
+    wait only covers writes already under way. A writer that has been
+    registered for longer than timeout seconds is taken to have died with
+    its request.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier
+        timeout (float): Seconds after which a writer is no longer waited for
+        interval (float): Seconds between checks
+    """
+    writers = os.path.join(_session_dir(sessions_folder, session_id), 'writers')
+    while True:
+        cutoff = time.time() - timeout
+        try:
+            names = os.listdir(writers)
+        except FileNotFoundError:
+            return
+        
+        live = False
+        for name in names:
+            try:
+                live = os.path.getmtime(os.path.join(writers, name)) >= cutoff
+            except FileNotFoundError:
+                continue
+            if live:
+                break
+        if not live:
+            return
+        time.sleep(interval)
+
+def received_chunks(sessions_folder: str, session: Dict[str, Any]) -> list:
+    """
+    Get the chunks of a session received so far.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session (Dict[str, Any]): Session record
+    
+    Returns:
+        list: Sorted chunk numbers
+    """
+    directory = os.path.join(_session_dir(sessions_folder, session['id']), 'chunks')
+    try:
+        return sorted(int(name) for name in os.listdir(directory) if name.isdigit())
+    except FileNotFoundError:
+        return []
+
+def claim_finalize(sessions_folder: str, session_id: str) -> bool:
+    """
+    Claim the right to finalize a session.
+    
+    Both the last chunk and an explicit finalize request try to finalize,
+    possibly in different workers; exactly one of them gets the claim.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier
+    
+    Returns:
+        bool: True if the caller should finalize the session
+    """
+    try:
+        os.mkdir(_claim_path(sessions_folder, session_id))
+        return True
+    except FileExistsError:
+        return False
+
+def release_stale_claim(sessions_folder: str, session: Dict[str, Any], timeout: float) -> bool:
+    """
+    Give up a finalize claim that never led to an upload job.
+    
+    The claim is taken before the job is submitted, so a worker that died
+    in between would leave the session unable to finish. Once the claim is
+    older than timeout seconds the session takes chunks and can be
+    finalized again.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session (Dict[str, Any]): Session record
+        timeout (float): Seconds after which an unfollowed claim is stale
+    
+    Returns:
+        bool: True if a stale claim was released
+    """
+    if session['status'] != 'uploading':
+        return False
+    claim = _claim_path(sessions_folder, session['id'])
+    try:
+        if os.path.getmtime(claim) >= time.time() - timeout:
+            return False
+        # Renamed away first, so only one caller releases it
+        stale = f"{claim}.{uuid.uuid4().hex}.stale"
+        os.rename(claim, stale)
+    except FileNotFoundError:
+        return False
+    os.rmdir(stale)
+    logger.warning(f"Released the stale finalize claim of upload session {session['id']}")
+    return True
+
+def release_data(sessions_folder: str, session_id: str) -> None:
+    """
+    Remove the chunk bookkeeping of a finalized session, keeping its record.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        session_id (str): Session identifier
+    """
+    directory = _session_dir(sessions_folder, session_id)
+    shutil.rmtree(os.path.join(directory, 'chunks'), ignore_errors=True)
+    if os.path.exists(os.path.join(directory, 'data')):
+        os.remove(os.path.join(directory, 'data'))
+
+def count_open_sessions(sessions_folder: str, owner: str) -> int:
+    """
+    Count a user's sessions that are still receiving chunks.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        owner (str): User's email
+    
+    Returns:
+        int: Number of open sessions
+    """
+    if not os.path.isdir(sessions_folder):
+        return 0
+    
+    count = 0
+    for name in os.listdir(sessions_folder):
+        if not SESSION_ID_PATTERN.match(name):
+            continue
+        session = get_session(sessions_folder, name)
+        if session is not None and session['owner'] == owner and session['status'] == 'uploading':
+            count += 1
+    return count
+
+def purge_sessions(sessions_folder: str, max_age: float, claim_timeout: Optional[float] = None) -> int:
+    """
+    Delete sessions older than max_age seconds, finished or abandoned.
+    
+    Args:
+        sessions_folder (str): Directory holding upload sessions
+        max_age (float): Age in seconds after which a session is deleted
+        claim_timeout (float, optional): Release finalize claims of the
+            remaining sessions older than this, see release_stale_claim
+    
+    Returns:
+        int: Number of sessions deleted
+    """
+    if not os.path.isdir(sessions_folder):
+        return 0
+    
+    deleted = 0
+    cutoff = time.time() - max_age
+    for name in os.listdir(sessions_folder):
+        if not SESSION_ID_PATTERN.match(name):
+            continue
+        session = get_session(sessions_folder, name)
+        # A session without a record may still be being created
+        created_at = session['created_at'] if session else os.path.getmtime(os.path.join(sessions_folder, name))
+        if created_at < cutoff:
+            shutil.rmtree(os.path.join(sessions_folder, name), ignore_errors=True)
+            deleted += 1
+        elif session is not None and claim_timeout is not None:
+            release_stale_claim(sessions_folder, session, claim_timeout)
+    return deleted
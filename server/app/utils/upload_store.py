@@ -0,0 +1,400 @@
+import os
+import re
+import json
+import time
+import uuid
+import fcntl
+import hashlib
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, BinaryIO, Dict, List, Optional, Tuple
+from sqlalchemy import and_, or_, inspect, text
+from .. import db
+from ..models import Upload
+from .file_handler import allowed_file
+from .dataset_cache import file_digest, options_text
+from .pagination import encode_cursor, decode_cursor
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Bytes read from an upload stream at a time while it is saved and hashed
+SAVE_BLOCK_SIZE = 1 << 20
+
+# Names of files stored under their content hash
+_STORED_NAME = re.compile(r'^[0-9a-f]{64}\.\w+$')
+
+# Directory of the upload folder holding holds of uploads not cataloged yet
+PENDING_FOLDER = '.pending'
+
+# Seconds after which a hold left behind by a crashed upload is ignored
+HOLD_TTL = 24 * 3600
+
+def stored_path(upload_folder: str, content_hash: str, extension: str) -> str:
+    """
+    Get the path uploaded content is stored at.
+    
+    Files are named after their content, so identical uploads share one file
+    and two uploads with the same name can no longer overwrite each other.
+    
+    Args:
+        upload_folder (str): Upload directory
+        content_hash (str): SHA-256 of the content
+        extension (str): File extension, with the dot
+    
+    Returns:
+        str: Path to the stored file
+    """
+    return os.path.join(upload_folder, content_hash + extension)
+
+def upload_path(upload_folder: str, upload: Upload) -> str:
+    """
+    Get the stored file of a catalog entry.
+    
+    Args:
+        upload_folder (str): Upload directory
+        upload (Upload): Catalog entry
+    
+    Returns:
+        str: Path to the stored file
+    """
+    return stored_path(upload_folder, upload.content_hash, upload.extension)
+
+@contextmanager
+def _pending_lock(upload_folder: str):
+    # Serializes taking holds with discarding files, across processes
+    folder = os.path.join(upload_folder, PENDING_FOLDER)
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, '.lock'), 'a') as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        yield
+
+def hold_content(upload_folder: str, content_hash: str, extension: str) -> str:
+    """
+    Keep stored content from being discarded until its upload is cataloged.
+    
+    Content is stored before it is cataloged, so until then only the hold
+    tells discard_file that an upload still needs it. Take the hold before
+    the file is put in place and release it once the catalog entry exists.
+    
+    Args:
+        upload_folder (str): Upload directory
+        content_hash (str): SHA-256 of the content
+        extension (str): File extension, with the dot
+    
+    Returns:
+        str: The hold, for release_hold
+    """
+    hold = os.path.join(upload_folder, PENDING_FOLDER, f"{content_hash}{extension}.{uuid.uuid4().hex}")
+    with _pending_lock(upload_folder):
+        open(hold, 'w').close()
+    return hold
+
+def release_hold(hold: Optional[str]) -> None:
+    """
+    Release a hold taken with hold_content.
+    
+    Args:
+        hold (str, optional): The hold, nothing happens if None or released already
+    """
+    if hold is None:
+        return
+    try:
+        os.remove(hold)
+    except FileNotFoundError:
+        pass
+
+def _is_held(upload_folder: str, content_hash: str, extension: str) -> bool:
+    folder = os.path.join(upload_folder, PENDING_FOLDER)
+    prefix = f"{content_hash}{extension}."
+    cutoff = time.time() - HOLD_TTL
+    try:
+        names = os.listdir(folder)
+    except FileNotFoundError:
+        return False
+    for name in names:
+        if name.startswith(prefix):
+            try:
+                if os.path.getmtime(os.path.join(folder, name)) >= cutoff:
+                    return True
+            except FileNotFoundError:
+                continue
+    return False
+
+def save_stream(stream: BinaryIO, upload_folder: str, extension: str) -> Tuple[str, int, str, str]:
+    """
+    Save an upload stream under its content hash, hashing it while it is written.
+    
+    Args:
+        stream (BinaryIO): Uploaded file stream
+        upload_folder (str): Upload directory
+        extension (str): File extension, with the dot
+    
+    Returns:
+        Tuple[str, int, str, str]: Content hash, size in bytes, stored path,
+            and the hold on the content, see hold_content
+    """
+    os.makedirs(upload_folder, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    tmp_path = os.path.join(upload_folder, f".{uuid.uuid4().hex}.tmp")
+    try:
+        with open(tmp_path, 'wb') as f:
+            for block in iter(lambda: stream.read(SAVE_BLOCK_SIZE), b''):
+                digest.update(block)
+                f.write(block)
+                size += len(block)
+        content_hash = digest.hexdigest()
+        path = stored_path(upload_folder, content_hash, extension)
+        hold = hold_content(upload_folder, content_hash, extension)
+        # Identical content may be stored already, replacing it changes nothing
+        os.replace(tmp_path, path)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return content_hash, size, path, hold
+
+def upload_read_options(upload: Upload) -> Dict[str, Any]:
+    """
+    Get the sheet and columns an upload is read with.
+    
+    Args:
+        upload (Upload): Catalog entry
+    
+    Returns:
+        Dict[str, Any]: Keyword arguments for the file readers
+    """
+    return json.loads(upload.read_options) if upload.read_options else {}
+
+def get_upload(owner: str, filename: str) -> Optional[Upload]:
+    """
+    Look up an upload by name, preferring the owner's own over legacy ones.
+    
+    Args:
+        owner (str): User's email
+        filename (str): Name of the uploaded file
+    
+    Returns:
+        Optional[Upload]: Catalog entry, None if the user has no such upload
+    """
+    upload = Upload.query.filter_by(owner=owner, filename=filename).one_or_none()
+    if upload is None:
+        upload = Upload.query.filter(Upload.owner.is_(None), Upload.filename == filename).first()
+    return upload
+
+def find_processed(content_hash: str, read_options: Optional[Dict[str, Any]] = None) -> Optional[Upload]:
+    """
+    Find an upload of the same content that was processed already.
+    
+    Args:
+        content_hash (str): SHA-256 of the content
+        read_options (Dict[str, Any], optional): Sheet and columns to read
+    
+    Returns:
+        Optional[Upload]: An entry with stats, None if this content is new
+    """
+    serialized = options_text(read_options)
+    options_filter = Upload.read_options.is_(None) if serialized is None else Upload.read_options == serialized
+    return Upload.query.filter(Upload.content_hash == content_hash, options_filter,
+                               Upload.stats.isnot(None)).first()
+
+def upload_stats(upload: Upload) -> Optional[Dict[str, Any]]:
+    """
+    Get the stats an upload was processed into.
+    
+    Args:
+        upload (Upload): Catalog entry
+    
+    Returns:
+        Optional[Dict[str, Any]]: Upload statistics, None until processed
+    """
+    return json.loads(upload.stats) if upload.stats is not None else None
+
+def _is_referenced(content_hash: str, extension: str) -> bool:
+    return db.session.query(
+        Upload.query.filter_by(content_hash=content_hash, extension=extension).exists()
+    ).scalar()
+
+def discard_file(upload_folder: str, content_hash: str, extension: str) -> None:
+    """
+    Remove stored content unless a catalog entry or an upload in flight still needs it.
+    
+    Args:
+        upload_folder (str): Upload directory
+        content_hash (str): SHA-256 of the content
+        extension (str): File extension, with the dot
+    """
+    path = stored_path(upload_folder, content_hash, extension)
+    with _pending_lock(upload_folder):
+        # Holds are released only after cataloging, so they are checked first
+        if _is_held(upload_folder, content_hash, extension) or _is_referenced(content_hash, extension):
+            return
+        if os.path.exists(path):
+            os.remove(path)
+
+def put_upload(upload_folder: str,
+               owner: str,
+               filename: str,
+               content_hash: str,
+               extension: str,
+               size: int,
+               stats: Optional[Dict[str, Any]] = None,
+               read_options: Optional[Dict[str, Any]] = None) -> Tuple[Upload, bool]:
+    """
+    Add an upload to the catalog, replacing the owner's upload of the same name.
+    
+    Args:
+        upload_folder (str): Upload directory
+        owner (str): User's email
+        filename (str): Name of the uploaded file
+        content_hash (str): SHA-256 of the content
+        extension (str): File extension, with the dot
+        size (int): Size in bytes
+        stats (Dict[str, Any], optional): Upload statistics, if processed
+        read_options (Dict[str, Any], optional): Sheet and columns to read
+    
+    Returns:
+        Tuple[Upload, bool]: Catalog entry, and whether it replaced an older upload
+    """
+    upload = Upload.query.filter_by(owner=owner, filename=filename).one_or_none()
+    replaced = upload is not None
+    previous = (upload.content_hash, upload.extension) if replaced else None
+    if upload is None:
+        upload = Upload(owner=owner, filename=filename)
+        db.session.add(upload)
+    
+    # Every upload gets a new id, so jobs of an earlier upload of the same
+    # name can tell they no longer own the entry
+    upload.id = uuid.uuid4().hex
+    upload.content_hash = content_hash
+    upload.extension = extension
+    upload.size = size
+    upload.read_options = options_text(read_options)
+    upload.created_at = datetime.utcnow()
+    set_stats(upload, stats, commit=False)
+    db.session.commit()
+    
+    if previous is not None and previous != (content_hash, extension):
+        discard_file(upload_folder, *previous)
+    return upload, replaced
+
+def set_stats(upload: Upload, stats: Optional[Dict[str, Any]], commit: bool = True) -> None:
+    """
+    Record the stats an upload was processed into.
+    
+    Args:
+        upload (Upload): Catalog entry
+        stats (Dict[str, Any], optional): Upload statistics
+        commit (bool): Commit the change right away
+    """
+    if stats is None:
+        upload.stats = upload.row_count = upload.column_count = None
+    else:
+        upload.stats = json.dumps(stats, separators=(',', ':'), default=str)
+        upload.row_count = stats.get('rows')
+        upload.column_count = len(stats.get('columns', []))
+    if commit:
+        db.session.commit()
+
+def list_uploads(owner: str, limit: int = 50, cursor: Optional[str] = None) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    List the uploads visible to a user, newest first.
+    
+    Args:
+        owner (str): User's email
+        limit (int): Maximum number of uploads to return
+        cursor (str, optional): Cursor returned with the previous page
+    
+    Returns:
+        Tuple: Upload metadata, and the cursor of the next page (None on the last page)
+    """
+    query = Upload.query.filter(or_(Upload.owner == owner, Upload.owner.is_(None)))
+    if cursor is not None:
+        created_at, upload_id = decode_cursor(cursor)
+        query = query.filter(or_(
+            Upload.created_at < created_at,
+            and_(Upload.created_at == created_at, Upload.id < upload_id)
+        ))
+    
+    # Fetch one extra row to know whether another page follows
+    uploads = query.order_by(Upload.created_at.desc(), Upload.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(uploads[limit - 1]) if len(uploads) > limit else None
+    return [upload.to_dict() for upload in uploads[:limit]], next_cursor
+
+def delete_upload(upload_folder: str, owner: str, filename: str, legacy: bool = False) -> bool:
+    """
+    Remove a user's upload, and its file unless other uploads share the content.
+    
+    Args:
+        upload_folder (str): Upload directory
+        owner (str): User's email
+        filename (str): Name of the uploaded file
+        legacy (bool): Also remove an upload without an owner of this name,
+            when the user has none of their own
+    
+    Returns:
+        bool: True if the upload existed
+    """
+    upload = Upload.query.filter_by(owner=owner, filename=filename).one_or_none()
+    if upload is None and legacy:
+        upload = Upload.query.filter(Upload.owner.is_(None), Upload.filename == filename).first()
+    if upload is None:
+        return False
+    
+    content = (upload.content_hash, upload.extension)
+    db.session.delete(upload)
+    db.session.commit()
+    discard_file(upload_folder, *content)
+    return True
+
+def upgrade_catalog_table() -> None:
+    """
+    Add columns introduced after the catalog table was first created.
+    
+    db.create_all only creates missing tables, so databases created by an
+    earlier version get new columns here.
+    """
+    existing = {column['name'] for column in inspect(db.engine).get_columns(Upload.__tablename__)}
+    if 'read_options' not in existing:
+        with db.engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE {Upload.__tablename__} ADD COLUMN read_options TEXT"))
+        logger.info("Added read_options to the upload catalog")
+
+def migrate_upload_folder(upload_folder: str) -> int:
+    """
+    Add files uploaded before the catalog existed to it.
+    
+    Files saved under their own name are moved to their content path and
+    cataloged without an owner, so everyone keeps seeing them as before.
+    They get their stats the first time they are used.
+    
+    Args:
+        upload_folder (str): Upload directory
+    
+    Returns:
+        int: Number of files added
+    """
+    if not os.path.isdir(upload_folder):
+        return 0
+    
+    added = 0
+    for filename in sorted(os.listdir(upload_folder)):
+        path = os.path.join(upload_folder, filename)
+        if _STORED_NAME.match(filename) or not os.path.isfile(path) or not allowed_file(filename):
+            continue
+        
+        extension = os.path.splitext(filename)[1].lower()
+        content_hash = file_digest(path)
+        size = os.path.getsize(path)
+        os.replace(path, stored_path(upload_folder, content_hash, extension))
+        db.session.add(Upload(id=uuid.uuid4().hex, owner=None, filename=filename,
+                              content_hash=content_hash, extension=extension, size=size))
+        db.session.commit()
+        added += 1
+    
+    if added:
+        logger.info(f"Added {added} existing uploads to the catalog")
+    return added
@@ -0,0 +1,132 @@
+import os
+import json
+import logging
+import sqlite3
+from datetime import datetime
+from typing import Optional
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import IntegrityError
+from .. import db
+from ..models import User
+
+# Configure logging
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+# Users inserted per transaction when migrating users.json
+MIGRATION_BATCH_SIZE = 1000
+
+class UserExistsError(Exception):
+    """Raised when registering an email that already has an account."""
+
+@event.listens_for(Engine, 'connect')
+def _configure_sqlite(dbapi_connection, connection_record):
+    # WAL lets readers in every worker proceed while one of them writes, and
+    # the busy timeout makes concurrent writers wait instead of failing
+    if isinstance(dbapi_connection, sqlite3.Connection):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.execute('PRAGMA busy_timeout=5000')
+        cursor.close()
+
+def get_user(email: str) -> Optional[User]:
+    """
+    Look up a user by email through the unique email index.
+    
+    Args:
+        email (str): User's email
+    
+    Returns:
+        Optional[User]: The user, or None if there is no such account
+    """
+    return User.query.filter_by(email=email).one_or_none()
+
+def create_user(email: str, password_hash: str) -> User:
+    """
+    Store a new user in its own transaction.
+    
+    Args:
+        email (str): User's email
+        password_hash (str): Hashed password
+    
+    Returns:
+        User: The stored user
+    """
+    user = User(email=email, password_hash=password_hash)
+    db.session.add(user)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        # The unique index decides races between workers registering the same email
+        db.session.rollback()
+        raise UserExistsError(email)
+    return user
+
+def record_login(user: User) -> None:
+    """
+    Stamp a user's last login time.
+    
+    Args:
+        user (User): User who logged in
+    """
+    user.last_login = datetime.utcnow()
+    db.session.commit()
+
+def update_password_hash(user: User, password_hash: str) -> None:
+    """
+    Replace a user's password hash, e.g. after the KDF cost changed.
+    
+    Args:
+        user (User): User to update
+        password_hash (str): New password hash
+    """
+    user.password_hash = password_hash
+    db.session.commit()
+
+def migrate_users_file(users_file: str) -> int:
+    """
+    Import users from the legacy users.json file, once.
+    
+    Users are inserted in batches; emails that already exist are skipped,
+    so workers starting at the same time can all run the migration. The
+    file is renamed afterwards so later starts skip it.
+    
+    Args:
+        users_file (str): Path to users.json
+    
+    Returns:
+        int: Number of users imported
+    """
+    if not os.path.exists(users_file):
+        return 0
+    
+    with open(users_file, 'r') as f:
+        users = json.load(f)
+    
+    imported = 0
+    emails = list(users)
+    for start in range(0, len(emails), MIGRATION_BATCH_SIZE):
+        batch = emails[start:start + MIGRATION_BATCH_SIZE]
+        existing = {email for (email,) in db.session.query(User.email).filter(User.email.in_(batch))}
+        new_users = [
+            User(email=email, password_hash=users[email]['password_hash'])
+            for email in batch if email not in existing
+        ]
+        if not new_users:
+            continue
+        db.session.add_all(new_users)
+        try:
+            db.session.commit()
+            imported += len(new_users)
+        except IntegrityError:
+            # Another worker imported this batch first
+            db.session.rollback()
+    
+    try:
+        os.replace(users_file, users_file + '.migrated')
+    except FileNotFoundError:
+        pass
+    logger.info(f"Migrated {imported} users from {users_file}")
+    return imported
@@ -0,0 +1,40 @@
+import os
+import sys
+import pytest
+
+# Tests import the app package from the server directory
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app import create_app
+from app.config import Config
+
+@pytest.fixture
+def app(tmp_path):
+    class TestConfig(Config):
+        TESTING = True
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{tmp_path / 'app.db'}"
+        USERS_FILE = str(tmp_path / 'users.json')
+        UPLOAD_FOLDER = str(tmp_path / 'uploads')
+        UPLOAD_SESSION_FOLDER = str(tmp_path / 'upload_sessions')
+        DATASET_CACHE_FOLDER = str(tmp_path / 'dataset_cache')
+        JOBS_FOLDER = str(tmp_path / 'jobs')
+        PDF_OUTPUT_PATH = str(tmp_path / 'reports')
+        SCORING_OUTPUT_FOLDER = str(tmp_path / 'scored')
+        ML_MODEL_PATH = str(tmp_path / 'model.pkl')
+        MODEL_ADMINS = ['admin@example.com']
+    
+    return create_app(TestConfig)
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+@pytest.fixture
+def auth(app):
+    """Build request headers carrying a token for the given user."""
+    from flask_jwt_extended import create_access_token
+    
+    def headers(email='user@example.com'):
+        with app.app_context():
+            return {'Authorization': f"Bearer {create_access_token(identity=email)}"}
+    return headers
@@ -0,0 +1,56 @@
+import os
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from app.ml.batch_scoring import pin_model, run_scoring_job, score_file
+from app.utils.jobs import create_job, get_job
+
+@pytest.fixture
+def model_path(tmp_path):
+    X = np.array([[0.0, 0.0], [1.0, 1.0], [0.0, 1.0], [1.0, 0.0]])
+    y = np.array([0, 1, 1, 0])
+    scaler = StandardScaler().fit(X)
+    path = str(tmp_path / 'model.pkl')
+    joblib.dump({'model': LogisticRegression().fit(scaler.transform(X), y),
+                 'scaler': scaler,
+                 'feature_names': ['a', 'b']}, path)
+    return path
+
+def test_chunk_without_scorable_rows(tmp_path, model_path):
+    data = tmp_path / 'data.csv'
+    pd.DataFrame({'a': [None, None, 1.0, 0.0], 'b': ['x', 'y', 1.0, 0.0]}).to_csv(data, index=False)
+    output = str(tmp_path / 'out.csv')
+    
+    result = score_file(str(data), model_path, output, chunksize=2)
+    
+    assert result['rows'] == 4
+    assert result['scored_rows'] == 2
+    scored = pd.read_csv(output)
+    assert scored['prediction'].isna().tolist() == [True, True, False, False]
+    assert scored['probability_0'].isna().tolist() == [True, True, False, False]
+
+def test_pinned_model_outlives_snapshot(tmp_path, model_path):
+    jobs_folder = str(tmp_path / 'jobs')
+    os.makedirs(jobs_folder)
+    data = tmp_path / 'data.csv'
+    pd.DataFrame({'a': [0.0, 1.0], 'b': [0.0, 1.0]}).to_csv(data, index=False)
+    job = create_job(jobs_folder, 'score')
+    
+    pinned = pin_model(model_path, jobs_folder, job['id'])
+    os.remove(model_path)
+    run_scoring_job(jobs_folder, job['id'], str(data), pinned, str(tmp_path / 'out.csv'))
+    
+    assert get_job(jobs_folder, job['id'])['status'] == 'completed'
+    assert not os.path.exists(pinned)
+
+def test_scoring_reads_the_upload_sheet(tmp_path, model_path):
+    data = str(tmp_path / 'data.xlsx')
+    with pd.ExcelWriter(data) as writer:
+        pd.DataFrame({'other': ['x']}).to_excel(writer, sheet_name='notes', index=False)
+        pd.DataFrame({'a': [0.0, 1.0], 'b': [0.0, 1.0]}).to_excel(writer, sheet_name='data', index=False)
+    
+    result = score_file(data, model_path, str(tmp_path / 'out.csv'), read_options={'sheet': 'data'})
+    assert result['scored_rows'] == 2
@@ -0,0 +1,47 @@
+import threading
+import pytest
+from app.ml.batcher import PredictionBatcher
+
+def doubling(rows):
+    if any(row is None for row in rows):
+        raise ValueError("bad row")
+    return [row * 2 for row in rows], [[row] for row in rows]
+
+def test_concurrent_rows_share_model_calls():
+    calls = []
+    gate = threading.Event()
+    
+    def predict_batch(rows):
+        gate.wait()
+        calls.append(len(rows))
+        return doubling(rows)
+    
+    batcher = PredictionBatcher(predict_batch, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(i) for i in range(20)]
+    gate.set()
+    
+    assert [future.result(timeout=5) for future in futures] == [(i * 2, [i]) for i in range(20)]
+    assert sum(calls) == 20
+    assert max(calls) <= 8
+    assert len(calls) < 20
+    assert batcher.rows == 20
+
+def test_bad_row_fails_only_its_caller():
+    gate = threading.Event()
+    
+    def predict_batch(rows):
+        gate.wait()
+        return doubling(rows)
+    
+    batcher = PredictionBatcher(predict_batch, max_batch_size=8, max_wait_ms=50)
+    futures = [batcher.submit(row) for row in (1, None, 3)]
+    gate.set()
+    
+    assert futures[0].result(timeout=5) == (2, [1])
+    assert futures[2].result(timeout=5) == (6, [3])
+    with pytest.raises(ValueError):
+        futures[1].result(timeout=5)
+
+def test_batch_size_must_be_positive():
+    with pytest.raises(ValueError):
+        PredictionBatcher(doubling, max_batch_size=0)
@@ -0,0 +1,52 @@
+import time
+import threading
+from app import db
+from app.models import ChatMessage
+from app.utils.chat_store import chat_store
+
+def wait_in_thread(app, user, after, timeout):
+    result = {}
+    
+    def run():
+        with app.app_context():
+            started = time.monotonic()
+            result['messages'] = chat_store.wait_for_messages(user, after, timeout)
+            result['elapsed'] = time.monotonic() - started
+    
+    thread = threading.Thread(target=run)
+    thread.start()
+    return thread, result
+
+def test_message_wakes_only_its_users_poll(app):
+    thread, result = wait_in_thread(app, 'a@example.com', 0, 1.0)
+    time.sleep(0.1)
+    with app.app_context():
+        chat_store.append('b@example.com', 'not for a')
+        time.sleep(0.1)
+        assert thread.is_alive()
+        message = chat_store.append('a@example.com', 'hello')
+    thread.join()
+    
+    assert [m['id'] for m in result['messages']] == [message['id']]
+    assert result['elapsed'] < 0.9
+
+def test_messages_from_other_workers_are_polled(app):
+    chat_store.poll_interval = 0.05
+    thread, result = wait_in_thread(app, 'a@example.com', 0, 2.0)
+    time.sleep(0.1)
+    with app.app_context():
+        # Written straight to the database, as another worker would
+        db.session.add(ChatMessage(user_email='a@example.com', message='elsewhere'))
+        db.session.commit()
+    thread.join()
+    
+    assert [m['message'] for m in result['messages']] == ['elsewhere']
+    assert result['elapsed'] < 1.0
+    time.sleep(0.2)
+    assert chat_store._poller is None and not chat_store._waiting
+
+def test_poll_times_out_empty(app):
+    with app.app_context():
+        chat_store.append('a@example.com', 'old')
+        newest = chat_store.history('a@example.com')[0][-1]['id']
+        assert chat_store.wait_for_messages('a@example.com', newest, 0.1) == []
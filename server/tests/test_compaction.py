@@ -0,0 +1,55 @@
+import numpy as np
+import pandas as pd
+from app.utils.compaction import DtypeAccumulator, apply_dtypes, compact_frame
+
+def test_compact_dtypes_keep_every_value():
+    df = pd.DataFrame({
+        'small': np.arange(1000) % 100,
+        'large': np.arange(1000) * 100000,
+        'region': np.array(['north', 'south', None, 'east'], dtype=object)[np.arange(1000) % 4],
+        'day': [f"2024-01-{1 + i % 28:02d}" for i in range(1000)],
+        'price': np.linspace(0, 1, 1000)
+    })
+    compacted = compact_frame(df)
+    
+    assert compacted['small'].dtype == np.int8
+    assert compacted['large'].dtype == np.int32
+    assert isinstance(compacted['region'].dtype, pd.CategoricalDtype)
+    assert compacted['day'].dtype == 'datetime64[ns]'
+    assert compacted['price'].dtype == np.float64
+    
+    assert (compacted['small'] == df['small']).all()
+    assert (compacted['large'] == df['large']).all()
+    assert compacted['region'].astype(object).where(compacted['region'].notna(), None).tolist() == df['region'].tolist()
+    assert (compacted['day'] == pd.to_datetime(df['day'])).all()
+
+def test_dates_with_offsets_become_utc():
+    df = pd.DataFrame({'at': ['2024-01-01T10:00:00+02:00', '2024-01-01T09:00:00+00:00']})
+    compacted = compact_frame(df)
+    assert str(compacted['at'].dtype) == 'datetime64[ns, UTC]'
+    assert (compacted['at'] == pd.Timestamp('2024-01-01T08:00:00Z')).tolist() == [True, False]
+
+def test_chunks_decide_for_the_whole_column():
+    accumulator = DtypeAccumulator()
+    accumulator.update(pd.DataFrame({'n': [1, 2], 'd': ['2024-01-01', '2024-01-02'], 's': ['a', 'b']}))
+    accumulator.update(pd.DataFrame({'n': [1, 100000], 'd': ['2024-01-03', 'later'], 's': ['a', 'a']}))
+    dtypes = accumulator.dtypes()
+    
+    assert dtypes['n'] == {'dtype': 'int32'}
+    # One value that is not a date keeps the column as text
+    assert 'd' not in dtypes
+    assert dtypes['s'] == {'dtype': 'category'}
+
+def test_high_cardinality_text_stays_text():
+    df = pd.DataFrame({'id': [f"id-{i}" for i in range(100)]})
+    assert DtypeAccumulator().update(df).dtypes() == {}
+
+def test_memory_estimate_matches_converted_data():
+    df = pd.DataFrame({'n': np.arange(5000) % 50, 's': np.array(['alpha', 'beta', 'gamma'], dtype=object)[np.arange(5000) % 3]})
+    accumulator = DtypeAccumulator().update(df)
+    converted = apply_dtypes(df, accumulator.dtypes())
+    
+    actual = int(converted.memory_usage(index=False, deep=True).sum())
+    assert accumulator.memory_before == int(df.memory_usage(index=False, deep=True).sum())
+    assert abs(accumulator.memory_after() - actual) / actual < 0.1
+    assert accumulator.memory_after() < accumulator.memory_before
@@ -0,0 +1,37 @@
+import numpy as np
+import pandas as pd
+from app.utils.dataset_cache import DatasetWriter, dataset_failure, has_cached_dataset, load_dataset
+
+def write_chunks(cache_folder, chunks):
+    with DatasetWriter(cache_folder, 'digest') as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    return writer
+
+def test_integers_widen_to_floats(tmp_path):
+    cache_folder = str(tmp_path)
+    writer = write_chunks(cache_folder, [pd.DataFrame({'x': [1, 2], 'y': ['a', 'b']}),
+                                         pd.DataFrame({'x': [0.5, 3.0], 'y': ['c', 'd']})])
+    
+    assert not writer.failed
+    df = load_dataset(cache_folder, 'digest')
+    assert df['x'].dtype == np.float64
+    assert df['x'].tolist() == [1.0, 2.0, 0.5, 3.0]
+    assert df['y'].tolist() == ['a', 'b', 'c', 'd']
+
+def test_empty_and_mixed_columns_take_later_types(tmp_path):
+    cache_folder = str(tmp_path)
+    write_chunks(cache_folder, [pd.DataFrame({'n': [None, None], 'code': [1, 2]}),
+                                pd.DataFrame({'n': ['x', None], 'code': ['A7', 3]})])
+    
+    df = load_dataset(cache_folder, 'digest')
+    assert df['n'].tolist() == [None, None, 'x', None]
+    assert df['code'].tolist() == ['1', '2', 'A7', '3']
+
+def test_failure_is_noted(tmp_path):
+    cache_folder = str(tmp_path)
+    writer = write_chunks(cache_folder, [pd.DataFrame({'a': [1]}), pd.DataFrame({'b': [1]})])
+    
+    assert writer.failed
+    assert not has_cached_dataset(cache_folder, 'digest')
+    assert dataset_failure(cache_folder, 'digest') is not None
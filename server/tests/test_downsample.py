@@ -0,0 +1,66 @@
+import numpy as np
+import pandas as pd
+from app.utils.dataset_cache import write_dataset
+from app.utils.downsample import lttb, minmax, downsample_series
+
+def test_lttb_keeps_ends_and_peaks():
+    x = np.arange(1000, dtype=np.float64)
+    y = np.sin(x / 50)
+    y[500] = 10.0
+    keep = lttb(x, y, 50)
+    
+    assert len(keep) == 50
+    assert keep[0] == 0 and keep[-1] == 999
+    assert (np.diff(keep) > 0).all()
+    assert 500 in keep
+
+def test_lttb_returns_short_series_whole():
+    x = np.arange(10, dtype=np.float64)
+    assert lttb(x, x, 20).tolist() == list(range(10))
+
+def test_minmax_keeps_every_extreme():
+    rng = np.random.default_rng(0)
+    y = rng.normal(size=10000)
+    keep = minmax(y, 100)
+    
+    assert len(keep) <= 100
+    assert y.argmin() in keep and y.argmax() in keep
+    assert keep[0] == 0 and keep[-1] == 9999
+
+def test_minmax_never_exceeds_the_requested_points():
+    y = np.sin(np.arange(1000) / 10)
+    y[700] = 5.0
+    for points in range(1, 12):
+        assert len(minmax(y, points)) <= points
+    assert minmax(y, 2).tolist() == [0, 999]
+    assert minmax(y, 3).tolist() == [0, 700, 999]
+
+def test_series_from_the_dataset_cache(tmp_path):
+    n = 50000
+    df = pd.DataFrame({'t': pd.date_range('2024-01-01', periods=n, freq='min'), 'v': np.arange(n) % 97})
+    cache_folder = str(tmp_path)
+    write_dataset(df, cache_folder, 'digest')
+    
+    series = downsample_series(cache_folder, 'digest', 't', 'v', points=200, method='minmax')
+    assert series['x_type'] == 'datetime'
+    assert series['points'] <= 200
+    assert series['source_rows'] == n
+    assert series['level'] > 0
+    assert max(series['y']) == 96 and min(series['y']) == 0
+    
+    zoomed = downsample_series(cache_folder, 'digest', 't', 'v', points=200,
+                               start='2024-01-01T00:00:00', end='2024-01-01T01:39:00')
+    assert zoomed['source_rows'] == 100
+    assert zoomed['level'] == 0
+    assert zoomed['x'][0] == '2024-01-01T00:00:00.000'
+
+
+def test_offset_bounds_are_converted_to_utc(tmp_path):
+    df = pd.DataFrame({'t': pd.date_range('2024-01-01', periods=600, freq='min', tz='UTC'), 'v': np.arange(600)})
+    write_dataset(df, str(tmp_path), 'digest')
+    
+    # 02:00 at +02:00 is midnight UTC
+    series = downsample_series(str(tmp_path), 'digest', 't', 'v', points=200,
+                               start='2024-01-01T02:00:00+02:00', end='2024-01-01T03:00:00+02:00')
+    assert series['source_rows'] == 61
+    assert series['y'][0] == 0
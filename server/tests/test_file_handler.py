@@ -0,0 +1,28 @@
+import pandas as pd
+import pytest
+from app.utils.file_handler import _read_xls, iter_processed_chunks, read_excel_chunks
+
+@pytest.fixture
+def workbook(tmp_path):
+    path = str(tmp_path / 'book.xlsx')
+    with pd.ExcelWriter(path) as writer:
+        pd.DataFrame({'a': [1, 2]}).to_excel(writer, sheet_name='first', index=False)
+        pd.DataFrame({'b': [3, 4]}).to_excel(writer, sheet_name='1', index=False)
+        pd.DataFrame({'c': [5, 6], 'd': [7, 8]}).to_excel(writer, sheet_name='third', index=False)
+    return path
+
+@pytest.mark.parametrize('sheet, column', [(None, 'a'), ('1', 'b'), ('2', 'c'), ('third', 'c'), (0, 'a')])
+def test_sheets_by_name_then_position(workbook, sheet, column):
+    assert _read_xls(workbook, sheet, None).columns[0] == column
+    chunks = [chunk for chunk, _ in read_excel_chunks(workbook, sheet=sheet)]
+    assert chunks[0].columns[0] == column
+
+def test_excel_chunks_select_columns(workbook):
+    chunks = [chunk for chunk, _ in read_excel_chunks(workbook, chunksize=1, sheet='third', columns=['d'])]
+    assert [chunk['d'].tolist() for chunk in chunks] == [[7], [8]]
+
+def test_forward_fill_carries_across_chunks(tmp_path):
+    path = tmp_path / 'data.csv'
+    path.write_text('a,b\n1,x\n,\n,y\n2,\n')
+    chunks = list(iter_processed_chunks(str(path), chunksize=2))
+    assert pd.concat(chunks)['b'].tolist() == ['x', 'y', 'y']
@@ -0,0 +1,50 @@
+import numpy as np
+import pytest
+from sklearn.ensemble import ExtraTreesClassifier, RandomForestClassifier
+from app.ml.forest_engine import CompiledForest
+
+def data(rng, rows, missing):
+    X = rng.normal(size=(rows, 4))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] > 0).astype(int) + (X[:, 3] > 1)
+    X[rng.random(X.shape) < missing] = np.nan
+    return X, y
+
+@pytest.mark.parametrize('estimator', [RandomForestClassifier, ExtraTreesClassifier])
+@pytest.mark.parametrize('train_missing', [0.0, 0.1])
+def test_probabilities_match_sklearn(estimator, train_missing):
+    rng = np.random.default_rng(0)
+    X, y = data(rng, 2000, train_missing)
+    model = estimator(n_estimators=20, random_state=0).fit(X, y)
+    engine = CompiledForest.from_sklearn(model)
+    
+    X_test, _ = data(rng, 1000, 0.15)
+    np.testing.assert_allclose(engine.predict_proba(X_test), model.predict_proba(X_test), rtol=0, atol=1e-12)
+    assert (engine.predict(X_test) == model.predict(X_test)).all()
+
+def test_saved_forest_matches(tmp_path):
+    rng = np.random.default_rng(1)
+    X, y = data(rng, 500, 0.1)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(X, y)
+    CompiledForest.from_sklearn(model).save(str(tmp_path / 'forest'))
+    engine = CompiledForest.load(str(tmp_path / 'forest'))
+    
+    np.testing.assert_allclose(engine.predict_proba(X), model.predict_proba(X), rtol=0, atol=1e-12)
+
+def test_predictor_answers_alike_for_any_batch_size(tmp_path):
+    import joblib
+    from sklearn.preprocessing import StandardScaler
+    from app.ml.predictor import Predictor
+    
+    rng = np.random.default_rng(2)
+    X, y = data(rng, 500, 0.1)
+    scaler = StandardScaler().fit(X)
+    model = RandomForestClassifier(n_estimators=10, random_state=0).fit(scaler.transform(X), y)
+    path = str(tmp_path / 'model.pkl')
+    joblib.dump({'model': model, 'scaler': scaler, 'feature_names': ['a', 'b', 'c', 'd']}, path)
+    predictor = Predictor(path, compiled_max_batch=8)
+    assert predictor.engine is not None
+    
+    X_test, _ = data(rng, 20, 0.2)
+    _, small = predictor.predict_array(X_test[:8])
+    _, large = predictor.predict_array(X_test)
+    np.testing.assert_allclose(small, large[:8], rtol=0, atol=1e-12)
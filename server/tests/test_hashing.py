@@ -0,0 +1,48 @@
+import threading
+import pytest
+from app.utils.hashing import HashingPool, HashingBusyError, hashing_pool
+
+def pool(**settings):
+    pool = HashingPool()
+    pool.method = 'pbkdf2:sha256:1000'
+    for name, value in settings.items():
+        setattr(pool, name, value)
+    return pool
+
+def test_hashes_verify_and_report_outdated_methods():
+    hashes = pool()
+    password_hash = hashes.generate('secret-password')
+    
+    assert hashes.check(password_hash, 'secret-password')
+    assert not hashes.check(password_hash, 'wrong-password')
+    assert not hashes.needs_rehash(password_hash)
+    assert pool(method='pbkdf2:sha256:2000').needs_rehash(password_hash)
+
+def test_excess_requests_are_shed():
+    hashes = pool(max_pending=1)
+    started, release = threading.Event(), threading.Event()
+    
+    def slow():
+        started.set()
+        release.wait(5)
+        return 'done'
+    
+    worker = threading.Thread(target=hashes._run, args=(slow,))
+    worker.start()
+    started.wait(5)
+    with pytest.raises(HashingBusyError):
+        hashes.generate('secret-password')
+    release.set()
+    worker.join()
+    
+    # Capacity comes back once the running hash finishes
+    assert hashes.check(hashes.generate('secret-password'), 'secret-password')
+
+def test_busy_registration_answers_503(client, monkeypatch):
+    def busy(*args):
+        raise HashingBusyError("Too many password hashing requests")
+    monkeypatch.setattr(hashing_pool, 'generate', busy)
+    
+    response = client.post('/api/auth/register', json={'email': 'new@example.com', 'password': 'secret-password'})
+    assert response.status_code == 503
+    assert response.headers['Retry-After']
@@ -0,0 +1,35 @@
+import time
+from datetime import timedelta
+from flask_jwt_extended import create_access_token
+from app import jwt
+
+def token(app, **kwargs):
+    with app.app_context():
+        return create_access_token(identity='user@example.com', **kwargs)
+
+def get(client, access_token):
+    return client.get('/api/auth/token-cache', headers={'Authorization': f"Bearer {access_token}"})
+
+def test_repeated_token_is_served_from_the_cache(client, app):
+    access_token = token(app)
+    before = jwt.cache_stats()
+    
+    assert get(client, access_token).status_code == 200
+    assert get(client, access_token).status_code == 200
+    after = jwt.cache_stats()
+    assert after['misses'] - before['misses'] == 1
+    assert after['hits'] - before['hits'] == 1
+
+def test_cached_token_still_expires(client, app):
+    access_token = token(app, expires_delta=timedelta(seconds=1))
+    assert get(client, access_token).status_code == 200
+    time.sleep(1.5)
+    assert get(client, access_token).status_code == 401
+
+def test_tampered_token_is_verified(client, app):
+    access_token = token(app)
+    assert get(client, access_token).status_code == 200
+    
+    header, payload, signature = access_token.split('.')
+    forged = '.'.join([header, payload, signature[:-4] + ('AAAA' if signature[-4:] != 'AAAA' else 'BBBB')])
+    assert get(client, forged).status_code in (401, 422)
@@ -0,0 +1,67 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.kpis import KpiAccumulator
+
+def accumulate(df, size, **settings):
+    accumulator = KpiAccumulator(**settings)
+    for start in range(0, len(df), size):
+        accumulator.update(df.iloc[start:start + size])
+    return accumulator.to_dict()
+
+def test_chunked_kpis_match_a_one_pass_groupby():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({
+        'region': rng.choice(['north', 'south', 'east', None], 5000),
+        'units': rng.integers(0, 100, 5000),
+        'price': rng.normal(10, 3, 5000)
+    })
+    df.loc[df.sample(frac=0.1, random_state=0).index, 'price'] = np.nan
+    kpis = accumulate(df, 700)
+    
+    assert kpis['rows'] == 5000
+    for column in ('units', 'price'):
+        totals = kpis['totals'][column]
+        assert totals['count'] == df[column].count()
+        assert totals['sum'] == pytest.approx(df[column].sum())
+        assert totals['mean'] == pytest.approx(df[column].mean())
+        assert totals['min'] == pytest.approx(df[column].min())
+        assert totals['max'] == pytest.approx(df[column].max())
+    
+    expected = df.fillna({'region': '(missing)'}).groupby('region')
+    groups = {group['value']: group for group in kpis['breakdowns']['region']}
+    assert set(groups) == set(expected.groups)
+    for value, group in groups.items():
+        assert group['rows'] == expected.size()[value]
+        assert group['metrics']['price']['sum'] == pytest.approx(expected['price'].sum()[value])
+        assert group['metrics']['price']['count'] == expected['price'].count()[value]
+        assert group['metrics']['units']['max'] == expected['units'].max()[value]
+    # Largest groups first
+    rows = [group['rows'] for group in kpis['breakdowns']['region']]
+    assert rows == sorted(rows, reverse=True)
+
+def test_category_is_dropped_once_it_exceeds_max_categories():
+    df = pd.DataFrame({
+        'code': [f"c{i}" for i in range(30)],
+        'kind': ['a', 'b', 'c'] * 10,
+        'units': range(30)
+    })
+    # Every chunk alone stays under the limit
+    kpis = accumulate(df, 10, max_categories=20)
+    
+    assert 'code' not in kpis['breakdowns']
+    assert kpis['skipped_columns'] == ['code']
+    assert [group['rows'] for group in kpis['breakdowns']['kind']] == [10, 10, 10]
+
+def test_tz_aware_dates_are_bucketed_in_utc():
+    df = pd.DataFrame({
+        'at': pd.to_datetime(['2024-01-31T23:30:00', '2024-01-15T12:00:00', '2024-02-10T08:00:00']).tz_localize('America/New_York'),
+        'units': [1, 2, 3]
+    })
+    kpis = accumulate(df, 2)
+    
+    points = {point['period']: point for point in kpis['time_series']['at']['points']}
+    # 23:30 on Jan 31 in New York is already February in UTC
+    assert list(points) == ['2024-01', '2024-02']
+    assert points['2024-01']['metrics']['units']['sum'] == 2
+    assert points['2024-02']['metrics']['units']['sum'] == 4
@@ -0,0 +1,41 @@
+from concurrent.futures import Future
+from app.utils.pdf_renderer import PdfRenderer
+
+class FailingExecutor:
+    def __init__(self):
+        self.calls = 0
+    
+    def submit(self, fn, *args):
+        self.calls += 1
+        future = Future()
+        future.set_exception(RuntimeError(f"render {self.calls} failed"))
+        return future
+
+def renderer(tmp_path, **settings):
+    renderer = PdfRenderer()
+    renderer.output_folder = str(tmp_path)
+    renderer.template_digests = {'report.html': 'digest'}
+    renderer._executor = FailingExecutor()
+    for name, value in settings.items():
+        setattr(renderer, name, value)
+    return renderer
+
+def test_failure_is_retried_once_it_expires(tmp_path):
+    pdf = renderer(tmp_path, failure_ttl=60)
+    assert pdf.submit({}, 'a') == 'rendering'
+    assert pdf.error('a') == 'render 1 failed'
+    assert pdf.submit({}, 'a') == 'failed'
+    assert pdf._executor.calls == 1
+    
+    pdf.failure_ttl = 0
+    assert pdf.error('a') is None
+    assert pdf.submit({}, 'a') == 'rendering'
+    assert pdf._executor.calls == 2
+
+def test_failures_are_bounded(tmp_path):
+    pdf = renderer(tmp_path, max_failures=3)
+    for digest in 'abcde':
+        pdf.submit({}, digest)
+    assert len(pdf._failed) == 3
+    assert pdf.error('a') is None
+    assert pdf.error('e') == 'render 5 failed'
@@ -0,0 +1,8 @@
+def test_only_model_admins_can_reload_or_activate(client, auth):
+    assert client.post('/api/predict/models/reload', headers=auth()).status_code == 403
+    assert client.post('/api/predict/models/v1/activate', headers=auth()).status_code == 403
+
+def test_model_admins_pass_the_check(client, auth):
+    # No model file exists, so the admin gets past the check to an error
+    response = client.post('/api/predict/models/reload', headers=auth('admin@example.com'))
+    assert response.status_code != 403
@@ -0,0 +1,37 @@
+import time
+from app.ml.prediction_cache import PredictionCache
+
+def test_keys_match_numerically_equal_vectors_of_one_version():
+    key = PredictionCache.make_key('v1', [1, 0.0, 2.5])
+    assert PredictionCache.make_key('v1', [1.0, -0.0, 2.5]) == key
+    assert PredictionCache.make_key('v2', [1.0, 0.0, 2.5]) != key
+    assert PredictionCache.make_key('v1', [1.0, 0.0, 2.6]) != key
+
+def test_least_recently_used_entry_is_evicted():
+    cache = PredictionCache(max_entries=2, ttl=None)
+    cache.put(b'a', 1)
+    cache.put(b'b', 2)
+    assert cache.get(b'a') == 1
+    cache.put(b'c', 3)
+    
+    assert cache.get(b'b') is None
+    assert cache.get(b'a') == 1 and cache.get(b'c') == 3
+    assert cache.stats()['evictions'] == 1
+
+def test_entries_expire():
+    cache = PredictionCache(ttl=0.05)
+    cache.put(b'a', 1)
+    time.sleep(0.1)
+    assert cache.get(b'a') is None
+    assert cache.stats()['expirations'] == 1
+
+def test_results_computed_before_a_clear_are_dropped():
+    cache = PredictionCache()
+    generation = cache.generation
+    cache.put(b'a', 1, generation)
+    cache.clear('v2')
+    cache.put(b'b', 2, generation)
+    
+    assert cache.get(b'a') is None and cache.get(b'b') is None
+    cache.put(b'b', 2, cache.generation)
+    assert cache.get(b'b') == 2
@@ -0,0 +1,70 @@
+import pandas as pd
+import pytest
+from app.utils.query_engine import compile_query, execute_plan, _filter_mask
+
+@pytest.fixture
+def df():
+    return pd.DataFrame({
+        'region': ['north', 'south', 'north', None, 'east'],
+        'units': [3, 5, 1, 4, 2],
+        'price': [1.5, 2.0, None, 3.5, 1.0]
+    })
+
+def test_plan_reads_only_used_columns():
+    plan = compile_query({'filters': [{'column': 'units', 'op': '>', 'value': 1}],
+                          'group_by': 'region',
+                          'aggregates': [{'func': 'sum', 'column': 'price'}]})
+    assert plan.columns == ['units', 'region', 'price']
+    
+    plan = compile_query({'select': ['price'], 'sort': [{'column': 'units'}]})
+    assert plan.columns == ['price', 'units']
+
+def test_plan_without_select_reads_every_column(df):
+    plan = compile_query({'filters': [{'column': 'units', 'op': '>=', 'value': 3}], 'sort': 'units'})
+    assert plan.columns is None
+    
+    result = execute_plan(plan, df)
+    assert result['columns'] == ['region', 'units', 'price']
+    assert [row['units'] for row in result['rows']] == [3, 4, 5]
+
+def test_empty_query_returns_all_rows(df):
+    result = execute_plan(compile_query({}), df)
+    assert result['columns'] == ['region', 'units', 'price']
+    assert result['row_count'] == 5
+
+def test_group_by_counts_missing_keys(df):
+    result = execute_plan(compile_query({'group_by': ['region'], 'sort': ['region']}), df)
+    counts = {row['region']: row['count'] for row in result['rows']}
+    assert counts == {'east': 1, 'north': 2, 'south': 1, None: 1}
+
+def test_limit_truncates(df):
+    result = execute_plan(compile_query({'limit': 2}, max_rows=3), df)
+    assert result['row_count'] == 2
+    assert result['truncated']
+    assert result['matched_rows'] == 5
+
+def test_invalid_queries_are_rejected():
+    with pytest.raises(ValueError):
+        compile_query({'filters': [{'column': 'a', 'op': 'like', 'value': 1}]})
+    with pytest.raises(ValueError):
+        compile_query({'select': ['a'], 'aggregates': [{'func': 'count'}]})
+    with pytest.raises(ValueError):
+        compile_query({'group_by': 'a', 'sort': ['b']})
+
+@pytest.mark.parametrize('op, value', [
+    ('==', 'p'), ('!=', 'p'), ('<', 'p'), ('>=', 'p'), ('in', ['p', 'q']),
+    ('not_in', ['p']), ('contains', 'P'), ('is_null', None), ('not_null', None)
+])
+def test_categorical_filters_match_text_filters(op, value):
+    text = pd.Series(['p', 'q', None, 'r', 'p', None], dtype=object)
+    categorical = text.astype('category')
+    assert (_filter_mask(categorical, op, value) == _filter_mask(text, op, value)).all()
+
+def test_filters_on_utc_dates():
+    dates = pd.Series(pd.to_datetime(['2024-01-01T08:00:00+00:00', '2024-01-02T08:00:00+00:00'], utc=True))
+    assert _filter_mask(dates, '<', '2024-01-01T12:00:00').tolist() == [True, False]
+    assert _filter_mask(dates, '==', '2024-01-01T10:00:00+02:00').tolist() == [True, False]
+
+def test_filters_with_offsets_on_naive_dates():
+    dates = pd.Series(pd.to_datetime(['2024-01-01T08:00:00', '2024-01-02T08:00:00']))
+    assert _filter_mask(dates, '>', '2024-01-01T10:00:00+01:00').tolist() == [False, True]
@@ -0,0 +1,72 @@
+import os
+import subprocess
+import sys
+import joblib
+import numpy as np
+import pytest
+from sklearn.linear_model import LogisticRegression
+from sklearn.preprocessing import StandardScaler
+from app.ml.registry import ModelRegistry
+
+def save_model(path, C):
+    X = np.array([[0.0, 0.0], [1.0, 1.0], [0.0, 1.0], [1.0, 0.0]])
+    joblib.dump({'model': LogisticRegression(C=C).fit(X, [0, 1, 1, 0]),
+                 'scaler': StandardScaler().fit(X),
+                 'feature_names': ['a', 'b']}, path)
+
+def registry(model_path, max_versions=3):
+    return ModelRegistry(model_path, max_versions=max_versions, check_interval=0, compile_forest=False)
+
+@pytest.fixture
+def model_path(tmp_path):
+    path = str(tmp_path / 'model.pkl')
+    save_model(path, 1.0)
+    return path
+
+def test_rollback_reaches_every_worker(model_path):
+    first = registry(model_path)
+    second = registry(model_path)
+    old = first.active_version
+    save_model(model_path, 2.0)
+    first.reload()
+    second.reload()
+    new = first.active_version
+    assert new != old and second.active_version == new
+    
+    first.activate(old)
+    assert second.reload()
+    assert second.active_version == old
+    
+    # A worker started after the rollback follows it too
+    assert registry(model_path).active_version == old
+
+def test_new_model_file_wins_over_a_rollback(model_path):
+    first = registry(model_path)
+    old = first.active_version
+    save_model(model_path, 2.0)
+    first.reload()
+    first.activate(old)
+    
+    save_model(model_path, 3.0)
+    first.reload()
+    assert first.active_version != old
+    assert registry(model_path).active_version == first.active_version
+
+def test_evicted_snapshot_is_kept_while_another_process_pins_it(model_path):
+    first = registry(model_path, max_versions=1)
+    old = first.active_version
+    snapshot = first.version_path(old)
+    # Another live process has the version loaded
+    os.link(snapshot, first._pin_path(old, os.getppid()))
+    
+    save_model(model_path, 2.0)
+    first.reload()
+    assert os.path.exists(snapshot)
+    
+    # Once that process is gone, the next eviction deletes it
+    os.remove(first._pin_path(old, os.getppid()))
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    os.link(snapshot, first._pin_path(old, dead.pid))
+    first._release(old)
+    assert not os.path.exists(snapshot)
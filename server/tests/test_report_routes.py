@@ -0,0 +1,12 @@
+def test_report_visible_to_owner_only(client, auth):
+    response = client.post('/api/report/generate', json={'title': 'Q1'}, headers=auth())
+    assert response.status_code == 201
+    report_id = response.get_json()['report_id']
+    
+    response = client.get(f'/api/report/{report_id}', headers=auth())
+    assert response.status_code == 200
+    assert response.get_json()['data'] == {'title': 'Q1'}
+    
+    other = auth('other@example.com')
+    assert client.get(f'/api/report/{report_id}', headers=other).status_code == 404
+    assert client.get(f'/api/report/{report_id}/pdf', headers=other).status_code == 404
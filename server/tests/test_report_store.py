@@ -0,0 +1,17 @@
+from sqlalchemy import text
+from app import db
+from app.models import Report
+from app.utils.pdf_renderer import data_digest
+from app.utils.report_store import create_report, upgrade_report_table
+
+def test_upgrade_adds_content_digest(app):
+    with app.app_context():
+        report_id = create_report('user@example.com', {'title': 'Q1', 'rows': [1, 2]}).id
+        db.session.remove()
+        with db.engine.begin() as connection:
+            connection.execute(text("ALTER TABLE report DROP COLUMN content_digest"))
+        
+        upgrade_report_table()
+        
+        report = db.session.get(Report, report_id)
+        assert report.content_digest == data_digest({'title': 'Q1', 'rows': [1, 2]})
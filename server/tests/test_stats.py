@@ -0,0 +1,87 @@
+import numpy as np
+import pandas as pd
+import pytest
+from app.utils.stats import StatsAccumulator
+
+def test_distinct_counts_never_exceed_present_values():
+    df = pd.DataFrame({
+        'a': np.arange(200),
+        'b': [f"s{i}" for i in range(200)],
+        'c': [1.0, np.nan] * 100
+    })
+    counts = StatsAccumulator().update(df).to_dict()['distinct_counts']
+    assert counts['a'] <= 200
+    assert counts['b'] <= 200
+    assert counts['c'] == 1
+
+def test_distinct_counts_are_close_for_large_columns():
+    df = pd.DataFrame({'a': np.arange(50000) % 20000})
+    count = StatsAccumulator().update(df).to_dict()['distinct_counts']['a']
+    assert abs(count - 20000) / 20000 < 0.05
+
+def test_chunks_give_the_same_moments_as_one_pass():
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'x': rng.normal(size=10000), 'y': rng.integers(0, 100, 10000)})
+    whole = StatsAccumulator().update(df).to_dict()
+    chunked = StatsAccumulator()
+    for start in range(0, len(df), 3000):
+        chunked.update(df.iloc[start:start + 3000])
+    chunked = chunked.to_dict()
+    
+    assert chunked['rows'] == whole['rows'] == 10000
+    for column in ('x', 'y'):
+        for name in ('mean', 'std', 'min', 'max'):
+            assert chunked['numeric_stats'][column][name] == pytest.approx(whole['numeric_stats'][column][name])
+        assert whole['numeric_stats'][column]['mean'] == pytest.approx(df[column].mean())
+        assert whole['numeric_stats'][column]['std'] == pytest.approx(df[column].std())
+
+def test_merge_matches_a_single_accumulator():
+    rng = np.random.default_rng(1)
+    df = pd.DataFrame({'x': rng.normal(size=4000), 'g': rng.choice(['a', 'b', None], 4000)})
+    merged = StatsAccumulator().update(df.iloc[:1500]).merge(StatsAccumulator().update(df.iloc[1500:])).to_dict()
+    whole = StatsAccumulator().update(df).to_dict()
+    
+    assert merged['missing_values'] == whole['missing_values']
+    assert merged['distinct_counts'] == whole['distinct_counts']
+    assert merged['numeric_stats']['x']['mean'] == pytest.approx(whole['numeric_stats']['x']['mean'])
+
+def test_quantiles_are_within_the_sketch_accuracy():
+    rng = np.random.default_rng(2)
+    values = rng.lognormal(size=20000)
+    stats = StatsAccumulator(relative_accuracy=0.02).update(pd.DataFrame({'v': values})).to_dict()
+    median = stats['numeric_stats']['v']['quantiles']['p50']
+    assert median == pytest.approx(np.median(values), rel=0.05)
+
+@pytest.mark.parametrize('precision', [4, 8, 12, 16])
+def test_register_ranks_are_exact_at_every_precision(precision):
+    accumulator = StatsAccumulator(hll_precision=precision).update(pd.DataFrame({'a': [0]}))
+    width = 64 - precision
+    # Runs of ones round up to the next power of two in a double
+    rests = [(1 << k) - 1 for k in range(width + 1)] + [1 << k for k in range(width)]
+    for rest in rests:
+        accumulator.registers[:] = 0
+        hashes = np.array([[(5 % (1 << precision)) << width | rest]], dtype=np.uint64)
+        accumulator._update_registers([0], hashes, np.zeros((1, 1), dtype=bool))
+        assert accumulator.registers[0, 5 % (1 << precision)] == width + 1 - rest.bit_length()
+
+def test_numeric_column_read_as_text_later_becomes_text():
+    accumulator = StatsAccumulator()
+    accumulator.update(pd.DataFrame({'a': [1, 2, 3], 'b': [1.0, np.nan, 3.0]}))
+    accumulator.update(pd.DataFrame({'a': [4.5, np.nan, 6.0], 'b': ['x', None, 'y']}))
+    stats = accumulator.to_dict()
+    
+    assert stats['column_types'] == {'a': 'float64', 'b': 'object'}
+    assert list(stats['numeric_stats']) == ['a']
+    assert stats['numeric_stats']['a']['max'] == 6.0
+    assert stats['missing_values'] == {'a': 1, 'b': 2}
+    assert stats['distinct_counts']['b'] == 4
+
+def test_merge_demotes_columns_that_are_text_on_either_side():
+    left = StatsAccumulator().update(pd.DataFrame({'a': [1.0, 2.0], 'b': [1.0, 2.0]}))
+    right = StatsAccumulator().update(pd.DataFrame({'a': [3.0, 4.0], 'b': ['x', 'y']}))
+    stats = left.merge(right).to_dict()
+    
+    assert stats['column_types'] == {'a': 'float64', 'b': 'object'}
+    assert stats['numeric_stats']['a']['mean'] == pytest.approx(2.5)
+    assert 'b' not in stats['numeric_stats']
+    assert right.numeric_columns == ['a']
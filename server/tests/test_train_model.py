@@ -0,0 +1,45 @@
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+from app.ml.train_model import train_from_dataset, load_training_data
+from app.ml.predictor import Predictor
+
+@pytest.fixture
+def dataset(tmp_path):
+    rng = np.random.default_rng(0)
+    df = pd.DataFrame({'a': rng.normal(5, 2, 400), 'b': rng.normal(size=400)})
+    df['label'] = (df['a'] + df['b'] > 5).astype(int)
+    path = tmp_path / 'train.csv'
+    df.to_csv(path, index=False)
+    return str(path)
+
+def train(dataset, tmp_path, **kwargs):
+    model_path = str(tmp_path / 'model.pkl')
+    report = train_from_dataset(dataset, 'label', model_path=model_path, chunksize=100,
+                                param_grid={'n_estimators': [5], 'max_depth': [3, None]}, cv=2, **kwargs)
+    return report, joblib.load(model_path)
+
+def test_scaler_sees_training_rows_only(dataset, tmp_path):
+    _, model_data = train(dataset, tmp_path, n_jobs=1)
+    X, _, _ = load_training_data(dataset, 'label')
+    
+    scaler = model_data['scaler']
+    assert scaler.n_samples_seen_ == 320
+    assert not np.allclose(scaler.mean_, X.mean(axis=0))
+
+def test_stages_report_workers_and_trace_only_on_request(dataset, tmp_path):
+    report, _ = train(dataset, tmp_path, n_jobs=2)
+    assert 'peak_traced_mb' not in report['stages']['load']
+    assert report['stages']['search']['workers_max_rss_mb'] > 0
+    
+    report, _ = train(dataset, tmp_path, n_jobs=1, trace_memory=True)
+    assert report['stages']['load']['peak_traced_mb'] >= 0
+
+def test_predictor_reproduces_training_scores(dataset, tmp_path):
+    report, _ = train(dataset, tmp_path, n_jobs=1)
+    X, y, _ = load_training_data(dataset, 'label')
+    labels, _ = Predictor(str(tmp_path / 'model.pkl'), compile_forest=False).predict_array(X)
+    # Every row is scored as in training, so the accuracies agree
+    accuracy = (labels == y).mean()
+    assert accuracy == pytest.approx(0.8 * report['training_accuracy'] + 0.2 * report['testing_accuracy'])
@@ -0,0 +1,72 @@
+import io
+import os
+import hashlib
+from app import db
+from app.models import Upload
+from app.utils.jobs import job_queue, create_job, update_job
+from app.utils.upload_store import (get_upload, put_upload, stored_path, hold_content, release_hold,
+                                    discard_file, PENDING_FOLDER)
+
+CSV = b'region,units\nnorth,3\nsouth,5\n'
+
+def upload(client, headers, data=CSV, filename='sales.csv'):
+    return client.post('/api/upload/file', headers=headers,
+                       data={'file': (io.BytesIO(data), filename)},
+                       content_type='multipart/form-data')
+
+def test_reupload_gets_new_id(client, auth, app):
+    headers = auth()
+    assert upload(client, headers).status_code == 200
+    with app.app_context():
+        first_id = get_upload('user@example.com', 'sales.csv').id
+    
+    assert upload(client, headers, CSV + b'east,2\n').status_code == 200
+    with app.app_context():
+        assert get_upload('user@example.com', 'sales.csv').id != first_id
+
+def test_failed_job_of_replaced_upload_keeps_new_entry(client, auth, app):
+    headers = auth()
+    assert upload(client, headers).status_code == 200
+    with app.app_context():
+        stale = create_job(job_queue.jobs_folder, 'upload', owner='user@example.com', filename='sales.csv',
+                           upload_id=get_upload('user@example.com', 'sales.csv').id)
+        update_job(job_queue.jobs_folder, stale['id'], status='failed', error='boom')
+    
+    assert upload(client, headers, CSV + b'east,2\n').status_code == 200
+    with app.app_context():
+        entry_id = get_upload('user@example.com', 'sales.csv').id
+    
+    assert client.get(f"/api/upload/jobs/{stale['id']}", headers=headers).status_code == 200
+    with app.app_context():
+        assert get_upload('user@example.com', 'sales.csv').id == entry_id
+
+def test_legacy_uploads_are_deleted_by_upload_admins_only(client, auth, app):
+    app.config['UPLOAD_ADMINS'] = ['admin@example.com']
+    with app.app_context():
+        entry, _ = put_upload(app.config['UPLOAD_FOLDER'], 'someone@example.com', 'old.csv', 'a' * 64, '.csv', 10)
+        entry.owner = None
+        db.session.commit()
+    
+    assert client.delete('/api/upload/old.csv', headers=auth()).status_code == 404
+    assert client.delete('/api/upload/old.csv', headers=auth('admin@example.com')).status_code == 200
+    with app.app_context():
+        assert Upload.query.filter_by(filename='old.csv').count() == 0
+
+
+def test_held_content_is_not_discarded(client, auth, app):
+    headers = auth()
+    assert upload(client, headers).status_code == 200
+    upload_folder = app.config['UPLOAD_FOLDER']
+    path = stored_path(upload_folder, hashlib.sha256(CSV).hexdigest(), '.csv')
+    # Uploads release their holds once cataloged
+    assert [name for name in os.listdir(os.path.join(upload_folder, PENDING_FOLDER)) if name != '.lock'] == []
+    
+    # Another upload of the same content has stored it but not cataloged it yet
+    hold = hold_content(upload_folder, hashlib.sha256(CSV).hexdigest(), '.csv')
+    assert client.delete('/api/upload/sales.csv', headers=headers).status_code == 200
+    assert os.path.exists(path)
+    
+    release_hold(hold)
+    with app.app_context():
+        discard_file(upload_folder, hashlib.sha256(CSV).hexdigest(), '.csv')
+    assert not os.path.exists(path)
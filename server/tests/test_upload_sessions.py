@@ -0,0 +1,102 @@
+import os
+import time
+import hashlib
+import threading
+from app.utils.jobs import job_queue, create_job, update_job
+from app.utils.upload_sessions import data_path, update_session, claim_finalize, wait_for_writers
+
+def create(client, headers, size=10, filename='big.csv'):
+    return client.post('/api/upload/sessions', headers=headers,
+                       json={'filename': filename, 'size': size, 'chunk_size': 5})
+
+def test_open_sessions_are_capped_per_user(client, auth, app):
+    app.config['UPLOAD_SESSION_MAX_OPEN'] = 2
+    headers = auth()
+    assert create(client, headers).status_code == 201
+    assert create(client, headers).status_code == 201
+    assert create(client, headers).status_code == 429
+    assert create(client, auth('other@example.com')).status_code == 201
+
+def test_chunk_after_finalize_is_a_conflict(client, auth, app):
+    headers = auth()
+    session_id = create(client, headers).get_json()['session_id']
+    # The data file is moved away when the session is finalized
+    os.remove(data_path(app.config['UPLOAD_SESSION_FOLDER'], session_id))
+    
+    response = client.put(f'/api/upload/sessions/{session_id}/chunks/0', headers=headers, data=b'a,b\n1')
+    assert response.status_code == 409
+
+def test_session_reflects_job_result(client, auth, app):
+    headers = auth()
+    session_id = create(client, headers).get_json()['session_id']
+    job = create_job(job_queue.jobs_folder, 'upload', owner='user@example.com', filename='big.csv',
+                     session_id=session_id)
+    update_job(job_queue.jobs_folder, job['id'], status='completed', result={'rows': 1},
+               content_hash='0' * 64, deduplicated=False)
+    update_session(app.config['UPLOAD_SESSION_FOLDER'], session_id, status='processing', job_id=job['id'])
+    
+    status = client.get(f'/api/upload/sessions/{session_id}', headers=headers).get_json()
+    assert status['status'] == 'completed'
+    assert status['stats'] == {'rows': 1}
+    files = client.get('/api/upload/list', headers=headers).get_json()['files']
+    assert [f['name'] for f in files] == ['big.csv']
+
+def test_job_hashes_and_stores_the_assembled_file(client, auth, app, monkeypatch):
+    # Run jobs inline instead of in the process pool
+    monkeypatch.setattr(job_queue, 'submit', lambda job, fn, *args: fn(job_queue.jobs_folder, job['id'], *args))
+    headers = auth()
+    content = b'a,b\n1,2\n3,4\n'
+    session_id = create(client, headers, size=len(content)).get_json()['session_id']
+    for index in range(0, len(content), 5):
+        response = client.put(f'/api/upload/sessions/{session_id}/chunks/{index // 5}',
+                              headers=headers, data=content[index:index + 5])
+    assert response.get_json()['status'] == 'processing'
+    
+    status = client.get(f'/api/upload/sessions/{session_id}', headers=headers).get_json()
+    assert status['status'] == 'completed'
+    assert status['stats']['rows'] == 2
+    stored = os.path.join(app.config['UPLOAD_FOLDER'], hashlib.sha256(content).hexdigest() + '.csv')
+    with open(stored, 'rb') as f:
+        assert f.read() == content
+    assert not os.path.exists(data_path(app.config['UPLOAD_SESSION_FOLDER'], session_id))
+    # The hold on the stored file is released once the session is cataloged
+    assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], '.pending')) == ['.lock']
+
+def test_chunk_is_refused_once_the_session_is_claimed(client, auth, app):
+    headers = auth()
+    sessions_folder = app.config['UPLOAD_SESSION_FOLDER']
+    session_id = create(client, headers).get_json()['session_id']
+    assert claim_finalize(sessions_folder, session_id)
+    
+    response = client.put(f'/api/upload/sessions/{session_id}/chunks/0', headers=headers, data=b'a,b\n1')
+    assert response.status_code == 409
+    assert os.listdir(os.path.join(sessions_folder, session_id, 'writers')) == []
+    assert response.get_json().get('received') is None
+
+def test_stale_claim_is_released(client, auth, app):
+    headers = auth()
+    sessions_folder = app.config['UPLOAD_SESSION_FOLDER']
+    session_id = create(client, headers).get_json()['session_id']
+    assert claim_finalize(sessions_folder, session_id)
+    claim = os.path.join(sessions_folder, session_id, 'finalizing')
+    stale = time.time() - app.config['UPLOAD_SESSION_FINALIZE_TIMEOUT'] - 1
+    os.utime(claim, (stale, stale))
+    
+    client.get(f'/api/upload/sessions/{session_id}', headers=headers)
+    assert not os.path.exists(claim)
+    response = client.put(f'/api/upload/sessions/{session_id}/chunks/0', headers=headers, data=b'a,b\n1')
+    assert response.status_code == 200
+
+def test_finalizer_waits_for_running_writers(tmp_path):
+    sessions_folder = str(tmp_path)
+    session_id = 'a' * 32
+    writers = tmp_path / session_id / 'writers'
+    writers.mkdir(parents=True)
+    (writers / 'live').touch()
+    (writers / 'dead').touch()
+    os.utime(writers / 'dead', (0, 0))
+    threading.Timer(0.3, os.remove, [str(writers / 'live')]).start()
+    
+    started = time.monotonic()
+    wait_for_writers(sessions_folder, session_id, timeout=60, interval=0.05)
+    assert time.monotonic() - started >= 0.25